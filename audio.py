@@ -0,0 +1,231 @@
+import argparse
+import sys
+import threading
+import wave
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional
+from model import FretBoardModel, Positions, basicNotes, noteIndex
+from scales import catalog
+from fingering import fingeringPresets, openPitches
+from instrument import Instrument, instruments
+
+# Audio preview of the individually marked notes, e.g.
+#   python audio.py --output scale.wav --root A --scale "Melodic Minor"
+#   python audio.py --output session.wav --session practice.json
+# Notes are plucked strings (Karplus-Strong) synthesized for many pitches at
+# once with NumPy and kept in a sample bank per MIDI pitch; a preview
+# synthesizes the pitches it is missing and mixes cached samples. Realtime
+# playback needs the optional sounddevice package and runs in a background
+# thread.
+
+sampleRate = 44100
+# seconds a note rings and between the onsets of two notes
+noteDuration = 1.2
+noteInterval = 0.25
+# seconds for a note to decay by 60 dB
+decayTime = 1.5
+fadeOut = 0.05
+# samples per write to the audio device
+blockSize = 1024
+
+
+def pitchMatrix(model: FretBoardModel, lowestPitch: int) -> np.ndarray:
+    # strings x frets MIDI pitches; the lowest string is the note of its
+    # tuning nearest to lowestPitch (see Instrument.lowestPitch)
+    offset = (int(model.baseNotes[-1]) - (lowestPitch - 9) + 6) % 12 - 6
+    openStrings = lowestPitch + offset + openPitches(model)
+    return openStrings[:, np.newaxis] + np.arange(model.numberFrets + 1)
+
+
+def frequencies(pitches: np.ndarray) -> np.ndarray:
+    return 440.0 * 2.0 ** ((np.asarray(pitches, dtype=np.float64) - 69) / 12)
+
+
+def pluck(pitches: np.ndarray, duration: float = noteDuration, rate: int = sampleRate) -> np.ndarray:
+    # notes x samples, all notes synthesized together. Each string is a
+    # delay line of `delay` samples averaging two neighbours (half a sample
+    # more), so a block of the shortest delay only reads samples computed in
+    # earlier blocks; the slightly sharp result is resampled to the pitch.
+    pitches = np.asarray(pitches, dtype=np.int64)
+    wanted = frequencies(pitches)
+    delays = np.maximum(np.floor(rate / wanted - 0.5).astype(np.int64), 2)
+    actual = rate / (delays + 0.5)
+    length = int(round(duration * rate))
+    gains = 10.0 ** (-3.0 / (decayTime * actual))
+
+    rows = np.arange(len(pitches))[:, np.newaxis]
+    lines = np.zeros((len(pitches), length), dtype=np.float64)
+    for row, (pitch, delay) in enumerate(zip(pitches, delays)):
+        # the same burst of noise for a pitch, whatever else is synthesized with it
+        noise = np.random.default_rng(int(pitch)).uniform(-1.0, 1.0, delay)
+        lines[row, :delay] = noise - noise.mean()
+    block = int(delays.min())
+    for start in range(int(delays.min()), length, block):
+        columns = np.arange(start, min(start + block, length))[np.newaxis, :]
+        behind = columns - delays[:, np.newaxis]
+        computed = 0.5 * gains[:, np.newaxis] * (lines[rows, np.maximum(behind, 0)]
+                                                 + lines[rows, np.maximum(behind - 1, 0)])
+        # the noise bursts of the longer delays are kept
+        lines[rows, columns] = np.where(behind >= 0, computed, lines[rows, columns])
+
+    # read the lines slower by actual / wanted, linearly interpolated
+    positions = np.arange(length)[np.newaxis, :] * (wanted / actual)[:, np.newaxis]
+    lower = np.minimum(positions.astype(np.int64), length - 2)
+    fraction = positions - lower
+    samples = (1 - fraction) * lines[rows, lower] + fraction * lines[rows, lower + 1]
+    samples *= np.minimum(1.0, (length - np.arange(length)) / (fadeOut * rate))
+    return (0.5 * samples).astype(np.float32)
+
+
+class SampleBank():
+    # synthesized notes by MIDI pitch, shared with the playback thread
+    def __init__(self, duration: float = noteDuration, rate: int = sampleRate):
+        self.duration: float = duration
+        self.rate: int = rate
+        self.samples: Dict[int, np.ndarray] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def prepare(self, pitches: Iterable[int]):
+        # synthesizes the missing pitches in one go
+        with self._lock:
+            missing = sorted({int(pitch) for pitch in np.ravel(pitches)} - self.samples.keys())
+            if missing:
+                for pitch, samples in zip(missing, pluck(np.array(missing), self.duration, self.rate)):
+                    self.samples[pitch] = samples
+
+    def render(self, pitches: List[int], interval: float = noteInterval) -> np.ndarray:
+        # the notes one after the other, mono
+        self.prepare(pitches)
+        step = int(round(interval * self.rate))
+        noteLength = int(round(self.duration * self.rate))
+        mix = np.zeros(max(0, len(pitches) - 1) * step + noteLength if len(pitches) else 0, dtype=np.float32)
+        for i, pitch in enumerate(pitches):
+            mix[i * step:i * step + noteLength] += self.samples[int(pitch)]
+        peak = np.abs(mix).max() if len(mix) else 0
+        if peak > 0.9:
+            mix *= 0.9 / peak
+        return mix
+
+
+def playOrder(model: FretBoardModel) -> Positions:
+    # the individually marked positions from the lowest string to the
+    # highest one, fret by fret along each string
+    stringIndexes, fretIndexes = np.nonzero(model.individualMarked)
+    order = np.lexsort((fretIndexes, -stringIndexes))
+    return stringIndexes[order], fretIndexes[order]
+
+
+def markedPitches(model: FretBoardModel, lowestPitch: int) -> List[int]:
+    stringIndexes, fretIndexes = playOrder(model)
+    return [int(pitch) for pitch in pitchMatrix(model, lowestPitch)[stringIndexes, fretIndexes]]
+
+
+def writeWav(path: str, samples: np.ndarray, rate: int = sampleRate):
+    # 16 bit mono
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+
+
+class Player():
+    # plays through sounddevice in one daemon thread, started by the first
+    # preview. Only the latest preview waits, a new one replaces it and stops
+    # the current one after its current block; the caller never waits for
+    # the device or the synthesis. failed is called from the thread.
+    def __init__(self, bank: SampleBank, failed: Callable[[str], None] = None):
+        self.bank: SampleBank = bank
+        self.failed: Optional[Callable[[str], None]] = failed
+        self._stop: threading.Event = threading.Event()
+        self._wanted: threading.Condition = threading.Condition()
+        self._next: Optional[List[int]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def play(self, pitches: List[int]):
+        with self._wanted:
+            self._stop.set()
+            self._next = list(pitches)
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run, daemon = True)
+                self._thread.start()
+            self._wanted.notify()
+
+    def stop(self):
+        with self._wanted:
+            self._next = None
+            self._stop.set()
+
+    def _run(self):
+        while True:
+            with self._wanted:
+                while self._next is None:
+                    self._wanted.wait()
+                pitches, self._next = self._next, None
+                self._stop = stop = threading.Event()
+            self._play(pitches, stop)
+
+    def _play(self, pitches: List[int], stop: threading.Event):
+        try:
+            import sounddevice
+            samples = self.bank.render(pitches)
+            if stop.is_set():
+                return
+            with sounddevice.OutputStream(samplerate = self.bank.rate, channels = 1, dtype = 'float32') as stream:
+                for start in range(0, len(samples), blockSize):
+                    if stop.is_set():
+                        break
+                    stream.write(samples[start:start + blockSize])
+        except Exception as e:
+            # no sounddevice, PortAudio or output device
+            if self.failed is not None:
+                self.failed(f"{type(e).__name__}: {e}")
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Render the individually marked notes of a scale or a session to WAV.')
+    parser.add_argument('--output', default = 'preview.wav')
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar')
+    parser.add_argument('--session', help = 'a saved session instead of a scale')
+    parser.add_argument('--root', choices = basicNotes, default = 'A')
+    parser.add_argument('--scale', default = 'Major', help = 'a name from the scale catalog (scales.txt)')
+    parser.add_argument('--mode', type = int, default = 1, help = '1 = the scale itself')
+    parser.add_argument('--fingering', choices = ['nearest'] + list(fingeringPresets.keys()), default = 'nearest')
+    parser.add_argument('--position', type = int, default = 0,
+                        help = 'the scale starts on the first root on the lowest string from this fret on')
+    parser.add_argument('--interval', type = float, default = noteInterval, help = 'seconds between notes')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    instrument: Instrument = instruments[args.instrument]
+    if args.session is not None:
+        import session
+        try:
+            state = session.load(args.session, instrument.numberFrets)
+        except (OSError, ValueError) as e:
+            print(e, file = sys.stderr)
+            return 2
+        model = instrument.withTuning(list(state.tuning)).newModel()
+        model.setIndividualBitsets(list(state.individual))
+    else:
+        if args.scale not in catalog.scaleNames:
+            print(f"unknown scale: {args.scale}", file = sys.stderr)
+            return 2
+        from book import bookItems
+        items = bookItems(instrument, [noteIndex(args.root)], [args.scale], [args.mode - 1],
+                          args.fingering, args.position)
+        model, _ = next(items, (instrument.newModel(), None))
+    pitches = markedPitches(model, instrument.lowestPitch)
+    samples = SampleBank().render(pitches, args.interval)
+    writeWav(args.output, samples)
+    print(f"{len(pitches)} notes, {len(samples) / sampleRate:.1f} s: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+# Benchmarks of the GUI hot paths, headless (Qt's offscreen platform), e.g.
+#   python bench.py --output bench.json
+#   python bench.py --baseline bench.json
+# Every operation is followed by processing the pending events, so the
+# repaints it causes are part of its time; diagrams rendered in the
+# background are waited for untimed. The comparison with a baseline fails
+# (exit code 1) if the fastest run got slower by more than the threshold,
+# the minimum being the least disturbed by other load.
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QApplication
+from model import standardTuning
+from diagram import Diagram, newBackend
+from instrument import Instrument, instruments
+from tunings import dropped
+from audio import pluck, markedPitches, sampleRate
+from pitch import PitchTracker
+from chords import _voicings, voicingConstraints, voicingTable
+import ui
+import tracing
+
+tunings: Dict[int, List[str]] = {
+        6: standardTuning,
+        7: ['B'] + standardTuning,
+        8: ['F#', 'B'] + standardTuning,
+        9: ['C#', 'F#', 'B'] + standardTuning,
+        10: ['G#', 'C#', 'F#', 'B'] + standardTuning,
+        12: instruments['extended12'].tuning,
+}
+# the necks the interactions are timed on, their latency should not grow with the size
+interactionInstruments: Dict[str, Instrument] = {
+        '6x24': instruments['guitar'],
+        '12x36': instruments['extended12'],
+}
+
+
+def timeIt(function: Callable, repeat: int, setup: Callable = None, warmup: int = 1) -> dict:
+    # setup runs before each call of function and is not timed
+    durations = []
+    for run in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        duration = time.perf_counter() - start
+        if run >= warmup:
+            durations.append(duration)
+    return {'repeat': repeat,
+            'min': min(durations),
+            'median': statistics.median(durations),
+            'mean': statistics.mean(durations),
+            'max': max(durations)}
+
+
+class Benchmarks():
+    def __init__(self, app: QApplication, repeat: int):
+        self.app: QApplication = app
+        self.repeat: int = repeat
+        # diagrams rendered by the GUI must not overwrite the ones in the working directory
+        self.outputDir: str = tempfile.mkdtemp(prefix = 'guitarneck-bench-')
+        self.results: Dict[str, dict] = {}
+
+    def processEvents(self):
+        self.app.processEvents()
+
+    def run(self, name: str, function: Callable, setup: Callable = None, repeat: int = None):
+        def timed():
+            function()
+            self.processEvents()
+        self.results[name] = timeIt(timed, repeat or self.repeat, setup)
+        print(f"{name:40s} {self.results[name]['min'] * 1000:10.3f} ms min "
+              f"{self.results[name]['median'] * 1000:10.3f} ms median", file = sys.stderr)
+
+    def newWindow(self, instrument: Instrument = None) -> ui.MainWindow:
+        window = ui.MainWindow(instrument)
+        window.fretBoard.renderer.outputPath = os.path.join(self.outputDir, 'example.png')
+        return window
+
+    def runAll(self):
+        windows = []
+        self.run('mainWindow.startup', lambda: windows.append(self.newWindow()), repeat = max(1, self.repeat // 4))
+        for window in windows:
+            window.close()
+
+        for numberStrings, tuning in tunings.items():
+            for numberFrets in (24, 36):
+                self.run(f'fretBoard.construct.{numberStrings}x{numberFrets}',
+                         lambda: ui.FretBoard(Instrument(tuning, numberFrets)))
+
+        for size, instrument in interactionInstruments.items():
+            window = self.newWindow(instrument)
+            self.runInteractions(window.fretBoard, size)
+            window.fretBoard.renderer.shutdown(wait = True)
+            window.close()
+
+        window = self.newWindow()
+        fretBoard = window.fretBoard
+        fretBoard.addScale(5, 5, 'A', False)
+        fretBoard.renderer.wait()
+        heading = fretBoard.diagramHeading('A')
+        for backend, fmt in (('qt', 'png'), ('drawsvg', 'png'), ('stream', 'svg')):
+            diagram = Diagram(fretBoard.model, fretBoard.fretStyle)
+            drawn = []
+            try:
+                diagram.drawDiagram(heading, newBackend(backend)).encode(fmt)
+            except Exception as e:
+                # e.g. Cairo missing for drawSvg's PNGs
+                print(f"skipping the {backend} backend: {e}", file = sys.stderr)
+                continue
+            self.run(f'diagram.draw.{backend}', lambda: diagram.drawDiagram(heading, newBackend(backend)))
+            self.run(f'diagram.encode.{fmt}.{backend}', lambda: drawn[-1].encode(fmt),
+                     setup = lambda: drawn.append(diagram.drawDiagram(heading, newBackend(backend))))
+        # the sample bank of the whole neck and a preview mixed from it
+        pitches = fretBoard.pitches()
+        self.run('audio.pluck', lambda: pluck(pitches.ravel()), repeat = max(1, self.repeat // 4))
+        fretBoard.audioBank.prepare(pitches)
+        self.run('audio.render', lambda: fretBoard.audioBank.render(markedPitches(fretBoard.model, fretBoard.instrument.lowestPitch)))
+        # about 10 s of notes through the pitch tracker
+        recording = fretBoard.audioBank.render(sorted(set(pitches.ravel().tolist())), 0.2)
+        self.run('pitch.track', lambda: PitchTracker(sampleRate, 70.0, 1400.0).process(recording))
+        fretBoard.renderer.shutdown(wait = True)
+        window.close()
+
+    def runInteractions(self, fretBoard: ui.FretBoard, size: str):
+        self.run(f'fretBoard.toggleNoteGlobal.{size}',
+                 lambda: fretBoard.toggleNoteGlobal('C', not fretBoard.model.isMarkedGlobal(3)))
+        fretBoard.clearAllGlobal()
+        tuning = fretBoard.instrument.tuning
+        tuningCycle = [dropped(tuning, 2), tuning]
+        self.run(f'fretBoard.setTuning.{size}', lambda: fretBoard.setTuning(tuningCycle[0]),
+                 setup = tuningCycle.reverse)
+        self.run(f'fretBoard.resetTuning.{size}', fretBoard.resetTuning,
+                 setup = lambda: fretBoard.setTuning(dropped(tuning, 5)))
+        self.run(f'fretBoard.cycleTuningPreset.{size}', fretBoard.cycleTuningPreset)
+        fretBoard.resetTuning()
+        def clearIndividual():
+            fretBoard.renderer.wait()
+            fretBoard.clearAllIndividual()
+        def addScale():
+            fretBoard.addScale(5, 5, 'A', False)
+            fretBoard.renderer.wait()
+        self.run(f'fretBoard.addScale.{size}', lambda: fretBoard.addScale(5, 5, 'A', False),
+                 setup = clearIndividual)
+        self.run(f'fretBoard.clearAllIndividual.{size}', fretBoard.clearAllIndividual,
+                 setup = addScale)
+        fretBoard.renderer.wait()
+        self.run(f'fretBoard.undo.{size}', fretBoard.undo, setup = addScale)
+        # the voicings of all chords, not cached
+        constraints = voicingConstraints(fretBoard.model.numberStrings)
+        self.run(f'chords.table.{size}', lambda: voicingTable(fretBoard.model, constraints),
+                 setup = _voicings.cache_clear, repeat = max(1, self.repeat // 4))
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    # the benchmarks whose fastest run got slower by more than threshold (a fraction)
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['min'] / baseline[name]['min']
+        print(f"{name:40s} {ratio:6.2f}x baseline", file = sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Benchmark the GUI hot paths headless.')
+    parser.add_argument('--output', default = None, help = 'JSON file for the results, default stdout')
+    parser.add_argument('--baseline', default = None, help = 'JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.2,
+                        help = 'relative slow down of the fastest run counted as regression')
+    parser.add_argument('--repeat', type = int, default = 20)
+    parser.add_argument('--trace', default = None,
+                        help = 'also record a Chrome trace of the benchmarked calls into this file')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    if args.trace is not None:
+        tracing.enable(args.trace)
+    benchmarks = Benchmarks(app, args.repeat)
+    benchmarks.runAll()
+    report = {'python': platform.python_version(),
+              'qt': QtCore.QT_VERSION_STR,
+              'platform': platform.platform(),
+              'qpa': app.platformName(),
+              'results': benchmarks.results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(benchmarks.results, baseline, args.threshold)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}", file = sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+import argparse
+import os
+import sys
+from typing import Iterator, List, Tuple
+from model import FretBoardModel, basicNotes, noteIndex
+from scales import catalog
+from diagram import Diagram, scaleModel, scaleHeading
+from fingering import fingeringPresets
+from instrument import Instrument, instruments
+from style import FretStyle
+from svgwriter import SvgWriter
+
+# Practice books: many scale diagrams laid out on pages, e.g.
+#   python book.py --output modes.pdf --roots A --scales "Melodic Minor"
+#   python book.py --output keys.svg --scales Major --modes 1
+# The first one has all modes of a scale, the second one a mode in all
+# keys. A PDF is a single file, an SVG book one file per page (keys-001.svg
+# and so on). Diagrams are generated one by one and every page is written
+# as soon as it is full, so memory does not grow with the size of the book.
+# Within an SVG page the diagrams share the definitions of their glyphs,
+# styles and fretboard grids; the PDF embeds each font once.
+
+# A4 at 96 dpi
+pageWidth = 794
+pageHeight = 1123
+pageMargin = 40
+diagramSpacing = 16
+
+# what a diagram shows: the model and its heading
+BookItem = Tuple[FretBoardModel, str]
+
+
+class PageLayout():
+    # fills the pages row by row with columns diagrams, scaled down to the
+    # width of a column
+    def __init__(self, columns: int = 2, width: float = pageWidth, height: float = pageHeight,
+                 margin: float = pageMargin, spacing: float = diagramSpacing):
+        self.width: float = width
+        self.height: float = height
+        self.margin: float = margin
+        self.spacing: float = spacing
+        self.columns: int = columns
+        self.columnWidth: float = (width - 2 * margin - (columns - 1) * spacing) / columns
+        self._column: int = columns
+        self._rowY: float = 0
+        self._rowHeight: float = 0
+
+    def place(self, width: float, height: float) -> Tuple[bool, float, float, float]:
+        # (whether the diagram starts a new page, x, y from the top left, scale)
+        scale = min(1.0, self.columnWidth / width, (self.height - 2 * self.margin) / height)
+        newPage = False
+        if self._column == self.columns:
+            # a new row, on a new page if it does not fit
+            self._column = 0
+            self._rowY += self._rowHeight + (self.spacing if self._rowHeight else 0)
+            self._rowHeight = 0
+            if self._rowY == 0 or self._rowY + height * scale > self.height - 2 * self.margin:
+                newPage = True
+                self._rowY = 0
+        x = self.margin + self._column * (self.columnWidth + self.spacing)
+        y = self.margin + self._rowY
+        self._column += 1
+        self._rowHeight = max(self._rowHeight, height * scale)
+        return newPage, x, y, scale
+
+
+class Book():
+    # adds diagrams to pages, see SvgBook and PdfBook for the output
+    def __init__(self, layout: PageLayout, fretStyle: FretStyle = None):
+        self.layout: PageLayout = layout
+        self.fretStyle: FretStyle = fretStyle if fretStyle is not None else FretStyle()
+        self.pages: int = 0
+        self.diagrams: int = 0
+        self.backend = None
+
+    def add(self, model: FretBoardModel, heading: str):
+        diagram = Diagram(model, self.fretStyle)
+        lowerFret, upperFret = diagram.fretRange()
+        width, height, _ = diagram.size(heading, lowerFret, upperFret)
+        newPage, x, y, scale = self.layout.place(width, height)
+        if newPage:
+            if self.pages > 0:
+                self.endPage()
+            self.pages += 1
+            self.beginPage()
+        self.backend.place(x, y, scale)
+        diagram.drawDiagram(heading, self.backend)
+        self.diagrams += 1
+
+    def close(self):
+        if self.pages > 0:
+            self.endPage()
+        self.finish()
+
+    def beginPage(self):
+        raise NotImplementedError
+
+    def endPage(self):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class SvgBook(Book):
+    def __init__(self, path: str, layout: PageLayout, fretStyle: FretStyle = None):
+        super().__init__(layout, fretStyle)
+        self.stem: str = os.path.splitext(path)[0]
+        self.paths: List[str] = []
+        self._file = None
+
+    def beginPage(self):
+        path = f"{self.stem}-{self.pages:03d}.svg"
+        self.paths.append(path)
+        self._file = open(path, 'w', encoding = 'utf-8')
+        # a writer per page, the definitions are shared by its diagrams
+        self.backend = SvgWriter(self._file)
+        self.backend.begin(self.layout.width, self.layout.height)
+
+    def endPage(self):
+        self.backend.end()
+        self._file.close()
+        self._file = None
+
+
+class PdfBook(Book):
+    def __init__(self, path: str, layout: PageLayout, fretStyle: FretStyle = None):
+        super().__init__(layout, fretStyle)
+        # Qt is only needed for PDFs
+        from qtbackend import QtPdfBackend
+        self.paths: List[str] = [path]
+        self.backend = QtPdfBackend(path, layout.width, layout.height)
+
+    def beginPage(self):
+        self.backend.begin(self.layout.width, self.layout.height)
+
+    def endPage(self):
+        self.backend.end()
+
+    def finish(self):
+        self.backend.finish()
+
+
+def newBook(path: str, layout: PageLayout, fretStyle: FretStyle = None) -> Book:
+    if path.endswith('.pdf'):
+        return PdfBook(path, layout, fretStyle)
+    if path.endswith('.svg'):
+        return SvgBook(path, layout, fretStyle)
+    raise ValueError(f"unknown book format of {path}, .pdf or .svg")
+
+
+def bookItems(instrument: Instrument, rootNotes: List[int], scaleNames: List[str], modes: List[int] = None,
+              fingering: str = 'nearest', position: int = 0) -> Iterator[BookItem]:
+    # per scale, root and mode (all modes for None) the scale from the
+    # first root on the lowest string at or above position, generated lazily
+    lowestString = instrument.numberStrings - 1
+    openModel = instrument.newModel()
+    for scaleName in scaleNames:
+        for rootNote in rootNotes:
+            fretIndexes = openModel.notePositions[rootNote][lowestString]
+            above = fretIndexes[fretIndexes >= position]
+            fretIndex = int(above[0] if len(above) else fretIndexes[-1])
+            numberModes = catalog.numberModes(scaleName)
+            for mode in (modes if modes is not None else range(numberModes)):
+                if mode >= numberModes:
+                    continue
+                model = scaleModel(instrument, rootNote, scaleName, mode, lowestString, fretIndex, fingering)
+                if model.individualMarked.any():
+                    yield model, scaleHeading(rootNote, scaleName, mode)
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Lay out scale diagrams on the pages of a PDF or SVG book.')
+    parser.add_argument('--output', default = 'book.pdf', help = '.pdf or .svg (one file per page)')
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar')
+    parser.add_argument('--roots', nargs = '+', choices = basicNotes, default = basicNotes)
+    parser.add_argument('--scales', nargs = '+', default = ['Major'],
+                        help = 'names from the scale catalog (scales.txt)')
+    parser.add_argument('--modes', nargs = '+', type = int, default = None,
+                        help = 'numbers of the modes (1 = the scale itself), defaults to all')
+    parser.add_argument('--fingering', choices = ['nearest'] + list(fingeringPresets.keys()), default = 'nearest')
+    parser.add_argument('--position', type = int, default = 0,
+                        help = 'the diagrams start on the first root on the lowest string from this fret on')
+    parser.add_argument('--columns', type = int, default = 2)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    unknownScales = [scaleName for scaleName in args.scales if scaleName not in catalog.scaleNames]
+    if unknownScales:
+        print(f"unknown scales: {', '.join(unknownScales)}", file = sys.stderr)
+        return 2
+    try:
+        book = newBook(args.output, PageLayout(args.columns))
+    except ValueError as e:
+        print(e, file = sys.stderr)
+        return 2
+    modes = [mode - 1 for mode in args.modes] if args.modes is not None else None
+    for model, heading in bookItems(instruments[args.instrument], [noteIndex(root) for root in args.roots],
+                                    args.scales, modes, args.fingering, args.position):
+        book.add(model, heading)
+    book.close()
+    print(f"{book.diagrams} diagrams on {book.pages} pages: {', '.join(book.paths)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
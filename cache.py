@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Content addressed cache for rendered diagrams. Entries are keyed by a hash
+# of everything a render depends on, kept in memory (LRU) and on disk, both
+# bounded in size. The disk part may be shared by several processes; it is
+# best effort, without a writable directory entries are only kept in memory.
+
+
+def defaultCacheDir(part: str) -> str:
+    # one subdirectory per kind of data, e.g. 'diagrams' for the render
+    # cache, whose disk budget and eviction cover its whole directory
+    cacheHome = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cacheHome, 'guitarneck', part)
+
+
+def renderKey(inputs: dict) -> str:
+    # canonical encoding: sorted keys, no whitespace, lists for all sequences
+    canonical = json.dumps(inputs, sort_keys = True, separators = (',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RenderCache():
+    def __init__(self, directory: Optional[str] = None,
+                 maxMemoryBytes: int = 32 * 1024 * 1024, maxDiskBytes: int = 256 * 1024 * 1024):
+        # directory None disables the disk part
+        self.directory: Optional[str] = directory
+        self.maxMemoryBytes: int = maxMemoryBytes
+        self.maxDiskBytes: int = maxDiskBytes
+        self._memory: OrderedDict = OrderedDict()
+        self._memoryBytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._diskBytes: int = 0
+        if self.directory is not None:
+            try:
+                os.makedirs(self.directory, exist_ok = True)
+            except OSError:
+                self.directory = None
+                return
+            self._diskBytes = sum(size for mtime, size, path in self._diskEntries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _remember(self, key: str, data: bytes):
+        if key in self._memory:
+            self._memoryBytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memoryBytes += len(data)
+        while self._memoryBytes > self.maxMemoryBytes and len(self._memory) > 1:
+            evictedKey, evicted = self._memory.popitem(last = False)
+            self._memoryBytes -= len(evicted)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return data
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # the modification time is the recency for the disk eviction
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                self.hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmpPath = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            # write and rename, so concurrent readers never see partial entries
+            fd, tmpPath = tempfile.mkstemp(dir = os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmpPath, path)
+        except OSError:
+            # e.g. a read-only or full disk, the entry stays in memory only
+            if tmpPath is not None:
+                try:
+                    os.remove(tmpPath)
+                except OSError:
+                    pass
+            return
+        # other processes may write to the same directory, so the usage is
+        # only an estimate until the directory is actually walked on eviction
+        self._diskBytes += len(data)
+        if self._diskBytes > self.maxDiskBytes:
+            self.evictDisk()
+
+    def getOrRender(self, key: str, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def _diskEntries(self) -> list:
+        entries = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evictDisk(self):
+        # remove the least recently used entries until a bit below the budget,
+        # so that the directory is not walked again on the next put
+        entries = self._diskEntries()
+        self._diskBytes = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if self._diskBytes <= 0.9 * self.maxDiskBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._diskBytes -= size
+
+    def clear(self):
+        self._memory.clear()
+        self._memoryBytes = 0
@@ -0,0 +1,172 @@
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from model import FretBoardModel, Positions, basicNotes
+from scales import intervalsDict, notesMask
+
+# Playable chord voicings. A voicing is one fret per string (strings in the
+# order of the model, -1 = muted) sounding all notes of the chord and
+# nothing else, with the fretted notes within a window of maxSpan frets.
+# They are enumerated for all windows at once, string by string, and cached
+# per tuning and fret count.
+
+chordTypes: Dict[str, List[str]] = {
+        'maj': ['1', '3', '5'],
+        'm': ['1', 'b3', '5'],
+        'dim': ['1', 'b3', 'b5'],
+        'aug': ['1', '3', '#5'],
+        'sus2': ['1', '2', '5'],
+        'sus4': ['1', '4', '5'],
+        '6': ['1', '3', '5', '6'],
+        'm6': ['1', 'b3', '5', '6'],
+        '7': ['1', '3', '5', 'b7'],
+        'maj7': ['1', '3', '5', '7'],
+        'm7': ['1', 'b3', '5', 'b7'],
+        'mMaj7': ['1', 'b3', '5', '7'],
+        'm7b5': ['1', 'b3', 'b5', 'b7'],
+        'dim7': ['1', 'b3', 'b5', '6'],
+        'add9': ['1', '2', '3', '5'],
+}
+
+
+class VoicingConstraints(NamedTuple):
+    # frets between the lowest and the highest fretted note
+    maxSpan: int = 3
+    maxMuted: int = 2
+    # muted strings between sounding ones
+    innerMutes: bool = False
+    # notes fretted by one finger each, a barre on the lowest fret counts once
+    maxFingers: int = 4
+    # 0 for the root in the bass, 1 for the next chord note and so on, None for any
+    inversion: Optional[int] = None
+
+
+def voicingConstraints(numberStrings: int, inversion: Optional[int] = None) -> VoicingConstraints:
+    # the strings beyond six may be muted as well, no triad spans twelve strings
+    return VoicingConstraints(maxMuted = VoicingConstraints().maxMuted + max(0, numberStrings - 6),
+                              inversion = inversion)
+
+
+def chordIntervals(chordType: str) -> List[int]:
+    return sorted(intervalsDict[interval] for interval in chordTypes[chordType])
+
+
+def chordName(rootNote: int, chordType: str) -> str:
+    return f"{basicNotes[rootNote]} {chordType}"
+
+
+@lru_cache(maxsize = 4096)
+def _voicings(baseNotes: Tuple[int, ...], numberFrets: int, rootNote: int, chordType: str,
+              constraints: VoicingConstraints) -> np.ndarray:
+    intervals = chordIntervals(chordType)
+    mask = notesMask(rootNote + interval for interval in intervals)
+    numberStrings = len(baseNotes)
+    notes = (np.array(baseNotes)[:, None] + np.arange(numberFrets + 1)) % 12
+    isChordNote = (mask >> notes & 1).astype(bool)
+
+    # the windows [start, start + maxSpan] holding the fretted notes, cut at the last fret
+    starts = np.arange(1, max(1, numberFrets) + 1)
+    windowFrets = starts[:, None] + np.arange(constraints.maxSpan + 1)
+    onNeck = windowFrets <= numberFrets
+    windowFrets = np.minimum(windowFrets, numberFrets)
+
+    # per window and string the chord notes the remaining strings can still add
+    available = np.where(onNeck[:, None, :] & isChordNote[:, windowFrets].transpose(1, 0, 2),
+                         1 << notes[:, windowFrets].transpose(1, 0, 2), 0)
+    available = np.bitwise_or.reduce(available, axis=2) | np.where(isChordNote[:, 0], 1 << notes[:, 0], 0)
+    reachable = np.zeros((len(starts), numberStrings + 1), dtype=np.intp)
+    for stringIndex in range(numberStrings - 1, -1, -1):
+        reachable[:, stringIndex] = reachable[:, stringIndex + 1] | available[:, stringIndex]
+
+    # partial voicings of the strings so far, with the window they belong to,
+    # the number of muted strings, the notes sounding, the fingers needed so
+    # far (never fewer with more strings) and whether a sounding string was
+    # followed by a muted one; the partial voicings which cannot become a
+    # voicing any more are dropped string by string
+    windows = np.arange(len(starts))
+    frets = np.empty((len(starts), 0), dtype=np.intp)
+    muted = np.zeros(len(starts), dtype=np.intp)
+    noteBits = np.zeros(len(starts), dtype=np.intp)
+    fretted = np.zeros(len(starts), dtype=np.intp)
+    lowestFret = np.full(len(starts), numberFrets + 1, dtype=np.intp)
+    onLowestFret = np.zeros(len(starts), dtype=np.intp)
+    stopped = np.zeros(len(starts), dtype=bool)
+    for stringIndex in range(numberStrings):
+        # windows x options of this string: muted, open, the window frets; -2 = no option
+        options = np.full((len(starts), constraints.maxSpan + 3), -2, dtype=np.intp)
+        options[:, 0] = -1
+        if isChordNote[stringIndex, 0]:
+            options[:, 1] = 0
+        options[:, 2:] = np.where(onNeck & isChordNote[stringIndex, windowFrets], windowFrets, -2)
+        rowOptions = options[windows]
+        rows, columns = np.nonzero(rowOptions != -2)
+        stringFrets = rowOptions[rows, columns]
+        rowMuted = muted[rows] + (stringFrets < 0)
+        rowBits = noteBits[rows] | np.where(stringFrets >= 0, 1 << notes[stringIndex, stringFrets], 0)
+        rowFretted = fretted[rows] + (stringFrets > 0)
+        rowLowest = np.where(stringFrets > 0, np.minimum(lowestFret[rows], stringFrets), lowestFret[rows])
+        rowOnLowest = np.where(stringFrets <= 0, onLowestFret[rows],
+                               np.where(stringFrets < lowestFret[rows], 1,
+                                        onLowestFret[rows] + (stringFrets == lowestFret[rows])))
+        keep = rowMuted <= constraints.maxMuted
+        keep &= (rowBits | reachable[windows[rows], stringIndex + 1]) == mask
+        keep &= rowFretted - np.maximum(rowOnLowest - 1, 0) <= constraints.maxFingers
+        rowStopped = stopped[rows]
+        if not constraints.innerMutes:
+            keep &= ~(rowStopped & (stringFrets >= 0))
+            rowStopped = rowStopped | ((stringFrets < 0) & (rowMuted < stringIndex + 1))
+        rows, stringFrets = rows[keep], stringFrets[keep]
+        frets = np.column_stack((frets[rows], stringFrets))
+        windows = windows[rows]
+        muted = rowMuted[keep]
+        noteBits = rowBits[keep]
+        fretted = rowFretted[keep]
+        lowestFret = rowLowest[keep]
+        onLowestFret = rowOnLowest[keep]
+        stopped = rowStopped[keep]
+
+    keep = noteBits == mask
+    frets, windows = frets[keep], windows[keep]
+    sounding = frets >= 0
+    fretted = frets > 0
+    soundingNotes = notes[np.arange(numberStrings), np.maximum(frets, 0)]
+    keep = np.ones(len(frets), dtype=bool)
+    # each voicing once: in the window starting on its lowest fretted note,
+    # the ones on open strings only in the first window
+    lowestFret = np.where(fretted, frets, numberFrets + 1).min(axis=1)
+    keep &= np.where(fretted.any(axis=1), lowestFret == starts[windows], windows == 0)
+    if not constraints.innerMutes:
+        firstSounding = np.argmax(sounding, axis=1)
+        lastSounding = numberStrings - 1 - np.argmax(sounding[:, ::-1], axis=1)
+        keep &= sounding.sum(axis=1) == lastSounding - firstSounding + 1
+    onLowestFret = (frets == lowestFret[:, None]).sum(axis=1)
+    keep &= fretted.sum(axis=1) - np.maximum(onLowestFret - 1, 0) <= constraints.maxFingers
+    if constraints.inversion is not None:
+        # the bass is the sounding string with the highest index
+        bassString = numberStrings - 1 - np.argmax(sounding[:, ::-1], axis=1)
+        bassNotes = soundingNotes[np.arange(len(frets)), bassString]
+        if constraints.inversion < len(intervals):
+            keep &= (bassNotes - rootNote) % 12 == intervals[constraints.inversion]
+        else:
+            keep[:] = False
+    voicings = frets[keep].astype(np.int16)
+    voicings.setflags(write = False)
+    return voicings
+
+
+def chordVoicings(model: FretBoardModel, rootNote: int, chordType: str,
+                  constraints: VoicingConstraints = None) -> np.ndarray:
+    # voicings x strings frets, ordered by the lowest fretted note
+    constraints = constraints if constraints is not None else VoicingConstraints()
+    return _voicings(tuple(int(note) for note in model.baseNotes), model.numberFrets, rootNote,
+                     chordType, constraints)
+
+
+def voicingTable(model: FretBoardModel, constraints: VoicingConstraints = None) -> Dict[Tuple[int, str], np.ndarray]:
+    return {(rootNote, chordType): chordVoicings(model, rootNote, chordType, constraints)
+            for rootNote in range(12) for chordType in chordTypes}
+
+
+def voicingPositions(voicing: np.ndarray) -> Positions:
+    stringIndexes = np.nonzero(voicing >= 0)[0]
+    return stringIndexes, voicing[stringIndexes].astype(np.intp)
@@ -0,0 +1,348 @@
+import drawSvg as dsvg
+import numpy as np
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from style import FretStyle
+from model import FretBoardModel, Positions, basicNotes, numberHeatLevels
+from scales import modeNotes, parentRoot
+from cache import RenderCache, renderKey
+from fingering import fingeringPresets, placeFingering
+from instrument import Instrument
+import tracing
+
+# Scale diagrams are rendered from the headless model only, so they can be
+# generated by the GUI as well as without a display (see export.py).
+
+stringColor = '#0000aa'
+stringWidth = 3
+headingFontSize = 26
+headingColor = '#000000'
+marginX = 30
+marginTop = 50
+# estimated width of a character of the heading per font size
+headingCharWidth = 0.6
+# a heatmap is drawn as halos from white to heatColor around the notes
+heatColor = (0xff, 0x60, 0x00)
+heatHalo = 4
+# part of the cache keys of the diagrams, to be increased with every change
+# of how they are drawn
+diagramVersion = 1
+
+
+def heatFill(level: int) -> str:
+    fraction = level / numberHeatLevels
+    return '#' + ''.join(f"{round(255 + (channel - 255) * fraction):02x}" for channel in heatColor)
+
+
+def scaleHeading(rootNote: int, scaleName: str, mode: int) -> str:
+    baseNote = basicNotes[parentRoot(rootNote, scaleName, mode)]
+    return f"{baseNote} {scaleName}, Mode {mode + 1}"
+
+
+class DiagramBackend():
+    # what the draw methods of Diagram paint on; coordinates have their origin
+    # in the lower left corner and y pointing upwards, text is placed by its
+    # baseline and anchored 'left' or 'middle'
+    name: str = None
+
+    def begin(self, width: float, height: float):
+        raise NotImplementedError
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, strokeWidth: float, stroke: str):
+        raise NotImplementedError
+
+    def circle(self, cx: float, cy: float, r: float, fill: str, strokeWidth: float, stroke: str):
+        raise NotImplementedError
+
+    def text(self, text: str, fontSize: float, x: float, y: float, fill: str, anchor: str):
+        raise NotImplementedError
+
+    def group(self, key: tuple, draw: Callable[[float, float], None], x: float, y: float):
+        # draw(x, y) paints something that looks the same for equal keys, a
+        # backend may define it once and reuse it (see SvgWriter)
+        draw(x, y)
+
+    def end(self):
+        pass
+
+    def encode(self, fmt: str) -> bytes:
+        raise NotImplementedError
+
+
+class SvgBackend(DiagramBackend):
+    # drawSvg elements, rasterized by Cairo
+    name = 'drawsvg'
+
+    def __init__(self):
+        self.drawing: dsvg.Drawing = None
+
+    def begin(self, width: float, height: float):
+        self.drawing = dsvg.Drawing(width, height, origin = (0, 0))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, strokeWidth: float, stroke: str):
+        self.drawing.append(dsvg.Line(x1, y1, x2, y2, stroke_width = strokeWidth, stroke = stroke))
+
+    def circle(self, cx: float, cy: float, r: float, fill: str, strokeWidth: float, stroke: str):
+        self.drawing.append(dsvg.Circle(cx, cy, r, fill = fill, stroke_width = strokeWidth, stroke = stroke))
+
+    def text(self, text: str, fontSize: float, x: float, y: float, fill: str, anchor: str):
+        self.drawing.append(dsvg.Text(text, fontSize, x, y, fill = fill,
+                                      center = False, text_anchor = anchor))
+
+    def encode(self, fmt: str) -> bytes:
+        if fmt == 'svg':
+            return self.drawing.asSvg().encode('utf-8')
+        self.drawing.setPixelScale(1)
+        return self.drawing.rasterize().pngData
+
+
+def newBackend(name: str) -> DiagramBackend:
+    if name == 'drawsvg':
+        return SvgBackend()
+    if name == 'stream':
+        from svgwriter import SvgWriter
+        return SvgWriter()
+    if name == 'qt':
+        # optional, only needed for painting without the SVG detour
+        from qtbackend import QtBackend
+        return QtBackend()
+    raise ValueError(f"unknown diagram backend {name}")
+
+
+def defaultBackend(fmt: str) -> str:
+    # SVGs are streamed, raster images are painted directly with Qt if it is available
+    if fmt == 'svg':
+        return 'stream'
+    try:
+        import PyQt5.QtGui
+    except ImportError:
+        return 'drawsvg'
+    return 'qt'
+
+
+class Diagram():
+    def __init__(self, model: FretBoardModel, fretStyle: FretStyle = None):
+        self.model: FretBoardModel = model
+        self.fretStyle: FretStyle = fretStyle if fretStyle is not None else FretStyle()
+
+    def drawFretNumber(self, d: DiagramBackend, fretIndex: int, x: float, y: float) -> float:
+        fs = self.fretStyle
+
+        textY = y - fs.fontSize / 4.0
+        d.text(str(fretIndex), fs.fontSize, x + fs.circleX, textY,
+               fill = fs.circleStrokeColor, anchor = 'middle')
+        return fs.fretWidth
+
+    def drawFret(self, d: DiagramBackend, x: float, y: float, strings: int, offsets: np.ndarray = None) -> float:
+        # offsets: per string in fret widths, the fan of a multiscale neck
+        fs = self.fretStyle
+        if offsets is None or not offsets.any():
+            fretBoardHeight = (strings - 1) * fs.fretHeight
+            d.line(x, y, x, y - fretBoardHeight, strokeWidth = stringWidth, stroke = stringColor)
+            return fs.fretWidth
+        xs = x + offsets * fs.fretWidth
+        for stringIndex in range(strings - 1):
+            d.line(xs[stringIndex], y - stringIndex * fs.fretHeight,
+                   xs[stringIndex + 1], y - (stringIndex + 1) * fs.fretHeight,
+                   strokeWidth = stringWidth, stroke = stringColor)
+        return fs.fretWidth
+
+    def fretFan(self, lowerFret: int, upperFret: int) -> np.ndarray:
+        # strings x lines offsets of the fret lines drawn by drawFrets; the
+        # first line stands for the wire left of lowerFret
+        wires = np.maximum(np.arange(lowerFret - 1, upperFret + 1), 0)
+        return self.model.fanOffsets(wires)
+
+    def drawNote(self, d: DiagramBackend, stringIndex: int, fretIndex: int, x: float, y: float) -> float:
+        fs = self.fretStyle
+        marked = self.model.individualMarked[stringIndex, fretIndex]
+        heatLevel = int(self.model.heatLevels[stringIndex, fretIndex])
+        if heatLevel > 0:
+            # a halo around the circle of a marked note
+            fill = heatFill(heatLevel)
+            d.circle(x + fs.circleX, y, fs.radius + heatHalo, fill = fill, strokeWidth = 1, stroke = fill)
+        if marked:
+            d.circle(x + fs.circleX, y, fs.radius,
+                     fill = fs.circleFillColor, strokeWidth = 2, stroke = fs.circleStrokeColor)
+        if marked or heatLevel > 0:
+            textY = y - fs.fontSize / 4.0
+            d.text(self.model.noteName(stringIndex, fretIndex), fs.fontSize, x + fs.circleX, textY,
+                   fill = fs.circleStrokeColor, anchor = 'middle')
+        return fs.fretWidth
+
+    def drawFrets(self, d: DiagramBackend, lowerFret: int, upperFret: int,
+                         x: float, y: float, strings: int):
+        fan = self.fretFan(lowerFret, upperFret)
+        for line in range(upperFret - lowerFret + 2):
+            x += self.drawFret(d, x, y, strings, fan[:, line])
+
+    def drawString(self, d: DiagramBackend, stringIndex: int, lowerFret: int, upperFret: int,
+                         x: float, y: float) -> float:
+        fs = self.fretStyle
+        stringLength = (upperFret - lowerFret + 1) * fs.fretWidth
+        d.line(x, y, x + stringLength, y,
+               strokeWidth = stringWidth * pow(1.1, stringIndex), stroke = stringColor)
+        return fs.fretHeight
+
+    def drawStringMarked(self, d: DiagramBackend, stringIndex: int, lowerFret: int, upperFret: int,
+                                x: float, y: float) -> float:
+        for fretIndex in range(lowerFret, upperFret + 1):
+            x += self.drawNote(d, stringIndex, fretIndex, x, y)
+        return self.fretStyle.fretHeight
+
+    def drawFretBoard(self, d: DiagramBackend, lowerFret:int, upperFret: int, x: float, y: float):
+        # the grid looks the same for all diagrams of a span of frets, unless the frets fan
+        def draw(x: float, y: float):
+            y_cur = y
+            for stringIndex in range(self.model.numberStrings):
+                y_cur -= self.drawString(d, stringIndex, lowerFret, upperFret, x, y_cur)
+            self.drawFrets(d, lowerFret, upperFret, x, y, self.model.numberStrings)
+        fs = self.fretStyle
+        key = ('fretBoard', self.model.numberStrings, upperFret - lowerFret, fs.fretWidth, fs.fretHeight,
+               self.fretFan(lowerFret, upperFret).round(3).tobytes())
+        d.group(key, draw, x, y)
+
+    def drawCurrentMarked(self, d: DiagramBackend, lowerFret:int, upperFret: int, x: float, y: float) -> float:
+        y_cur = y
+        for stringIndex in range(self.model.numberStrings):
+            y_cur -= self.drawStringMarked(d, stringIndex, lowerFret, upperFret, x, y_cur)
+        return y - y_cur
+
+    def drawFretNumbers(self, d: DiagramBackend, lowerFret: int, upperFret: int,
+                         x: float, y: float) -> float:
+        x_cur = x
+        for fretIndex in range(lowerFret, upperFret + 1):
+            x_cur += self.drawFretNumber(d, fretIndex, x_cur, y)
+        return self.fretStyle.fretHeight
+
+    def drawHeading(self, d: DiagramBackend, heading: str, x: float, y: float) -> float :
+        d.text(heading, headingFontSize, x, y, fill = headingColor, anchor = 'left')
+        return headingFontSize
+
+    def fretRange(self) -> (int, int):
+        # the marked frets, the used ones of a heatmap without marks
+        lowerFret, upperFret = self.model.getMarkedRange()
+        if lowerFret > upperFret:
+            lowerFret, upperFret = self.model.getHeatRange()
+        return lowerFret, upperFret
+
+    def size(self, heading: str, lowerFret: int, upperFret: int) -> (float, float, float):
+        # width, height and the x of the open end of the strings; the canvas
+        # grows with the marked frets, the strings and the fan of the frets
+        fs = self.fretStyle
+        fan = self.fretFan(lowerFret, upperFret) * fs.fretWidth
+        fanLeft = max(0.0, -float(fan.min(initial = 0)))
+        fanRight = max(0.0, float(fan.max(initial = 0)))
+        numberFrets = max(0, upperFret - lowerFret + 1)
+        width = max(2 * marginX + fanLeft + numberFrets * fs.fretWidth + fanRight,
+                    2 * marginX + len(heading) * headingFontSize * headingCharWidth)
+        height = marginTop + headingFontSize + 6 + (self.model.numberStrings + 2) * fs.fretHeight
+        return width, height, marginX + fanLeft
+
+    def drawDiagram(self, heading: str, d: DiagramBackend = None) -> DiagramBackend:
+        lowerFret, upperFret = self.fretRange()
+        width, height, x = self.size(heading, lowerFret, upperFret)
+        d = d if d is not None else SvgBackend()
+        d.begin(width, height)
+
+        y = height - marginTop
+        y -= self.drawHeading(d, heading, marginX, y) + 6
+        y -= self.drawFretNumbers(d, lowerFret, upperFret, x, y)
+        self.drawFretBoard(d, lowerFret, upperFret, x, y)
+        y -= self.drawCurrentMarked(d, lowerFret, upperFret, x, y)
+        y -= self.drawFretNumbers(d, lowerFret, upperFret, x, y)
+        d.end()
+        return d
+
+
+def diagramKey(model: FretBoardModel, heading: str, fretStyle: FretStyle, fmt: str,
+               backend: str) -> str:
+    # a diagram shows the heading and the individually marked notes of the
+    # current tuning, drawn with the given style
+    return renderKey({'version': diagramVersion,
+                      'tuning': model.tuning,
+                      'numberFrets': model.numberFrets,
+                      'scaleLengths': None if model.scaleLengths is None else model.scaleLengths.tolist(),
+                      'perpendicularFret': model.perpendicularFret,
+                      'heading': heading,
+                      'marked': model.individualBitsets(),
+                      'heat': model.heatLevels.tolist() if model.heatLevels.any() else None,
+                      'style': fretStyle.params(),
+                      'diagram': [stringColor, stringWidth, headingFontSize, headingColor,
+                                  marginX, marginTop, headingCharWidth, heatColor, heatHalo],
+                      'format': fmt,
+                      'backend': backend})
+
+
+def renderDiagram(model: FretBoardModel, heading: str, fmt: str, fretStyle: FretStyle = None,
+                  cache: Optional[RenderCache] = None, backend: str = None,
+                  durations: Dict[str, float] = None) -> bytes:
+    # durations: gets the microseconds of drawing and encoding by span name,
+    # unless the diagram comes from the cache
+    fretStyle = fretStyle if fretStyle is not None else FretStyle()
+    backend = backend if backend is not None else defaultBackend(fmt)
+    def render() -> bytes:
+        start = time.perf_counter()
+        with tracing.span('Diagram.drawDiagram', backend = backend):
+            d = Diagram(model, fretStyle).drawDiagram(heading, newBackend(backend))
+        drawn = time.perf_counter()
+        with tracing.span('DiagramBackend.encode', backend = backend, format = fmt):
+            data = d.encode(fmt)
+        if durations is not None:
+            durations['Diagram.drawDiagram'] = (drawn - start) * 1e6
+            durations['DiagramBackend.encode'] = (time.perf_counter() - drawn) * 1e6
+        return data
+    if cache is None:
+        return render()
+    return cache.getOrRender(diagramKey(model, heading, fretStyle, fmt, backend), render)
+
+
+# cache of a worker process rendering for the GUI, see renderToFile
+_workerCache: Optional[RenderCache] = None
+
+
+def renderToFile(model: FretBoardModel, heading: str, fmt: str, fretStyle: FretStyle,
+                 cacheDir: Optional[str], directory: str, timed: bool = False) -> Tuple[str, Dict[str, float]]:
+    # runs in a worker process, renders into a new file in directory and
+    # returns its path; the caller decides whether it is still wanted.
+    # Tracing is off in the worker, if timed the durations of drawing and
+    # encoding are returned for the caller's trace (see renderDiagram).
+    global _workerCache
+    if cacheDir is not None and _workerCache is None:
+        _workerCache = RenderCache(cacheDir)
+    durations: Dict[str, float] = {}
+    data = renderDiagram(model, heading, fmt, fretStyle, _workerCache, durations = durations if timed else None)
+    fd, path = tempfile.mkstemp(suffix = '.' + fmt, dir = directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path, durations
+
+
+def scaleModel(instrument: Instrument, rootNote: int, scaleName: str, mode: int,
+               stringIndex: int, fretIndex: int, fingering: str = 'nearest') -> FretBoardModel:
+    # same as a middle click on (stringIndex, fretIndex) on an unmarked neck;
+    # fingering is 'nearest' (see FretBoardModel.placeScale) or a fingering preset
+    model = instrument.newModel()
+    notes = modeNotes(rootNote, scaleName, mode)
+    if fingering == 'nearest':
+        model.placeScale(stringIndex, fretIndex, notes, 3)
+    else:
+        placeFingering(model, stringIndex, fretIndex, notes, fingeringPresets[fingering])
+    return model
+
+
+def markedModel(instrument: Instrument, positions: Positions) -> FretBoardModel:
+    model = instrument.newModel()
+    stringIndexes, fretIndexes = positions
+    model.setIndividualPositions((np.asarray(stringIndexes, dtype=np.intp), np.asarray(fretIndexes, dtype=np.intp)),
+                                 True)
+    return model
+
+
+def scaleDiagram(instrument: Instrument, rootNote: int, scaleName: str, mode: int,
+                 stringIndex: int, fretIndex: int, fretStyle: FretStyle = None,
+                 d: DiagramBackend = None, fingering: str = 'nearest') -> DiagramBackend:
+    model = scaleModel(instrument, rootNote, scaleName, mode, stringIndex, fretIndex, fingering)
+    return Diagram(model, fretStyle).drawDiagram(scaleHeading(rootNote, scaleName, mode), d)
@@ -0,0 +1,55 @@
+from typing import Callable, Dict, Hashable, List
+from PyQt5 import QtCore
+
+# Central dispatch of the changes requested by the views. Events posted
+# during one pass of the event loop are collected and delivered together as
+# one change set at the start of the next pass. Events with the same type
+# and key are coalesced: by default the later value replaces the earlier
+# one (e.g. the retunes of a string while scrolling through its note
+# selector), toggles are combined such that two of them cancel out.
+
+# event type -> key -> value, in the order of the last post of each key
+ChangeSet = Dict[str, Dict[Hashable, object]]
+
+
+def replaced(previous: object, value: object) -> object:
+    return value
+
+
+def toggled(previous: bool, value: bool) -> bool:
+    return previous != value
+
+
+class EventBus():
+    def __init__(self):
+        self._handlers: List[Callable[[ChangeSet], None]] = []
+        self._pending: ChangeSet = {}
+        self._scheduled: bool = False
+        # statistics, e.g. for benchmarks
+        self.posted: int = 0
+        self.delivered: int = 0
+
+    def subscribe(self, handler: Callable[[ChangeSet], None]):
+        self._handlers.append(handler)
+
+    def post(self, eventType: str, key: Hashable, value: object = True,
+             combine: Callable[[object, object], object] = replaced):
+        self.posted += 1
+        events = self._pending.setdefault(eventType, {})
+        if key in events:
+            value = combine(events.pop(key), value)
+        events[key] = value
+        if not self._scheduled:
+            self._scheduled = True
+            QtCore.QTimer.singleShot(0, self.flush)
+
+    def flush(self):
+        # delivers the pending events right away, e.g. when the caller needs
+        # the changes applied before it continues
+        self._scheduled = False
+        if not self._pending:
+            return
+        changes, self._pending = self._pending, {}
+        self.delivered += 1
+        for handler in self._handlers:
+            handler(changes)
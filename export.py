@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from model import basicNotes, noteIndex
+from instrument import Instrument, instruments
+from scales import catalog, modeNotes
+from diagram import scaleModel, markedModel, scaleHeading, renderDiagram
+from fingering import fingeringPresets, findFingerings
+from cache import RenderCache, defaultCacheDir
+
+# Headless batch export of scale diagrams, e.g.
+#   python export.py --output-dir diagrams --format svg png
+# renders every root x scale x mode x starting position, which is the same
+# as middle clicking every note on the lowest string for every scale/mode.
+
+# the last element are the marked positions of an optimized fingering
+# (strings, frets), None for the nearest notes fashion
+Job = Tuple[Instrument, int, str, int, int, str, List[str], str, str, Optional[Tuple[List[int], List[int]]]]
+
+# one cache per worker process, they share the disk part
+_renderCache: RenderCache = None
+
+
+def fileName(rootNote: int, scaleName: str, mode: int, fretIndex: int) -> str:
+    rootName = basicNotes[rootNote].replace('#', 'sharp')
+    scaleSlug = scaleName.lower().replace(' ', '-')
+    return f"{rootName}_{scaleSlug}_mode{mode + 1}_fret{fretIndex:02d}"
+
+
+def createJobs(instrument: Instrument, rootNotes: List[int], scaleNames: List[str],
+               outputDir: str, formats: List[str], cacheDir: str = None,
+               rasterBackend: str = None, fingering: str = 'nearest') -> List[Job]:
+    model = instrument.newModel()
+    lowestString = model.numberStrings - 1
+    jobs: List[Job] = []
+    for rootNote in rootNotes:
+        # the starting positions are the occurrences of the root on the lowest string
+        fretIndexes = model.notePositions[rootNote][lowestString]
+        for scaleName in scaleNames:
+            for mode in range(catalog.numberModes(scaleName)):
+                # the fingerings of all starting positions are searched at once
+                if fingering == 'nearest':
+                    fingerings = [None] * len(fretIndexes)
+                else:
+                    fingerings = findFingerings(model, lowestString, fretIndexes,
+                                                modeNotes(rootNote, scaleName, mode), fingeringPresets[fingering])
+                for fretIndex, found in zip(fretIndexes, fingerings):
+                    if fingering != 'nearest' and found is None:
+                        continue
+                    positions = (found.positions[0].tolist(), found.positions[1].tolist()) if found else None
+                    jobs.append((instrument, rootNote, scaleName, mode, int(fretIndex),
+                                 os.path.join(outputDir, fileName(rootNote, scaleName, mode, fretIndex)),
+                                 formats, cacheDir, rasterBackend, positions))
+    return jobs
+
+
+def renderJob(job: Job) -> str:
+    global _renderCache
+    (instrument, rootNote, scaleName, mode, fretIndex, path, formats, cacheDir, rasterBackend,
+     positions) = job
+    if cacheDir is not None and _renderCache is None:
+        _renderCache = RenderCache(cacheDir)
+    if positions is None:
+        model = scaleModel(instrument, rootNote, scaleName, mode, instrument.numberStrings - 1, fretIndex)
+    else:
+        model = markedModel(instrument, positions)
+    heading = scaleHeading(rootNote, scaleName, mode)
+    for fmt in formats:
+        with open(f"{path}.{fmt}", 'wb') as f:
+            backend = rasterBackend if fmt == 'png' else None
+            f.write(renderDiagram(model, heading, fmt, cache = _renderCache, backend = backend))
+    return path
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Render scale diagrams without the GUI.')
+    parser.add_argument('--output-dir', default = 'diagrams')
+    parser.add_argument('--format', nargs = '+', choices = ['svg', 'png'], default = ['svg'])
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar',
+                        help = 'strings, frets and scale lengths, see instrument.py')
+    parser.add_argument('--tuning', nargs = '+', choices = basicNotes, default = None,
+                        help = 'from the lowest to the highest string, defaults to the tuning of the instrument')
+    parser.add_argument('--frets', type = int, default = None,
+                        help = 'defaults to the frets of the instrument')
+    parser.add_argument('--scale-lengths', nargs = '+', type = float, default = None,
+                        help = 'mm per string like the tuning, defaults to the ones of the instrument')
+    parser.add_argument('--roots', nargs = '+', choices = basicNotes, default = basicNotes)
+    parser.add_argument('--scales', nargs = '+', default = catalog.namedScales,
+                        help = 'names from the scale catalog (scales.txt), defaults to the named scales')
+    parser.add_argument('--fingering', choices = ['nearest'] + list(fingeringPresets.keys()), default = 'nearest',
+                        help = 'the notes nearest to the starting fret, three per string, or an optimized '
+                               'fingering (2, 3 or 4 notes per string, CAGED box)')
+    parser.add_argument('--raster-backend', choices = ['qt', 'drawsvg'], default = None,
+                        help = 'paint PNGs with Qt directly or rasterize the SVG with Cairo, '
+                               'defaults to qt if PyQt5 is available')
+    parser.add_argument('--cache-dir', default = defaultCacheDir('diagrams'),
+                        help = 'render cache shared with the GUI')
+    parser.add_argument('--no-cache', action = 'store_true')
+    parser.add_argument('--workers', type = int, default = None,
+                        help = 'number of worker processes, defaults to the number of CPUs')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    unknownScales = [scaleName for scaleName in args.scales if scaleName not in catalog.scaleNames]
+    if unknownScales:
+        print(f"unknown scales: {', '.join(unknownScales)}", file = sys.stderr)
+        return 2
+    instrument = instruments[args.instrument]
+    if args.tuning is not None:
+        instrument = instrument.withTuning(args.tuning)
+        if instrument.scaleLengths is not None and len(instrument.scaleLengths) != len(args.tuning):
+            # the fan of another number of strings does not apply
+            instrument = instrument._replace(scaleLengths = None, perpendicularFret = 0)
+    if args.frets is not None:
+        instrument = instrument._replace(numberFrets = args.frets,
+                                         perpendicularFret = min(instrument.perpendicularFret, args.frets))
+    if args.scale_lengths is not None:
+        instrument = instrument._replace(scaleLengths = tuple(args.scale_lengths))
+    try:
+        instrument.check()
+    except ValueError as e:
+        print(f"invalid instrument: {e}", file = sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok = True)
+    jobs = createJobs(instrument, [noteIndex(root) for root in args.roots],
+                      args.scales, args.output_dir, args.format,
+                      None if args.no_cache else args.cache_dir, args.raster_backend, args.fingering)
+    workers = args.workers or os.cpu_count() or 1
+    # big chunks keep the inter process overhead small compared to rendering
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        rendered = sum(1 for path in executor.map(renderJob, jobs, chunksize = chunksize))
+    print(f"rendered {rendered} diagrams to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
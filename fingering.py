@@ -0,0 +1,152 @@
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from model import FretBoardModel, Positions, noPositions
+
+# Fingerings of a scale by dynamic programming. Starting with the root on
+# a given string, the ascending scale degrees are distributed over that
+# string and the higher ones, each string taking a number of consecutive
+# degrees allowed by the constraints. Among the placements of the most
+# notes the one with the least cost is taken, the cost being the stretch
+# of the hand on each string plus the shifts of the hand between strings.
+# The frets only depend on the pitch of a degree relative to the open
+# strings, so all starting frets are searched at once.
+
+
+class FingeringConstraints(NamedTuple):
+    # numbers of notes a string may take
+    notesPerString: Tuple[int, ...] = (3,)
+    # frets between the first and the last note on a string
+    maxStretch: int = 4
+    # frets the notes have to stay within, relative to the starting fret
+    window: Optional[Tuple[int, int]] = None
+    stretchWeight: float = 1.0
+    shiftWeight: float = 1.0
+
+
+fingeringPresets: Dict[str, FingeringConstraints] = {
+        '3nps': FingeringConstraints((3,), 4),
+        '2nps': FingeringConstraints((2,), 4),
+        '4nps': FingeringConstraints((4,), 5),
+        # a box of five frets around the root, as in the CAGED shapes
+        'caged': FingeringConstraints((1, 2, 3), 3, (-1, 3), 1.0, 0.5),
+}
+
+
+class Fingering(NamedTuple):
+    positions: Positions
+    cost: float
+    # from the starting string up to the last one used
+    notesPerString: Tuple[int, ...]
+
+
+def openPitches(model: FretBoardModel) -> np.ndarray:
+    # pitch of the open strings in semitones above the lowest one, assuming
+    # each string is tuned at most an octave above the next lower one
+    steps = (model.baseNotes[:-1] - model.baseNotes[1:]) % 12
+    return np.append(np.cumsum(steps[::-1])[::-1], 0)
+
+
+def degreePitches(notes: List[int], count: int) -> np.ndarray:
+    # semitones of the first count ascending scale degrees above notes[0]
+    intervals = np.array(sorted((note - notes[0]) % 12 for note in notes))
+    degrees = np.arange(count)
+    return 12 * (degrees // len(intervals)) + intervals[degrees % len(intervals)]
+
+
+def findFingerings(model: FretBoardModel, stringIndex: int, fretIndexes: np.ndarray,
+                   notes: List[int], constraints: FingeringConstraints = None) -> List[Optional[Fingering]]:
+    # the best fingering for each of the starting frets (on which notes[0]
+    # is expected), None if not even the starting string can be fingered
+    constraints = constraints if constraints is not None else fingeringPresets['3nps']
+    starts = np.asarray(fretIndexes, dtype=np.intp)
+    counts = sorted(constraints.notesPerString)
+    maxCount = counts[-1]
+    # a state is the number of notes placed on the strings below
+    numberStates = (stringIndex + 1) * maxCount + 1
+    pitches = degreePitches(notes, numberStates + maxCount)
+    stringPitches = openPitches(model)
+    # starts x degrees fret of each degree, per string
+    frets = [starts[:, None] + pitches[None, :] - (stringPitches[s] - stringPitches[stringIndex])
+             for s in range(stringIndex + 1)]
+    lowest = np.zeros(len(starts), dtype=np.intp)
+    highest = np.full(len(starts), model.numberFrets, dtype=np.intp)
+    if constraints.window is not None:
+        lowest = np.maximum(lowest, starts + constraints.window[0])
+        highest = np.minimum(highest, starts + constraints.window[1])
+
+    states = np.arange(numberStates)
+    cost = np.full((len(starts), numberStates), np.inf)
+    cost[:, 0] = 0.0
+    # per string the count chosen to reach a state, continuing on the next
+    # string (choices) or stopping on this one (finalChoices); 0 = unreachable
+    choices, finalChoices, finalCosts = {}, {}, []
+    for s in range(stringIndex, -1, -1):
+        candidates = np.full((len(counts), len(starts), numberStates), np.inf)
+        finalCandidates = np.full((len(counts), len(starts), numberStates), np.inf)
+        for c, count in enumerate(counts):
+            first = frets[s][:, states]
+            last = frets[s][:, states + count - 1]
+            stretch = last - first
+            valid = ((first >= lowest[:, None]) & (last <= highest[:, None])
+                     & (stretch <= constraints.maxStretch))
+            total = np.where(valid, cost + constraints.stretchWeight * stretch, np.inf)
+            reached = states[:numberStates - count] + count
+            finalCandidates[c][:, reached] = total[:, :numberStates - count]
+            if s > 0:
+                shift = np.abs(frets[s - 1][:, states + count] - first)
+                candidates[c][:, reached] = (total + constraints.shiftWeight * shift)[:, :numberStates - count]
+        finalChoices[s] = np.where(np.isfinite(finalCandidates).any(axis=0),
+                                   np.array(counts)[np.argmin(finalCandidates, axis=0)], 0)
+        finalCosts.append(finalCandidates.min(axis=0))
+        if s > 0:
+            choices[s] = np.where(np.isfinite(candidates).any(axis=0),
+                                  np.array(counts)[np.argmin(candidates, axis=0)], 0)
+            cost = candidates.min(axis=0)
+
+    # the most notes first, then the least cost; finalCosts[k] belongs to string stringIndex - k
+    finalCosts = np.array(finalCosts)
+    reachable = np.isfinite(finalCosts).any(axis=0)
+    fingerings: List[Optional[Fingering]] = []
+    for i in range(len(starts)):
+        reachedStates = np.nonzero(reachable[i])[0]
+        if len(reachedStates) == 0:
+            fingerings.append(None)
+            continue
+        state = reachedStates[-1]
+        lastString = stringIndex - int(np.argmin(finalCosts[:, i, state]))
+        fingeringCost = float(finalCosts[stringIndex - lastString, i, state])
+        stringCounts = [int(finalChoices[lastString][i, state])]
+        state -= stringCounts[0]
+        for s in range(lastString + 1, stringIndex + 1):
+            count = int(choices[s][i, state])
+            stringCounts.append(count)
+            state -= count
+        stringCounts.reverse()
+        stringIndexes = np.repeat(np.arange(stringIndex, stringIndex - len(stringCounts), -1), stringCounts)
+        degrees = np.arange(len(stringIndexes))
+        fretIndexes = np.array([frets[s][i, d] for s, d in zip(stringIndexes, degrees)], dtype=np.intp)
+        fingerings.append(Fingering((stringIndexes, fretIndexes), fingeringCost, tuple(stringCounts)))
+    return fingerings
+
+
+def findFingering(model: FretBoardModel, stringIndex: int, fretIndex: int, notes: List[int],
+                  constraints: FingeringConstraints = None) -> Optional[Fingering]:
+    return findFingerings(model, stringIndex, [fretIndex], notes, constraints)[0]
+
+
+def allFingerings(model: FretBoardModel, stringIndex: int, notes: List[int],
+                  constraints: FingeringConstraints = None) -> List[Fingering]:
+    # every position of the scale starting on stringIndex, i.e. one
+    # fingering for each occurrence of its root on that string
+    fretIndexes = model.notePositions[notes[0]][stringIndex]
+    return [fingering for fingering in findFingerings(model, stringIndex, fretIndexes, notes, constraints)
+            if fingering is not None]
+
+
+def placeFingering(model: FretBoardModel, stringIndex: int, fretIndex: int, notes: List[int],
+                   constraints: FingeringConstraints = None) -> Positions:
+    # like FretBoardModel.placeScale, returns the positions whose individual mark changed
+    fingering = findFingering(model, stringIndex, fretIndex, notes, constraints)
+    if fingering is None:
+        return noPositions()
+    return model.setIndividualPositions(fingering.positions, True)
@@ -1,10 +1,21 @@
+import argparse
+import os
 import sys
 import ui
+import tracing
+from instrument import instruments
 from PyQt5.QtWidgets import (QApplication)
 
 if __name__ == '__main__':
     
-    app = QApplication(sys.argv)
-    ex = ui.MainWindow()
+    # GUITARNECK_TRACE=trace.json records the hot paths, see tracing.py
+    if os.environ.get('GUITARNECK_TRACE'):
+        tracing.enable(os.environ['GUITARNECK_TRACE'])
+    parser = argparse.ArgumentParser(description = 'Explore scales and chords on the neck.')
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar',
+                        help = 'strings, frets and scale lengths, see instrument.py')
+    args, qtArguments = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qtArguments)
+    ex = ui.MainWindow(instruments[args.instrument])
     sys.exit(app.exec_())
 
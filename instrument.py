@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from model import FretBoardModel, basicNotes, standardTuning
+
+# The geometry of an instrument: its strings (tuning), frets and scale
+# lengths. Different scale lengths per string make a multiscale (fanned
+# frets) neck, whose frets are perpendicular to the neck at perpendicularFret.
+
+maxStrings = 12
+maxFrets = 48
+# mm, 25.5"
+defaultScaleLength = 648.0
+
+
+class Instrument(NamedTuple):
+    # from the lowest to the highest string
+    tuning: List[str]
+    numberFrets: int = 24
+    # mm per string like the tuning, None for defaultScaleLength on all strings
+    scaleLengths: Optional[Tuple[float, ...]] = None
+    perpendicularFret: float = 0
+    # MIDI pitch of the lowest open string (E2), the octave of the lowest
+    # string of other tunings is the one nearest to it
+    lowestPitch: int = 40
+
+    @property
+    def numberStrings(self) -> int:
+        return len(self.tuning)
+
+    def check(self):
+        if not 1 <= self.numberStrings <= maxStrings:
+            raise ValueError(f"{self.numberStrings} strings, at most {maxStrings} are supported")
+        if not 1 <= self.numberFrets <= maxFrets:
+            raise ValueError(f"{self.numberFrets} frets, at most {maxFrets} are supported")
+        unknownNotes = [noteName for noteName in self.tuning if noteName not in basicNotes]
+        if unknownNotes:
+            raise ValueError(f"unknown notes in the tuning: {', '.join(unknownNotes)}")
+        if self.scaleLengths is not None:
+            if len(self.scaleLengths) != self.numberStrings:
+                raise ValueError(f"{len(self.scaleLengths)} scale lengths for {self.numberStrings} strings")
+            if min(self.scaleLengths) <= 0:
+                raise ValueError("scale lengths must be positive")
+        if not 0 <= self.perpendicularFret <= self.numberFrets:
+            raise ValueError(f"perpendicular fret {self.perpendicularFret} is not on the neck")
+        if not 0 <= self.lowestPitch <= 127:
+            raise ValueError(f"lowest pitch {self.lowestPitch} is not a MIDI pitch")
+
+    def newModel(self) -> FretBoardModel:
+        self.check()
+        return FretBoardModel(self.tuning, self.numberFrets, self.scaleLengths, self.perpendicularFret)
+
+    def withTuning(self, tuning: List[str]) -> 'Instrument':
+        return self._replace(tuning = list(tuning))
+
+
+def multiscale(lowest: float, highest: float, numberStrings: int) -> Tuple[float, ...]:
+    # scale lengths evenly fanned from the lowest to the highest string
+    return tuple(float(length) for length in np.linspace(lowest, highest, numberStrings))
+
+
+instruments: Dict[str, Instrument] = {
+        'guitar': Instrument(standardTuning, 24),
+        'guitar7': Instrument(['B'] + standardTuning, 24, lowestPitch = 35),
+        'guitar7-multiscale': Instrument(['B'] + standardTuning, 24, multiscale(673.0, 648.0, 7), 8, 35),
+        'guitar8': Instrument(['F#', 'B'] + standardTuning, 24, multiscale(711.0, 648.0, 8), 7, 30),
+        'guitar9': Instrument(['C#', 'F#', 'B'] + standardTuning, 27, multiscale(737.0, 648.0, 9), 7, 25),
+        'bass4': Instrument(['E', 'A', 'D', 'G'], 24, (864.0,) * 4, lowestPitch = 28),
+        'bass6': Instrument(['B', 'E', 'A', 'D', 'G', 'C'], 24, multiscale(889.0, 864.0, 6), 7, 23),
+        # all fourths on a tapping instrument
+        'extended12': Instrument(['B', 'E', 'A', 'D', 'G', 'C', 'F', 'A#', 'D#', 'G#', 'C#', 'F#'], 36,
+                                 multiscale(864.0, 648.0, 12), 12, 23),
+}
+defaultInstrument: Instrument = instruments['guitar']
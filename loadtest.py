@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Tuple
+from urllib.parse import urlencode, urlsplit
+from model import basicNotes
+
+# Load test of server.py, e.g.
+#   python server.py --port 8080 &
+#   python loadtest.py --url http://127.0.0.1:8080 --requests 2000 --concurrency 32
+# Every connection is kept alive and sends its requests one after the
+# other; the requests cycle through --distinct diagrams (all roots of the
+# major scale in its modes at a few positions), so after the first round
+# they are served from the cache. --revalidate sends the ETags received
+# before, which the server answers with 304.
+
+
+def diagramTargets(distinct: int, fmt: str) -> List[str]:
+    targets = []
+    for position in (0, 5, 10):
+        for mode in range(1, 8):
+            for root in basicNotes:
+                query = urlencode({'root': root, 'scale': 'Major', 'mode': mode, 'position': position})
+                targets.append(f"/diagram.{fmt}?{query}")
+    return targets[:distinct]
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, target: str,
+                  etag: str = None) -> Tuple[int, Dict[str, str], bytes]:
+    lines = [f"GET {target} HTTP/1.1", f"Host: {host}"] + ([f"If-None-Match: {etag}"] if etag else [])
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split(' ')[1])
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+async def client(url: str, targets: List[str], revalidate: bool, latencies: List[float], statuses: Counter):
+    address = urlsplit(url)
+    reader, writer = await asyncio.open_connection(address.hostname, address.port or 80, limit = 1 << 24)
+    etags: Dict[str, str] = {}
+    try:
+        for target in targets:
+            start = time.perf_counter()
+            status, headers, body = await request(reader, writer, address.netloc, target,
+                                                  etags.get(target) if revalidate else None)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if 'etag' in headers:
+                etags[target] = headers['etag']
+    finally:
+        writer.close()
+
+
+async def run(url: str, total: int, concurrency: int, distinct: int, fmt: str, revalidate: bool) -> dict:
+    targets = diagramTargets(distinct, fmt)
+    # request i goes to connection i % concurrency
+    perClient = [[targets[i % len(targets)] for i in range(c, total, concurrency)] for c in range(concurrency)]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(url, clientTargets, revalidate, latencies, statuses)
+                           for clientTargets in perClient if clientTargets))
+    duration = time.perf_counter() - start
+    milliseconds = np.array(latencies) * 1000
+    return {'requests': len(latencies),
+            'seconds': duration,
+            'throughput': len(latencies) / duration,
+            'p50': float(np.percentile(milliseconds, 50)),
+            'p90': float(np.percentile(milliseconds, 90)),
+            'p99': float(np.percentile(milliseconds, 99)),
+            'max': float(milliseconds.max()),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())}}
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Measure throughput and latency of server.py.')
+    parser.add_argument('--url', default = 'http://127.0.0.1:8080')
+    parser.add_argument('--requests', type = int, default = 1000)
+    parser.add_argument('--concurrency', type = int, default = 16, help = 'connections')
+    parser.add_argument('--distinct', type = int, default = 84, help = 'different diagrams, at most 252')
+    parser.add_argument('--format', choices = ['svg', 'png'], default = 'svg')
+    parser.add_argument('--revalidate', action = 'store_true', help = 'send If-None-Match with known ETags')
+    parser.add_argument('--output', default = None, help = 'JSON file for the results')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    try:
+        results = asyncio.run(run(args.url, args.requests, args.concurrency, args.distinct, args.format,
+                                  args.revalidate))
+    except (OSError, asyncio.IncompleteReadError) as e:
+        print(f"{args.url}: {e}", file = sys.stderr)
+        return 2
+    print(f"{results['requests']} requests in {results['seconds']:.2f} s, {results['throughput']:.0f} requests/s, "
+          f"latency p50 {results['p50']:.1f} ms, p90 {results['p90']:.1f} ms, p99 {results['p99']:.1f} ms, "
+          f"statuses {results['statuses']}")
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+    return 0 if set(results['statuses']) <= {'200', '304'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,245 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Headless model of the fretboard. Notes are handled as pitch classes, i.e.
+# integers 0..11 indexing basicNotes, so that all operations on the neck
+# become array operations which do not need Qt (or a display) at all.
+
+basicNotes: List[str] = ['A', 'A#', 'B', 'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#']
+standardTuning: List[str] = ['E', 'A', 'D', 'G', 'B', 'E']
+
+Positions = Tuple[np.ndarray, np.ndarray]
+# levels a heatmap is displayed with, see FretBoardModel.setHeat
+numberHeatLevels = 8
+
+
+def noPositions() -> Positions:
+    return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+
+def concatPositions(positionsList: List[Positions]) -> Positions:
+    if not positionsList:
+        return noPositions()
+    return (np.concatenate([stringIndexes for stringIndexes, fretIndexes in positionsList]),
+            np.concatenate([fretIndexes for stringIndexes, fretIndexes in positionsList]))
+
+
+def noteIndex(noteName: str) -> int:
+    return basicNotes.index(noteName)
+
+
+class FretBoardModel():
+    def __init__(self, tuning: List[str], numberFrets: int, scaleLengths: Optional[List[float]] = None,
+                 perpendicularFret: float = 0):
+        # strings are ordered like the rows on screen, i.e. from the highest
+        # string (index 0) to the lowest one, which is the reversed tuning
+        self.numberFrets: int = numberFrets
+        self.baseNotes: np.ndarray = np.array([noteIndex(noteName) for noteName in reversed(tuning)],
+                                              dtype=np.int16)
+        # per string like the tuning (see instrument.py), None for a straight neck
+        self.scaleLengths: Optional[np.ndarray] = (None if scaleLengths is None else
+                                                   np.array(scaleLengths[::-1], dtype=float))
+        self.perpendicularFret: float = perpendicularFret
+        self._fretOffsets: np.ndarray = np.arange(numberFrets + 1, dtype=np.int16)
+        # strings x frets matrix of pitch classes
+        self.notes: np.ndarray = self._calcNotes(self.baseNotes)
+        # bitset of the globally marked pitch classes (bit i <=> basicNotes[i])
+        self.markedGlobal: int = 0
+        # strings x frets matrix of the individually marked positions
+        self.individualMarked: np.ndarray = np.zeros(self.notes.shape, dtype=bool)
+        # strings x frets usage of the positions (e.g. seconds played) and its
+        # display levels 0..numberHeatLevels
+        self.heat: np.ndarray = np.zeros(self.notes.shape)
+        self.heatLevels: np.ndarray = np.zeros(self.notes.shape, dtype=np.int8)
+        # index pitch class -> string -> frets holding that pitch class
+        self.notePositions: List[List[np.ndarray]] = [[None] * self.numberStrings for note in range(12)]
+        # nearest fret holding a given offset (pitch class relative to the open
+        # string) around each fret; shared by all strings, see _indexString
+        self._nearestByOffset: np.ndarray = self._calcNearestByOffset()
+        # strings x frets x pitch classes table of the nearest fret holding
+        # the pitch class around the fret, -1 if it is not on the string
+        self.nearestFrets: np.ndarray = np.empty(self.notes.shape + (12,), dtype=np.intp)
+        for stringIndex in range(self.numberStrings):
+            self._indexString(stringIndex)
+
+    @property
+    def numberStrings(self) -> int:
+        return len(self.baseNotes)
+
+    @property
+    def tuning(self) -> List[str]:
+        return [basicNotes[note] for note in reversed(self.baseNotes)]
+
+    def _calcNotes(self, baseNotes: np.ndarray) -> np.ndarray:
+        return (baseNotes[:, np.newaxis] + self._fretOffsets) % 12
+
+    def _calcNearestByOffset(self) -> np.ndarray:
+        # the occurrences of offset o are o + 12k; around fret f the candidates
+        # are the ones just below and just above f, on a tie the higher one wins
+        frets = self._fretOffsets.astype(np.intp)[:, np.newaxis]
+        offsets = np.arange(12)
+        lower = offsets + 12 * np.floor_divide(frets - offsets, 12)
+        upper = lower + 12
+        takeUpper = (lower < 0) | ((upper - frets <= frets - lower) & (upper <= self.numberFrets))
+        nearest = np.where(takeUpper, upper, lower)
+        nearest[nearest > self.numberFrets] = -1
+        return nearest
+
+    def _indexString(self, stringIndex: int):
+        # on a string tuned to b, the pitch class n is found on the frets
+        # f = (n - b) mod 12 + 12k, so the index is rebuilt without a scan
+        baseNote = self.baseNotes[stringIndex]
+        for note in range(12):
+            self.notePositions[note][stringIndex] = np.arange((note - baseNote) % 12,
+                                                              self.numberFrets + 1, 12)
+        self.nearestFrets[stringIndex] = self._nearestByOffset[:, (np.arange(12) - baseNote) % 12]
+
+    def positionsOf(self, note: int) -> Positions:
+        frets = self.notePositions[note]
+        stringIndexes = np.repeat(np.arange(self.numberStrings), [len(f) for f in frets])
+        return stringIndexes, np.concatenate(frets)
+
+    def noteName(self, stringIndex: int, fretIndex: int) -> str:
+        return basicNotes[self.notes[stringIndex, fretIndex]]
+
+    def isMarkedGlobal(self, note: int) -> bool:
+        return bool(self.markedGlobal >> note & 1)
+
+    def globalMarked(self) -> np.ndarray:
+        # strings x frets matrix of the positions marked by a global mark
+        return (self.markedGlobal >> self.notes & 1).astype(bool)
+
+    def setBaseNote(self, stringIndex: int, note: int) -> np.ndarray:
+        # retune a string, returns the frets whose note changed
+        if self.baseNotes[stringIndex] == note:
+            return np.empty(0, dtype=np.intp)
+        self.baseNotes[stringIndex] = note
+        self.notes[stringIndex] = (note + self._fretOffsets) % 12
+        self._indexString(stringIndex)
+        return np.arange(self.numberFrets + 1)
+
+    def setTuning(self, tuning: List[str]) -> Positions:
+        baseNotes = np.array([noteIndex(noteName) for noteName in reversed(tuning)], dtype=np.int16)
+        return self.setLayout(baseNotes, self._calcNotes(baseNotes))
+
+    def setLayout(self, baseNotes: np.ndarray, notes: np.ndarray) -> Positions:
+        # retune to precomputed open strings and notes (see tunings.py),
+        # returns the positions whose note changed
+        changed = np.nonzero(notes != self.notes)
+        retuned = np.nonzero(baseNotes != self.baseNotes)[0]
+        if len(retuned) == 0:
+            return changed
+        self.baseNotes = baseNotes.copy()
+        self.notes = notes.copy()
+        for stringIndex in retuned:
+            self._indexString(stringIndex)
+        return changed
+
+    def setGlobal(self, note: int, checked: bool) -> Positions:
+        # (un)mark a pitch class globally, returns the positions to be redisplayed
+        if self.isMarkedGlobal(note) == checked:
+            return noPositions()
+        self.markedGlobal ^= 1 << note
+        return self.positionsOf(note)
+
+    def setMarkedGlobal(self, markedGlobal: int) -> Positions:
+        # replace all global marks, returns the positions of the notes that changed
+        changed = self.markedGlobal ^ markedGlobal
+        self.markedGlobal = markedGlobal
+        return concatPositions([self.positionsOf(note) for note in range(12) if changed >> note & 1])
+
+    def clearGlobal(self) -> Positions:
+        changed = concatPositions([self.positionsOf(note) for note in range(12) if self.isMarkedGlobal(note)])
+        self.markedGlobal = 0
+        return changed
+
+    def setIndividual(self, stringIndex: int, fretIndex: int, marked: bool) -> bool:
+        changed = self.individualMarked[stringIndex, fretIndex] != marked
+        self.individualMarked[stringIndex, fretIndex] = marked
+        return bool(changed)
+
+    def setIndividualPositions(self, positions: Positions, marked: bool) -> Positions:
+        stringIndexes, fretIndexes = positions
+        changedMask = self.individualMarked[stringIndexes, fretIndexes] != marked
+        self.individualMarked[stringIndexes, fretIndexes] = marked
+        return stringIndexes[changedMask], fretIndexes[changedMask]
+
+    def clearIndividual(self) -> Positions:
+        changed = np.nonzero(self.individualMarked)
+        self.individualMarked[:] = False
+        return changed
+
+    def individualBitsets(self) -> List[int]:
+        # individual marks as one bitset per string (bit i <=> fret i)
+        return [int.from_bytes(np.packbits(row, bitorder = 'little').tobytes(), 'little')
+                for row in self.individualMarked]
+
+    def setIndividualBitsets(self, bitsets: List[int]) -> Positions:
+        # the inverse of individualBitsets, returns the positions whose mark changed
+        numberBytes = (self.numberFrets + 8) // 8
+        data = b''.join(bitset.to_bytes(numberBytes, 'little') for bitset in bitsets)
+        marked = np.unpackbits(np.frombuffer(data, dtype=np.uint8).reshape(len(bitsets), numberBytes),
+                               axis = 1, bitorder = 'little')[:, :self.numberFrets + 1].astype(bool)
+        changed = np.nonzero(marked != self.individualMarked)
+        self.individualMarked[changed] = marked[changed]
+        return changed
+
+    def setHeat(self, heat: np.ndarray) -> Positions:
+        # levels relative to the most used position, on a square root scale
+        # so rarely used positions stay visible; returns the positions whose
+        # level changed
+        self.heat = np.array(heat, dtype=float)
+        peak = self.heat.max()
+        if peak > 0:
+            levels = np.ceil(np.sqrt(np.maximum(self.heat, 0) / peak) * numberHeatLevels).astype(np.int8)
+        else:
+            levels = np.zeros(self.notes.shape, dtype=np.int8)
+        changed = np.nonzero(levels != self.heatLevels)
+        self.heatLevels = levels
+        return changed
+
+    def clearHeat(self) -> Positions:
+        return self.setHeat(np.zeros(self.notes.shape))
+
+    def getMarkedRange(self) -> Tuple[int, int]:
+        marked = np.nonzero(self.individualMarked.any(axis = 0))[0]
+        if len(marked) == 0:
+            return self.numberFrets, 0
+        return int(marked[0]), int(marked[-1])
+
+    def getHeatRange(self) -> Tuple[int, int]:
+        used = np.nonzero(self.heatLevels.any(axis = 0))[0]
+        if len(used) == 0:
+            return self.numberFrets, 0
+        return int(used[0]), int(used[-1])
+
+    def isMultiscale(self) -> bool:
+        return self.scaleLengths is not None and bool(np.ptp(self.scaleLengths) > 0)
+
+    def fanOffsets(self, fretIndexes: np.ndarray) -> np.ndarray:
+        # strings x frets horizontal offsets of the fret wires of a multiscale
+        # neck from their mean position, in units of the fret spacing there;
+        # all wires line up at the perpendicular fret
+        fretIndexes = np.asarray(fretIndexes, dtype=float)
+        if not self.isMultiscale():
+            return np.zeros((self.numberStrings, len(fretIndexes)))
+        lengths = self.scaleLengths[:, np.newaxis]
+        wires = lengths * (2 ** (-self.perpendicularFret / 12) - 2 ** (-fretIndexes / 12))
+        spacing = np.mean(self.scaleLengths) * 2 ** (-fretIndexes / 12) * (1 - 2 ** (-1 / 12))
+        return (wires - wires.mean(axis = 0)) / spacing
+
+    def findNextFrets(self, stringIndexes: np.ndarray, fretIndex: int, notes: np.ndarray) -> np.ndarray:
+        # nearest occurrence of notes[i] on string stringIndexes[i] around
+        # fretIndex; on a tie the higher fret wins, -1 if there is none
+        return self.nearestFrets[stringIndexes, fretIndex, notes]
+
+    def placeScale(self, stringIndex: int, fretIndex: int, notes: List[int],
+                   notesPerString: int = 3) -> Positions:
+        # mark the notes in a notesPerString fashion, starting on string
+        # stringIndex and walking up to the highest string;
+        # returns the positions whose individual mark changed
+        stringIndexes = np.repeat(np.arange(stringIndex, -1, -1), notesPerString)
+        scaleNotes = np.resize(np.array(notes, dtype=np.int16), len(stringIndexes))
+        fretIndexes = self.findNextFrets(stringIndexes, fretIndex, scaleNotes)
+        onNeck = fretIndexes >= 0
+        return self.setIndividualPositions((stringIndexes[onNeck], fretIndexes[onNeck]), True)
@@ -0,0 +1,174 @@
+from PyQt5 import QtCore
+from PyQt5.QtCore import QRect, QSize
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QRegion
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from model import FretBoardModel, Positions, basicNotes, numberHeatLevels
+from tracing import traced
+import tracing
+
+# The whole neck in a single widget: it paints the note cells, the fret
+# lines and the fret numbers above and below itself from the model and maps
+# mouse clicks to (string, fret) positions. Changes of the model are
+# repainted per cell, see refreshPositions, so the cost of an interaction
+# does not grow with the size of the neck.
+
+cellWidth = 52
+cellHeight = 30
+labelHeight = 22
+cellMargin = 3
+cellRadius = 10
+fretLineWidth = 3
+nutWidth = 8
+
+fretLineColor = QColor('#ff00ff')
+labelBackgroundColor = QColor('#ffffff')
+cellColor = QColor('#e1e1e1')
+checkedColor = QColor('#adaddf')
+textColor = QColor('#000000')
+individualMarkedColor = QColor('#000000')
+heatColor = QColor('#ff6000')
+# of the hottest positions
+maxHeatAlpha = 200
+
+
+class NeckWidget(QWidget):
+    leftClicked = QtCore.pyqtSignal(int, int)
+    rightClicked = QtCore.pyqtSignal(int, int)
+    middleClicked = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, model: FretBoardModel, parent: QWidget = None):
+        super().__init__(parent)
+        self.model: FretBoardModel = model
+        self.setFixedSize(self.sizeHint())
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+
+    def sizeHint(self) -> QSize:
+        return QSize((self.model.numberFrets + 1) * cellWidth,
+                     self.model.numberStrings * cellHeight + 2 * labelHeight)
+
+    def cellRect(self, stringIndex: int, fretIndex: int) -> QRect:
+        return QRect(fretIndex * cellWidth, labelHeight + stringIndex * cellHeight, cellWidth, cellHeight)
+
+    def positionAt(self, x: int, y: int) -> (int, int):
+        # hit test, (-1, -1) outside of the note cells
+        stringIndex = (y - labelHeight) // cellHeight if y >= labelHeight else -1
+        fretIndex = x // cellWidth
+        if not (0 <= stringIndex < self.model.numberStrings and 0 <= fretIndex <= self.model.numberFrets):
+            return -1, -1
+        return stringIndex, fretIndex
+
+    def mousePressEvent(self, event):
+        stringIndex, fretIndex = self.positionAt(event.x(), event.y())
+        if stringIndex < 0:
+            return
+        if event.button() == QtCore.Qt.RightButton:
+            self.rightClicked.emit(stringIndex, fretIndex)
+        elif event.button() == QtCore.Qt.MiddleButton:
+            self.middleClicked.emit(stringIndex, fretIndex)
+        elif event.button() == QtCore.Qt.LeftButton:
+            self.leftClicked.emit(stringIndex, fretIndex)
+
+    def dirtyRegion(self, positions: Positions) -> QRegion:
+        # one rectangle per run of adjacent cells on a string, sorted by rows
+        # as QRegion.setRects requires; cheaper than uniting cell by cell
+        stringIndexes, fretIndexes = positions
+        numberCells = self.model.numberFrets + 1
+        cells = np.unique(np.asarray(stringIndexes) * numberCells + np.asarray(fretIndexes))
+        runStarts = np.ones(len(cells), dtype=bool)
+        runStarts[1:] = (np.diff(cells) != 1) | (cells[1:] % numberCells == 0)
+        starts = np.nonzero(runStarts)[0]
+        lengths = np.diff(np.append(starts, len(cells)))
+        region = QRegion()
+        region.setRects([QRect(int(cell % numberCells) * cellWidth, labelHeight + int(cell // numberCells) * cellHeight,
+                               int(length) * cellWidth, cellHeight)
+                         for cell, length in zip(cells[starts], lengths)])
+        return region
+
+    def refreshPositions(self, positions: Positions, immediate: bool = False):
+        # repaint the changed cells only, all of them in a single pass;
+        # immediate paints right away instead of on the next event loop pass
+        if len(positions[0]) == 0:
+            return
+        tracing.counter('NeckWidget.dirtyCells', cells = len(positions[0]))
+        if immediate:
+            self.repaint(self.dirtyRegion(positions))
+        else:
+            self.update(self.dirtyRegion(positions))
+
+    def refreshAll(self):
+        self.update()
+
+    @traced
+    def paintEvent(self, event):
+        # the rectangles of the region only, its bounding rectangle may span
+        # the whole neck, e.g. for the cells of a note
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        for rect in event.region().rects():
+            self.paintRect(painter, rect)
+
+    def paintRect(self, painter: QPainter, rect: QRect):
+        lowerFret = max(0, rect.left() // cellWidth)
+        upperFret = min(self.model.numberFrets, rect.right() // cellWidth)
+        lowerString = max(0, (rect.top() - labelHeight) // cellHeight)
+        upperString = min(self.model.numberStrings - 1, (rect.bottom() - labelHeight) // cellHeight)
+
+        if rect.top() < labelHeight:
+            self.paintLabels(painter, 0, lowerFret, upperFret)
+        bottomLabelY = labelHeight + self.model.numberStrings * cellHeight
+        if rect.bottom() >= bottomLabelY:
+            self.paintLabels(painter, bottomLabelY, lowerFret, upperFret)
+
+        if lowerString <= upperString:
+            notes = self.model.notes
+            individualMarked = self.model.individualMarked
+            markedGlobal = self.model.markedGlobal
+            heatLevels = self.model.heatLevels
+            for stringIndex in range(lowerString, upperString + 1):
+                for fretIndex in range(lowerFret, upperFret + 1):
+                    note = notes[stringIndex, fretIndex]
+                    self.paintCell(painter, self.cellRect(stringIndex, fretIndex), basicNotes[note],
+                                   bool(markedGlobal >> note & 1), individualMarked[stringIndex, fretIndex],
+                                   int(heatLevels[stringIndex, fretIndex]))
+            self.paintFretLines(painter, lowerString, upperString, lowerFret, upperFret)
+            tracing.counter('NeckWidget.paintedCells',
+                            cells = (upperString - lowerString + 1) * (upperFret - lowerFret + 1))
+
+    def paintLabels(self, painter: QPainter, y: int, lowerFret: int, upperFret: int):
+        painter.fillRect(QRect(lowerFret * cellWidth, y, (upperFret - lowerFret + 1) * cellWidth, labelHeight),
+                         labelBackgroundColor)
+        painter.setPen(textColor)
+        for fretIndex in range(max(1, lowerFret), upperFret + 1):
+            painter.drawText(QRect(fretIndex * cellWidth, y, cellWidth, labelHeight),
+                             QtCore.Qt.AlignCenter, str(fretIndex))
+
+    def paintCell(self, painter: QPainter, rect: QRect, noteName: str, checked: bool, individualMarked: bool,
+                  heatLevel: int = 0):
+        painter.fillRect(rect, self.palette().window())
+        button = rect.adjusted(cellMargin, cellMargin, -cellMargin - nutWidth // 2, -cellMargin)
+        if individualMarked:
+            painter.setPen(QPen(individualMarkedColor, 2))
+        else:
+            painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(checkedColor if checked else cellColor)
+        painter.drawRoundedRect(button, cellRadius, cellRadius)
+        if heatLevel > 0:
+            # the heatmap is laid over the button, the mark stays visible
+            heat = QColor(heatColor)
+            heat.setAlpha(maxHeatAlpha * heatLevel // numberHeatLevels)
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(heat)
+            painter.drawRoundedRect(button, cellRadius, cellRadius)
+        painter.setPen(textColor)
+        painter.drawText(button, QtCore.Qt.AlignCenter, noteName)
+
+    def paintFretLines(self, painter: QPainter, lowerString: int, upperString: int,
+                       lowerFret: int, upperFret: int):
+        top = labelHeight + lowerString * cellHeight
+        bottom = labelHeight + (upperString + 1) * cellHeight
+        for fretIndex in range(lowerFret, upperFret + 1):
+            # the line at the right end of a cell, the one after the open strings is the nut
+            width = nutWidth if fretIndex == 0 else fretLineWidth
+            x = (fretIndex + 1) * cellWidth - nutWidth // 2 - width // 2
+            painter.fillRect(QRect(x, top, width, bottom - top), fretLineColor)
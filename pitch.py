@@ -0,0 +1,194 @@
+import argparse
+import sys
+import time
+import wave
+import numpy as np
+from typing import Iterator, List, Tuple
+from model import FretBoardModel, basicNotes
+from instrument import Instrument, instruments
+from audio import pitchMatrix
+
+# Pitch tracking of practice recordings, e.g.
+#   python pitch.py practice.wav --instrument guitar
+# The WAV file is read in chunks of chunkSeconds; every hop a frame is
+# analyzed by YIN, all frames of a chunk at once with one FFT each. The
+# samples of the frames not finished by a chunk are carried over, so memory
+# does not depend on the length of the recording. Pitches are counted per
+# (string, fret) holding them in the current tuning (see Heatmap).
+
+chunkSeconds = 1.0
+# samples between two frames at 44.1 kHz, 11.6 ms
+hopSize = 512
+# threshold of YIN's cumulative mean normalized difference
+yinThreshold = 0.15
+# RMS below which a frame is silent
+silenceLevel = 0.01
+# frames further from a semitone, e.g. during bends and slides, are not counted
+maxCents = 40
+
+
+def readChunks(path: str, chunkFrames: int) -> Iterator[np.ndarray]:
+    # mono float samples in -1..1, channels are averaged
+    with wave.open(path, 'rb') as f:
+        channels = f.getnchannels()
+        width = f.getsampwidth()
+        if width not in (1, 2, 3, 4):
+            raise wave.Error(f"unsupported sample width {width}")
+        while True:
+            data = f.readframes(chunkFrames)
+            if not data:
+                break
+            if width == 1:
+                samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+            elif width == 3:
+                # little endian 24 bit, sign extended by the shift
+                raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                samples = ((raw[:, 0] << 8 | raw[:, 1] << 16 | raw[:, 2] << 24) >> 8) / float(1 << 23)
+            else:
+                dtype = {2: '<i2', 4: '<i4'}[width]
+                samples = np.frombuffer(data, dtype=dtype) / float(1 << (8 * width - 1))
+            yield samples.reshape(-1, channels).mean(axis = 1).astype(np.float32)
+
+
+def sampleRateOf(path: str) -> int:
+    with wave.open(path, 'rb') as f:
+        return f.getframerate()
+
+
+def yin(frames: np.ndarray, lagMin: int, lagMax: int, threshold: float = yinThreshold) -> Tuple[np.ndarray, np.ndarray]:
+    # frames x 2 * lagMax samples -> (fractional lag per frame, voiced)
+    # The difference d(lag) = sum over the first half (x[j] - x[j + lag])^2
+    # is energy of the first half + energy of the window at lag - 2 * the
+    # cross correlation, the latter from one FFT per frame.
+    window = lagMax
+    size = 1 << int(np.ceil(np.log2(2 * window)))
+    spectrum = np.fft.rfft(frames, size, axis = 1)
+    firstHalf = np.fft.rfft(frames[:, :window], size, axis = 1)
+    correlation = np.fft.irfft(np.conj(firstHalf) * spectrum, size, axis = 1)[:, :lagMax]
+    energy = np.concatenate([np.zeros((len(frames), 1)), np.cumsum(frames.astype(np.float64) ** 2, axis = 1)], axis = 1)
+    lags = np.arange(lagMax)
+    shifted = energy[:, lags + window] - energy[:, lags]
+    difference = energy[:, [window]] + shifted - 2 * correlation
+    difference[:, 0] = 0
+    # cumulative mean normalized
+    cumulative = np.cumsum(difference, axis = 1)
+    normalized = np.ones_like(difference)
+    normalized[:, 1:] = difference[:, 1:] * lags[1:] / np.maximum(cumulative[:, 1:], 1e-12)
+
+    # the first dip below the threshold, followed down to its minimum
+    searched = normalized[:, lagMin:lagMax - 1]
+    below = searched < threshold
+    voiced = below.any(axis = 1)
+    first = below.argmax(axis = 1)
+    offsets = np.arange(searched.shape[1])
+    rising = (offsets >= first[:, np.newaxis]) & (normalized[:, lagMin + 1:lagMax] >= searched)
+    best = lagMin + np.where(rising.any(axis = 1), rising.argmax(axis = 1), first)
+    # parabolic interpolation around the minimum
+    rows = np.arange(len(frames))
+    left = normalized[rows, np.maximum(best - 1, 0)]
+    middle = normalized[rows, best]
+    right = normalized[rows, np.minimum(best + 1, lagMax - 1)]
+    curvature = left - 2 * middle + right
+    shift = np.where(curvature > 0, 0.5 * (left - right) / np.where(curvature > 0, curvature, 1), 0)
+    return best + np.clip(shift, -0.5, 0.5), voiced
+
+
+class PitchTracker():
+    # frequencies of consecutive chunks of a recording, NaN where unvoiced
+    def __init__(self, rate: int, minFrequency: float, maxFrequency: float, hop: int = hopSize):
+        self.rate: int = rate
+        self.hop: int = hop
+        self.lagMin: int = max(2, int(rate / maxFrequency))
+        self.lagMax: int = int(np.ceil(rate / minFrequency)) + 2
+        self.frameSize: int = 2 * self.lagMax
+        self.frames: int = 0
+        self._pending: np.ndarray = np.zeros(0, dtype=np.float32)
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        samples = np.concatenate([self._pending, chunk])
+        count = max(0, (len(samples) - self.frameSize) // self.hop + 1)
+        self._pending = samples[count * self.hop:]
+        self.frames += count
+        if count == 0:
+            return np.empty(0)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.frameSize)[::self.hop][:count]
+        lags, voiced = yin(frames, self.lagMin, self.lagMax)
+        loud = np.sqrt(np.mean(frames[:, :self.lagMax].astype(np.float64) ** 2, axis = 1)) >= silenceLevel
+        return np.where(voiced & loud, self.rate / lags, np.nan)
+
+
+def midiPitches(frequencies: np.ndarray) -> np.ndarray:
+    # nearest MIDI pitches, -1 for unvoiced frames and the ones between semitones
+    exact = 69 + 12 * np.log2(np.where(np.isnan(frequencies), 1.0, frequencies) / 440.0)
+    nearest = np.round(exact)
+    inTune = ~np.isnan(frequencies) & (np.abs(exact - nearest) * 100 <= maxCents)
+    return np.where(inTune, nearest, -1).astype(np.int64)
+
+
+class Heatmap():
+    # seconds each (string, fret) was heard; a pitch counts for every
+    # position holding it, as the recording does not tell them apart
+    def __init__(self, pitches: np.ndarray, frameSeconds: float):
+        # strings x frets MIDI pitches, see audio.pitchMatrix
+        self.pitches: np.ndarray = np.clip(pitches, 0, 127)
+        self.frameSeconds: float = frameSeconds
+        self.seconds: np.ndarray = np.zeros(pitches.shape)
+        self.perPitch: np.ndarray = np.zeros(128)
+        self.recorded: float = 0
+
+    def add(self, midi: np.ndarray):
+        played = midi[(midi >= 0) & (midi < 128)]
+        counts = np.bincount(played, minlength = 128) * self.frameSeconds
+        self.perPitch += counts
+        self.recorded += len(midi) * self.frameSeconds
+        self.seconds += counts[self.pitches]
+
+
+def analyze(path: str, model: FretBoardModel, lowestPitch: int) -> Iterator[Heatmap]:
+    # yields the heatmap after every chunk, it grows incrementally
+    pitches = pitchMatrix(model, lowestPitch)
+    rate = sampleRateOf(path)
+    tracker = PitchTracker(rate, 440.0 * 2 ** ((pitches.min() - 70) / 12), 440.0 * 2 ** ((pitches.max() - 68) / 12))
+    heatmap = Heatmap(pitches, tracker.hop / rate)
+    for chunk in readChunks(path, int(chunkSeconds * rate)):
+        heatmap.add(midiPitches(tracker.process(chunk)))
+        yield heatmap
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Show the positions of the notes played in a WAV recording.')
+    parser.add_argument('recording')
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar')
+    parser.add_argument('--tuning', nargs = '+', choices = basicNotes, default = None,
+                        help = 'from the lowest to the highest string, defaults to the instrument\'s')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    instrument: Instrument = instruments[args.instrument]
+    if args.tuning is not None:
+        instrument = instrument.withTuning(args.tuning)
+    model = instrument.newModel()
+    start = time.perf_counter()
+    heatmap = None
+    try:
+        for heatmap in analyze(args.recording, model, instrument.lowestPitch):
+            pass
+    except (OSError, EOFError, wave.Error) as e:
+        print(e, file = sys.stderr)
+        return 2
+    if heatmap is None:
+        print("empty recording", file = sys.stderr)
+        return 2
+    duration = time.perf_counter() - start
+    print(f"{heatmap.recorded:.1f} s recorded, {heatmap.perPitch.sum():.1f} s of notes, "
+          f"analyzed in {duration:.1f} s")
+    # the rows of the neck, highest string first
+    for stringIndex, noteName in enumerate(reversed(model.tuning)):
+        print(f"{noteName:2s} " + ' '.join(f"{seconds:5.1f}" for seconds in heatmap.seconds[stringIndex]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
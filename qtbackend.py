@@ -0,0 +1,150 @@
+import os
+from typing import List, Tuple
+from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice, QMarginsF, QPointF, QSizeF
+from PyQt5.QtGui import (QColor, QFont, QFontMetricsF, QGuiApplication, QImage, QPageLayout, QPageSize,
+    QPainter, QPdfWriter, QPen)
+from diagram import DiagramBackend
+
+# Diagram backends painting straight into a QImage, i.e. without building SVG
+# elements and rasterizing them with Cairo afterwards, or into the pages of
+# a PDF.
+
+# Qt maps the quality to the zlib level, 80 trades a slightly bigger file for
+# about half the encoding time of the default
+pngQuality = 80
+
+# fonts need a QGuiApplication, headless processes get an offscreen one
+_application: QGuiApplication = None
+
+
+def ensureApplication():
+    global _application
+    if QGuiApplication.instance() is None:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        _application = QGuiApplication([])
+
+
+class QtBackend(DiagramBackend):
+    name = 'qt'
+
+    def __init__(self):
+        ensureApplication()
+        self.image: QImage = None
+        self.painter: QPainter = None
+        self._height: float = 0
+        self._fonts = {}
+
+    def begin(self, width: float, height: float):
+        self.image = QImage(int(width), int(height), QImage.Format_ARGB32_Premultiplied)
+        # transparent like the PNGs rasterized from SVG
+        self.image.fill(Qt.transparent)
+        self._height = height
+        self.painter = QPainter(self.image)
+        self.painter.setRenderHint(QPainter.Antialiasing)
+        self.painter.setRenderHint(QPainter.TextAntialiasing)
+
+    def _y(self, y: float) -> float:
+        # the diagram coordinates point upwards, the image ones downwards
+        return self._height - y
+
+    def _pen(self, strokeWidth: float, stroke: str) -> QPen:
+        pen = QPen(QColor(stroke))
+        pen.setWidthF(strokeWidth)
+        # SVG defaults
+        pen.setCapStyle(Qt.FlatCap)
+        pen.setJoinStyle(Qt.MiterJoin)
+        return pen
+
+    def _font(self, fontSize: float) -> QFont:
+        font = self._fonts.get(fontSize)
+        if font is None:
+            font = QFont()
+            font.setPixelSize(max(1, round(fontSize)))
+            self._fonts[fontSize] = font
+        return font
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, strokeWidth: float, stroke: str):
+        self.painter.setPen(self._pen(strokeWidth, stroke))
+        self.painter.drawLine(QPointF(x1, self._y(y1)), QPointF(x2, self._y(y2)))
+
+    def circle(self, cx: float, cy: float, r: float, fill: str, strokeWidth: float, stroke: str):
+        self.painter.setPen(self._pen(strokeWidth, stroke))
+        self.painter.setBrush(QColor(fill))
+        self.painter.drawEllipse(QPointF(cx, self._y(cy)), r, r)
+
+    def text(self, text: str, fontSize: float, x: float, y: float, fill: str, anchor: str):
+        font = self._font(fontSize)
+        self.painter.setFont(font)
+        self.painter.setPen(QColor(fill))
+        if anchor == 'middle':
+            x -= QFontMetricsF(font).horizontalAdvance(text) / 2
+        self.painter.drawText(QPointF(x, self._y(y)), text)
+
+    def end(self):
+        self.painter.end()
+        self.painter = None
+
+    def encode(self, fmt: str) -> bytes:
+        if fmt != 'png':
+            raise ValueError(f"the qt backend cannot encode {fmt}")
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        self.image.save(buffer, 'PNG', pngQuality)
+        buffer.close()
+        return bytes(data)
+
+
+class QtPdfBackend(QtBackend):
+    # pages of a PDF written to path; like SvgWriter, the outermost begin
+    # starts a page and nested ones place diagrams on it. QPdfWriter writes
+    # each page when the next one starts and embeds each font once.
+    name = 'pdf'
+
+    def __init__(self, path: str, pageWidth: float, pageHeight: float):
+        super().__init__()
+        self.writer: QPdfWriter = QPdfWriter(path)
+        # one unit per pixel at 96 dpi, like the SVGs
+        self.writer.setResolution(96)
+        self.writer.setPageSize(QPageSize(QSizeF(pageWidth * 72 / 96, pageHeight * 72 / 96), QPageSize.Point))
+        self.writer.setPageMargins(QMarginsF(0, 0, 0, 0), QPageLayout.Point)
+        self._depth: int = 0
+        self._pages: int = 0
+        self._heights: List[float] = []
+        self._placement: Tuple[float, float, float] = (0, 0, 1)
+
+    def place(self, x: float, y: float, scale: float = 1):
+        self._placement = (x, y, scale)
+
+    def begin(self, width: float, height: float):
+        if self._depth == 0:
+            if self._pages == 0:
+                self.painter = QPainter(self.writer)
+                self.painter.setRenderHint(QPainter.Antialiasing)
+                self.painter.setRenderHint(QPainter.TextAntialiasing)
+            else:
+                self.writer.newPage()
+            self._pages += 1
+        else:
+            x, y, scale = self._placement
+            self.painter.save()
+            self.painter.translate(x, y)
+            self.painter.scale(scale, scale)
+            self._placement = (0, 0, 1)
+        self._heights.append(self._height)
+        self._height = height
+        self._depth += 1
+
+    def end(self):
+        self._depth -= 1
+        self._height = self._heights.pop()
+        if self._depth > 0:
+            self.painter.restore()
+
+    def finish(self):
+        if self.painter is not None:
+            self.painter.end()
+            self.painter = None
+
+    def encode(self, fmt: str) -> bytes:
+        raise ValueError("the pdf backend writes to its file")
@@ -0,0 +1,303 @@
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+from model import basicNotes
+from instrument import instruments
+from audio import pitchMatrix
+from diagram import Diagram, newBackend, defaultBackend
+
+# Fret usage of a repertoire of tabs and MusicXML files, e.g.
+#   python repertoire.py ~/tabs --output usage.svg
+# Every note event is mapped to a (string, fret) under the file's tuning:
+# MusicXML tablature gives them, other MusicXML notes are placed near the
+# previous note on the strings of the staff's <staff-tuning>, or of the neck
+# without one; ASCII tabs are read line by line. Strings are counted from the
+# highest one like the rows of the model. A file with fewer strings than the
+# neck is aligned to the neck strings most of its string names agree with
+# (e.g. a 4 string bass tab on a 5 string bass), otherwise to the highest
+# ones, so a 7 string tab on a 6 string neck loses its lowest string. Files
+# are parsed as streams by a pool of processes, chunk by chunk, and the
+# counts of the chunks are summed.
+
+musicXmlExtensions = ('.xml', '.musicxml', '.mxl')
+tabExtensions = ('.txt', '.tab')
+# files per task of a worker process
+filesPerChunk = 32
+# semitones of the note names of MusicXML pitches
+stepPitches = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+# a line of an ASCII tab: an optional string name, a bar and mostly dashes
+tabLinePattern = re.compile(r'^\s*([A-Ga-g][#b]?)?\s*\|(.*)$')
+fretPattern = re.compile(r'\d+')
+
+# (string from the highest one, fret)
+NoteEvent = Tuple[int, int]
+
+
+class Repertoire():
+    # strings x frets note counts and what they were counted from
+    def __init__(self, numberStrings: int, numberFrets: int):
+        self.counts: np.ndarray = np.zeros((numberStrings, numberFrets + 1), dtype=np.int64)
+        self.files: int = 0
+        self.notes: int = 0
+        # notes beyond the strings or frets of the neck
+        self.skipped: int = 0
+        self.failed: List[str] = []
+
+    def addEvents(self, events: Iterable[NoteEvent]):
+        # counted in one go per file
+        positions = np.array(list(events), dtype=np.int64).reshape(-1, 2)
+        onNeck = ((positions[:, 0] >= 0) & (positions[:, 0] < self.counts.shape[0])
+                  & (positions[:, 1] >= 0) & (positions[:, 1] < self.counts.shape[1]))
+        np.add.at(self.counts, (positions[onNeck, 0], positions[onNeck, 1]), 1)
+        self.notes += int(onNeck.sum())
+        self.skipped += int((~onNeck).sum())
+        self.files += 1
+
+    def merge(self, other: 'Repertoire'):
+        self.counts += other.counts
+        self.files += other.files
+        self.notes += other.notes
+        self.skipped += other.skipped
+        self.failed += other.failed
+
+
+def localName(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def childText(element: ET.Element, name: str) -> Optional[str]:
+    for child in element.iter():
+        if localName(child.tag) == name:
+            return child.text
+    return None
+
+
+def namePitchClass(name: str) -> int:
+    # a string name of a tab, e.g. 'e', 'F#' or 'Bb', as an index of basicNotes
+    return (stepPitches[name[0].upper()] + {'#': 1, 'b': -1}.get(name[1:], 0) - 9) % 12
+
+
+def stringOffset(fileNotes: List[int], neckNotes: List[int]) -> int:
+    # the neck string of the highest string of a file, both as pitch classes
+    # from the highest string; the one most strings agree with, the highest
+    # on a tie
+    best, bestMatches = 0, -1
+    for offset in range(max(1, len(neckNotes) - len(fileNotes) + 1)):
+        matches = sum(note == neckNote for note, neckNote in zip(fileNotes, neckNotes[offset:]))
+        if matches > bestMatches:
+            best, bestMatches = offset, matches
+    return best
+
+
+def neckNotes(pitches: np.ndarray) -> List[int]:
+    # the pitch classes of the open strings of a pitch matrix
+    return [int(pitch - 9) % 12 for pitch in pitches[:, 0]]
+
+
+def staffTuning(details: ET.Element) -> List[int]:
+    # the MIDI pitches of the open strings of <staff-details> from the
+    # highest string, empty without <staff-tuning>
+    lines = []
+    for child in details:
+        if localName(child.tag) == 'staff-tuning':
+            midi = (12 * (int(childText(child, 'tuning-octave')) + 1) + stepPitches[childText(child, 'tuning-step')]
+                    + int(float(childText(child, 'tuning-alter') or 0)))
+            lines.append((int(child.get('line', 0)), midi))
+    return [midi for line, midi in sorted(lines, reverse = True)]
+
+
+def nearestPosition(pitches: np.ndarray, pitch: int, lastFret: int) -> Optional[NoteEvent]:
+    # the position of a pitch nearest to the fret played before, the higher string on a tie
+    stringIndexes, fretIndexes = np.nonzero(pitches == pitch)
+    if len(stringIndexes) == 0:
+        return None
+    best = np.argmin(np.abs(fretIndexes - lastFret) * len(pitches) + stringIndexes)
+    return int(stringIndexes[best]), int(fretIndexes[best])
+
+
+def musicXmlEvents(source: IO, pitches: np.ndarray) -> Iterator[NoteEvent]:
+    # pitches: strings x frets MIDI pitches of the neck, for the notes
+    # without a string and fret of a part without a tuning of its own;
+    # rests and tied continuations are skipped
+    lastFret = 0
+    partPitches, offset = pitches, 0
+    for event, element in ET.iterparse(source, events = ('end',)):
+        name = localName(element.tag)
+        if name == 'note':
+            children = {localName(child.tag): child for child in element}
+            ties = {child.get('type') for child in element if localName(child.tag) == 'tie'}
+            if 'rest' not in children and 'stop' not in ties:
+                string, fret = childText(element, 'string'), childText(element, 'fret')
+                if string is not None and fret is not None:
+                    lastFret = int(fret)
+                    yield int(string) - 1 + offset, lastFret
+                elif 'pitch' in children:
+                    pitch = children['pitch']
+                    midi = (12 * (int(childText(pitch, 'octave')) + 1) + stepPitches[childText(pitch, 'step')]
+                            + int(float(childText(pitch, 'alter') or 0)))
+                    position = nearestPosition(partPitches, midi, lastFret)
+                    if position is not None:
+                        lastFret = position[1]
+                        yield position[0] + offset, lastFret
+            element.clear()
+        elif name == 'staff-details':
+            openStrings = staffTuning(element)
+            if openStrings:
+                partPitches = np.array(openStrings)[:, np.newaxis] + np.arange(pitches.shape[1])
+                offset = stringOffset(neckNotes(partPitches), neckNotes(pitches))
+        elif name == 'measure':
+            element.clear()
+        elif name == 'part':
+            partPitches, offset = pitches, 0
+
+
+def openMusicXml(path: str) -> IO:
+    # compressed files (.mxl) name their score in META-INF/container.xml
+    if not path.endswith('.mxl'):
+        return open(path, 'rb')
+    archive = zipfile.ZipFile(path)
+    container = ET.fromstring(archive.read('META-INF/container.xml'))
+    rootFiles = [element.get('full-path') for element in container.iter() if localName(element.tag) == 'rootfile']
+    if not rootFiles:
+        raise ValueError("no rootfile in META-INF/container.xml")
+    return archive.open(rootFiles[0])
+
+
+def tabSystemEvents(lines: List[str], names: List[Optional[str]], neck: List[int]) -> Iterator[NoteEvent]:
+    # the fret numbers of a system of tab lines, the highest string first;
+    # named strings are aligned to the neck (see stringOffset)
+    offset = 0
+    if all(names):
+        offset = stringOffset([namePitchClass(name) for name in names], neck)
+    for stringIndex, line in enumerate(lines):
+        for match in fretPattern.finditer(line):
+            yield stringIndex + offset, int(match.group())
+
+
+def asciiTabEvents(lines: Iterable[str], neck: List[int] = None) -> Iterator[NoteEvent]:
+    # neck: the pitch classes of its open strings from the highest one, the
+    # tab lines are counted from the highest string without
+    neck = neck if neck is not None else []
+    system: List[str] = []
+    names: List[Optional[str]] = []
+    for line in lines:
+        match = tabLinePattern.match(line)
+        body = match.group(2) if match else ''
+        if len(body) >= 4 and body.count('-') * 2 >= len(body):
+            system.append(body)
+            names.append(match.group(1))
+            continue
+        # systems of fewer lines are no tablature, e.g. a rhythm line
+        if len(system) >= 4:
+            yield from tabSystemEvents(system, names, neck)
+        system, names = [], []
+    if len(system) >= 4:
+        yield from tabSystemEvents(system, names, neck)
+
+
+def countFile(path: str, repertoire: Repertoire, pitches: np.ndarray):
+    try:
+        if path.lower().endswith(musicXmlExtensions):
+            with openMusicXml(path) as source:
+                repertoire.addEvents(musicXmlEvents(source, pitches))
+        else:
+            with open(path, encoding = 'utf-8', errors = 'replace') as lines:
+                repertoire.addEvents(asciiTabEvents(lines, neckNotes(pitches)))
+    except (OSError, ValueError, KeyError, TypeError, ET.ParseError, zipfile.BadZipFile) as e:
+        repertoire.failed.append(f"{path}: {e}")
+
+
+def countFiles(paths: List[str], pitches: np.ndarray) -> Repertoire:
+    # the task of a worker process
+    numberStrings, numberCells = pitches.shape
+    repertoire = Repertoire(numberStrings, numberCells - 1)
+    for path in paths:
+        countFile(path, repertoire, pitches)
+    return repertoire
+
+
+def repertoireFiles(paths: List[str]) -> List[str]:
+    # the tabs and MusicXML files of files and directories, recursively
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in sorted(os.walk(path)):
+                files += [os.path.join(directory, name) for name in sorted(names)
+                          if name.lower().endswith(musicXmlExtensions + tabExtensions)]
+        else:
+            files.append(path)
+    return files
+
+
+def countRepertoire(paths: List[str], pitches: np.ndarray, workers: int = None) -> Iterator[Repertoire]:
+    # yields the counts so far whenever a chunk of files is done; closing
+    # the generator cancels the remaining chunks
+    files = repertoireFiles(paths)
+    total = Repertoire(pitches.shape[0], pitches.shape[1] - 1)
+    chunks = [files[start:start + filesPerChunk] for start in range(0, len(files), filesPerChunk)]
+    if len(chunks) <= 1:
+        total.merge(countFiles(files, pitches))
+        yield total
+        return
+    # spawn, since forking a process running Qt is not safe
+    executor = ProcessPoolExecutor(min(workers or os.cpu_count() or 1, len(chunks)),
+                                   mp_context = multiprocessing.get_context('spawn'))
+    try:
+        submitted = {executor.submit(countFiles, chunk, pitches): chunk for chunk in chunks}
+        for future in as_completed(submitted):
+            try:
+                total.merge(future.result())
+            except Exception as e:
+                # e.g. a worker process died (BrokenProcessPool) or the counts
+                # could not be pickled; the files of the chunk count as failed
+                total.failed += [f"{path}: {type(e).__name__}: {e}" for path in submitted[future]]
+            yield total
+    finally:
+        executor.shutdown(wait = False, cancel_futures = True)
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Count the positions used by tabs and MusicXML files.')
+    parser.add_argument('paths', nargs = '+', help = 'files or directories, searched recursively')
+    parser.add_argument('--instrument', choices = instruments.keys(), default = 'guitar')
+    parser.add_argument('--tuning', nargs = '+', choices = basicNotes, default = None,
+                        help = 'for MusicXML notes without string and fret, defaults to the instrument\'s')
+    parser.add_argument('--output', default = None, help = 'a diagram of the heatmap (.svg or .png)')
+    parser.add_argument('--workers', type = int, default = None,
+                        help = 'number of worker processes, defaults to the number of CPUs')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    instrument = instruments[args.instrument]
+    if args.tuning is not None:
+        instrument = instrument.withTuning(args.tuning)
+    model = instrument.newModel()
+    repertoire = None
+    for repertoire in countRepertoire(args.paths, pitchMatrix(model, instrument.lowestPitch), args.workers):
+        pass
+    for failure in repertoire.failed:
+        print(failure, file = sys.stderr)
+    print(f"{repertoire.notes} notes in {repertoire.files} files, {repertoire.skipped} off the neck")
+    for stringIndex, noteName in enumerate(reversed(model.tuning)):
+        print(f"{noteName:2s} " + ' '.join(f"{count:5d}" for count in repertoire.counts[stringIndex]))
+    if args.output is not None:
+        fmt = os.path.splitext(args.output)[1].lstrip('.')
+        model.setHeat(repertoire.counts)
+        d = Diagram(model).drawDiagram(f"{repertoire.notes} notes in {repertoire.files} files",
+                                       newBackend(defaultBackend(fmt)))
+        with open(args.output, 'wb') as f:
+            f.write(d.encode(fmt))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from model import basicNotes
+from cache import defaultCacheDir
+
+# Scales as pitch class sets: a 12 bit mask with bit i set if the pitch
+# class i (basicNotes[i]) is in the set, the same encoding as the global
+# marks of the FretBoardModel. The scales are read from scales.txt; all modes
+# of all of them in all transpositions are computed when the catalog is
+# built, which is pickled to the cache directory so later starts only load it.
+
+intervalsDict: Dict[str, int] = { '1': 0,
+                               'b2': 1,
+                               '2': 2,
+                               '#2': 3,
+                               'b3': 3,
+                               '3': 4,
+                               '4': 5,
+                               '#4': 6,
+                               'b5': 6,
+                               '5': 7,
+                               '#5': 8,
+                               'b6': 8,
+                               '6': 9,
+                               'b7': 10,
+                               '7': 11,
+                             }
+
+allNotes = 0xfff
+catalogFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scales.txt')
+# part of the name of the pickled catalog, to be increased when ScaleCatalog changes
+catalogVersion = 1
+
+
+def transposeMask(mask: int, semitones: int) -> int:
+    semitones %= 12
+    return ((mask << semitones) | (mask >> (12 - semitones))) & allNotes
+
+
+def maskNotes(mask: int) -> List[int]:
+    return [note for note in range(12) if mask >> note & 1]
+
+
+def notesMask(notes: List[int]) -> int:
+    mask = 0
+    for note in notes:
+        mask |= 1 << note % 12
+    return mask
+
+
+class ScaleMatch(NamedTuple):
+    scaleName: str
+    mode: int
+    # the root of the mode
+    rootNote: int
+
+    def __str__(self) -> str:
+        # named after the root of the parent scale like the diagram headings,
+        # e.g. D Dorian is "C Major, Mode 2"
+        baseNote = basicNotes[parentRoot(self.rootNote, self.scaleName, self.mode)]
+        return f"{baseNote} {self.scaleName}, Mode {self.mode + 1}"
+
+
+def parseCatalog(text: str) -> Tuple[List[str], List[int]]:
+    # lines 'name: intervals' or just 'intervals', comment lines start with '#'
+    scaleNames, scaleMasks = [], []
+    for lineNumber, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        scaleName, _, intervalNames = line.rpartition(':')
+        try:
+            mask = notesMask(intervalsDict[interval] for interval in intervalNames.split())
+        except KeyError as e:
+            raise ValueError(f"unknown interval {e} in line {lineNumber} of the scale catalog")
+        if not mask & 1:
+            raise ValueError(f"scale without root in line {lineNumber} of the scale catalog")
+        scaleNames.append(scaleName.strip() or f"Scale {mask}")
+        scaleMasks.append(mask)
+    return scaleNames, scaleMasks
+
+
+class ScaleCatalog():
+    def __init__(self, scaleNames: List[str], scaleMasks: List[int]):
+        self.scaleNames: List[str] = list(scaleNames)
+        self._scaleIndex: Dict[str, int] = {scaleName: i for i, scaleName in enumerate(self.scaleNames)}
+        # the ones given a name in the data file, unnamed ones are called by their number
+        self.namedScales: List[str] = [scaleName for scaleName, mask in zip(self.scaleNames, scaleMasks)
+                                       if scaleName != f"Scale {mask}"]
+        # the intervals of each scale from its root, as a mask
+        self.scaleMasks: np.ndarray = np.array(scaleMasks, dtype=np.uint16)
+        # of the data file and catalogVersion, set by loadCatalog
+        self.digest: Optional[str] = None
+
+        # one entry per scale, mode and root; all of them as parallel arrays.
+        # The modes of a scale start on its notes (offsets from its root), the
+        # mode on rootNote is the scale transposed by rootNote - offset
+        scaleBits = (self.scaleMasks[:, None] >> np.arange(12)) & 1
+        modeScales, offsets = np.nonzero(scaleBits)
+        numberModes = scaleBits.sum(axis=1)
+        firstModes = np.cumsum(numberModes) - numberModes
+        modes = np.arange(len(modeScales)) - np.repeat(firstModes, numberModes)
+        self.scaleIndexes: np.ndarray = np.repeat(modeScales, 12).astype(np.int32)
+        self.modes: np.ndarray = np.repeat(modes, 12).astype(np.int16)
+        self.rootNotes: np.ndarray = np.tile(np.arange(12, dtype=np.int16), len(modeScales))
+        shifts = (self.rootNotes - np.repeat(offsets, 12)) % 12
+        masks = self.scaleMasks[self.scaleIndexes].astype(np.uint32)
+        self.masks: np.ndarray = (((masks << shifts) | (masks >> (12 - shifts))) & allNotes).astype(np.uint16)
+        self._initCache()
+
+    def _initCache(self):
+        # the reverse index: a pitch class set -> the entries containing it,
+        # filled per set on first use and large enough for all 4096 sets; built
+        # up front it would hold each entry once per subset of its notes
+        self._containingEntries = lru_cache(maxsize = allNotes + 1)(self._entriesContaining)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_containingEntries']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._initCache()
+
+    def numberModes(self, scaleName: str) -> int:
+        return bin(int(self.scaleMasks[self._scaleIndex[scaleName]])).count('1')
+
+    def intervals(self, scaleName: str, mode: int = 0) -> List[int]:
+        # intervals of the mode relative to its own root, in ascending order
+        intervals = maskNotes(int(self.scaleMasks[self._scaleIndex[scaleName]]))
+        return sorted((interval - intervals[mode]) % 12 for interval in intervals)
+
+    def modeNotes(self, rootNote: int, scaleName: str, mode: int) -> List[int]:
+        # the mode is the scale started on its mode-th degree, transposed
+        # such that it starts on rootNote
+        return [(rootNote + interval) % 12 for interval in self.intervals(scaleName, mode)]
+
+    def parentRoot(self, rootNote: int, scaleName: str, mode: int) -> int:
+        # root note of the scale of which the mode starting on rootNote is the mode-th one
+        return (rootNote - self.intervals(scaleName)[mode]) % 12
+
+    def mask(self, rootNote: int, scaleName: str, mode: int) -> int:
+        return notesMask(self.modeNotes(rootNote, scaleName, mode))
+
+    def _entriesContaining(self, noteMask: int) -> np.ndarray:
+        return np.nonzero((self.masks & noteMask) == noteMask)[0].astype(np.int32)
+
+    def countContaining(self, noteMask: int) -> int:
+        return len(self._containingEntries(noteMask))
+
+    def containing(self, noteMask: int, limit: Optional[int] = None) -> List[ScaleMatch]:
+        # few marked notes are contained in a large part of the catalog,
+        # limit restricts the result to the first entries (named scales first)
+        entries = self._containingEntries(noteMask)[:limit]
+        return [ScaleMatch(self.scaleNames[self.scaleIndexes[entry]], int(self.modes[entry]),
+                           int(self.rootNotes[entry]))
+                for entry in entries]
+
+
+def loadCatalog(path: str = catalogFile, cacheDir: Optional[str] = None) -> ScaleCatalog:
+    # the pickled catalog is keyed by the content of the data file, so
+    # reading it costs the same whatever the number of scales
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data + str(catalogVersion).encode('ascii')).hexdigest()[:16]
+    cacheDir = cacheDir if cacheDir is not None else defaultCacheDir('scales')
+    cachePath = os.path.join(cacheDir, f"scales-{digest}.pickle")
+    try:
+        with open(cachePath, 'rb') as f:
+            cached = pickle.load(f)
+        if isinstance(cached, ScaleCatalog):
+            cached.digest = digest
+            return cached
+    except Exception:
+        # missing, truncated or written by another version, parsed and rewritten
+        pass
+
+    catalog = ScaleCatalog(*parseCatalog(data.decode('utf-8')))
+    catalog.digest = digest
+    try:
+        os.makedirs(cacheDir, exist_ok = True)
+        fd, tmpPath = tempfile.mkstemp(dir = cacheDir, suffix = '.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(catalog, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, cachePath)
+    except OSError:
+        # without a writable cache the catalog is parsed on every start
+        pass
+    return catalog
+
+
+catalog: ScaleCatalog = loadCatalog()
+
+
+def modeNotes(rootNote: int, scaleName: str, mode: int) -> List[int]:
+    return catalog.modeNotes(rootNote, scaleName, mode)
+
+
+def parentRoot(rootNote: int, scaleName: str, mode: int) -> int:
+    return catalog.parentRoot(rootNote, scaleName, mode)
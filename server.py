@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from model import basicNotes, noteIndex
+from instrument import Instrument, instruments
+from scales import catalog
+from fingering import fingeringPresets
+from diagram import diagramVersion, renderDiagram
+from book import bookItems
+from cache import RenderCache, defaultCacheDir, renderKey
+
+# Scale diagrams over HTTP without the GUI, e.g.
+#   python server.py --port 8080
+#   curl 'http://localhost:8080/diagram.svg?root=A&scale=Melodic+Minor&mode=1&position=5'
+# Parameters: root, scale, mode (1 = the scale itself), position (the
+# diagram starts on the first root on the lowest string from this fret on),
+# fingering, instrument and tuning (comma separated, lowest string first);
+# /diagram.png for PNGs, /stats for the counters. Diagrams are rendered by
+# a pool of processes, identical requests share one render while it runs,
+# and responses are cached in memory. The ETag is derived from the request,
+# so a matching If-None-Match is answered with 304 without rendering.
+
+# part of the ETags with diagram.diagramVersion and the digest of the scale
+# catalog, to be changed with the responses
+serviceVersion = 1
+maxHeaderBytes = 8192
+responseCacheBytes = 64 * 1024 * 1024
+# seconds clients may use a diagram without revalidating
+cacheMaxAge = 3600
+contentTypes = {'svg': 'image/svg+xml', 'png': 'image/png'}
+reasons = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# one cache per worker process, they share the disk part
+_renderCache: Optional[RenderCache] = None
+
+
+class DiagramRequest(NamedTuple):
+    instrument: Instrument
+    rootNote: int
+    scaleName: str
+    mode: int
+    position: int
+    fingering: str
+    fmt: str
+
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def parseRequest(fmt: str, query: Dict[str, List[str]]) -> DiagramRequest:
+    # raises ValueError for invalid parameters
+    def parameter(name: str, default: str) -> str:
+        return query.get(name, [default])[-1]
+    if parameter('instrument', 'guitar') not in instruments:
+        raise ValueError(f"unknown instrument {parameter('instrument', '')}")
+    instrument = instruments[parameter('instrument', 'guitar')]
+    if 'tuning' in query:
+        tuning = [noteName.strip() for noteName in parameter('tuning', '').split(',')]
+        instrument = instrument.withTuning(tuning)
+        if instrument.scaleLengths is not None and len(instrument.scaleLengths) != len(tuning):
+            instrument = instrument._replace(scaleLengths = None, perpendicularFret = 0)
+    instrument.check()
+    root = parameter('root', 'A')
+    if root not in basicNotes:
+        raise ValueError(f"unknown root {root}")
+    scaleName = parameter('scale', 'Major')
+    if scaleName not in catalog.scaleNames:
+        raise ValueError(f"unknown scale {scaleName}")
+    try:
+        mode = int(parameter('mode', '1')) - 1
+        position = int(parameter('position', '0'))
+    except ValueError:
+        raise ValueError("mode and position must be numbers")
+    if not 0 <= mode < catalog.numberModes(scaleName):
+        raise ValueError(f"{scaleName} has modes 1 to {catalog.numberModes(scaleName)}")
+    if not 0 <= position <= instrument.numberFrets:
+        raise ValueError(f"position {position} is not on the neck")
+    fingering = parameter('fingering', 'nearest')
+    if fingering not in ['nearest'] + list(fingeringPresets.keys()):
+        raise ValueError(f"unknown fingering {fingering}")
+    return DiagramRequest(instrument, noteIndex(root), scaleName, mode, position, fingering, fmt)
+
+
+def requestKey(request: DiagramRequest) -> str:
+    return renderKey({'version': serviceVersion, 'diagram': diagramVersion, 'catalog': catalog.digest,
+                      'request': request})
+
+
+def initWorker(cacheDir: Optional[str]):
+    global _renderCache
+    if cacheDir is not None:
+        _renderCache = RenderCache(cacheDir)
+
+
+def renderRequest(request: DiagramRequest) -> bytes:
+    # runs in a worker process
+    items = bookItems(request.instrument, [request.rootNote], [request.scaleName], [request.mode],
+                      request.fingering, request.position)
+    item = next(items, None)
+    if item is None:
+        raise ValueError("the fingering does not fit the scale from this position")
+    model, heading = item
+    return renderDiagram(model, heading, request.fmt, cache = _renderCache)
+
+
+class DiagramService():
+    def __init__(self, executor: ProcessPoolExecutor, cacheBytes: int = responseCacheBytes):
+        self.executor: ProcessPoolExecutor = executor
+        self.cacheBytes: int = cacheBytes
+        # renders running, by request key
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self._cache: OrderedDict = OrderedDict()
+        self._cachedBytes: int = 0
+        self.stats: Dict[str, int] = {'requests': 0, 'rendered': 0, 'shared': 0, 'cached': 0,
+                                      'notModified': 0, 'failed': 0}
+
+    def _remember(self, key: str, data: bytes):
+        self._cache[key] = data
+        self._cachedBytes += len(data)
+        while self._cachedBytes > self.cacheBytes and len(self._cache) > 1:
+            evictedKey, evicted = self._cache.popitem(last = False)
+            self._cachedBytes -= len(evicted)
+
+    def _rendered(self, key: str, future: asyncio.Future):
+        del self._rendering[key]
+        if not future.cancelled() and future.exception() is None:
+            self._remember(key, future.result())
+
+    async def diagram(self, key: str, request: DiagramRequest) -> bytes:
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            self.stats['cached'] += 1
+            return data
+        future = self._rendering.get(key)
+        if future is None:
+            self.stats['rendered'] += 1
+            future = asyncio.get_running_loop().run_in_executor(self.executor, renderRequest, request)
+            self._rendering[key] = future
+            future.add_done_callback(lambda done: self._rendered(key, done))
+        else:
+            self.stats['shared'] += 1
+        # a client going away does not cancel the render the others wait for
+        return await asyncio.shield(future)
+
+    async def respond(self, method: str, target: str, headers: Dict[str, str]) -> Response:
+        self.stats['requests'] += 1
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        url = urlsplit(target)
+        if url.path == '/stats':
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats).encode()
+        fmt = {'/diagram.svg': 'svg', '/diagram.png': 'png'}.get(url.path)
+        if fmt is None:
+            return 404, {}, b''
+        try:
+            request = parseRequest(fmt, parse_qs(url.query))
+        except ValueError as e:
+            return 400, {'Content-Type': 'text/plain; charset=utf-8'}, f"{e}\n".encode()
+        key = requestKey(request)
+        cacheHeaders = {'ETag': f'"{key[:32]}"', 'Cache-Control': f"max-age={cacheMaxAge}"}
+        if cacheHeaders['ETag'] in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            self.stats['notModified'] += 1
+            return 304, cacheHeaders, b''
+        try:
+            data = await self.diagram(key, request)
+        except ValueError as e:
+            return 400, {'Content-Type': 'text/plain; charset=utf-8'}, f"{e}\n".encode()
+        except Exception as e:
+            self.stats['failed'] += 1
+            return 500, {'Content-Type': 'text/plain; charset=utf-8'}, f"{type(e).__name__}: {e}\n".encode()
+        return 200, {'Content-Type': contentTypes[fmt], **cacheHeaders}, data
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # HTTP/1.1 with keep-alive, requests without a body
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self.write(writer, 'HEAD', 400, {'Connection': 'close'}, b'')
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keepAlive = (headers.get('connection', '').lower() != 'close' if version == 'HTTP/1.1'
+                             else headers.get('connection', '').lower() == 'keep-alive')
+                status, responseHeaders, body = await self.respond(method, target, headers)
+                responseHeaders['Connection'] = 'keep-alive' if keepAlive else 'close'
+                await self.write(writer, method, status, responseHeaders, body)
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def write(self, writer: asyncio.StreamWriter, method: str, status: int,
+                    headers: Dict[str, str], body: bytes):
+        lines = [f"HTTP/1.1 {status} {reasons[status]}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD' and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, workers: int, cacheDir: Optional[str]):
+    # spawn, the workers do not inherit the event loop
+    with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context('spawn'),
+                             initializer = initWorker, initargs = (cacheDir,)) as executor:
+        service = DiagramService(executor)
+        server = await asyncio.start_server(service.handle, host, port, limit = maxHeaderBytes)
+        print(f"serving diagrams on http://{host}:{server.sockets[0].getsockname()[1]}", flush = True)
+        async with server:
+            await server.serve_forever()
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = 'Serve scale diagrams over HTTP.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080, help = '0 for any free port')
+    parser.add_argument('--workers', type = int, default = None,
+                        help = 'number of render processes, defaults to the number of CPUs')
+    parser.add_argument('--cache-dir', default = defaultCacheDir('diagrams'),
+                        help = 'render cache shared with the GUI and export.py')
+    parser.add_argument('--no-cache', action = 'store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parseArguments(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers or os.cpu_count() or 1,
+                          None if args.no_cache else args.cache_dir))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
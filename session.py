@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+from model import FretBoardModel, basicNotes
+
+# The state of a fretboard as an immutable snapshot: the tuning, the global
+# marks and the individual marks as one bitset per string (bit i <=> fret i).
+# A snapshot reuses the parts of the previous one that did not change, so
+# the snapshots of the undo history share most of their memory. Sessions
+# are saved as small JSON documents with the bitsets in hex.
+
+sessionVersion = 1
+# undo steps kept
+maxHistory = 500
+
+
+class Snapshot(NamedTuple):
+    # from the lowest to the highest string
+    tuning: Tuple[str, ...]
+    markedGlobal: int
+    # per string in the order of the model (highest string first)
+    individual: Tuple[int, ...]
+
+
+def snapshot(model: FretBoardModel, previous: Optional[Snapshot] = None) -> Snapshot:
+    tuning = tuple(model.tuning)
+    individual = tuple(model.individualBitsets())
+    if previous is None:
+        return Snapshot(tuning, model.markedGlobal, individual)
+    if tuning == previous.tuning:
+        tuning = previous.tuning
+    if individual == previous.individual:
+        individual = previous.individual
+    elif len(individual) == len(previous.individual):
+        # the bitsets of unchanged strings are shared as well
+        individual = tuple(old if old == new else new for old, new in zip(previous.individual, individual))
+    return Snapshot(tuning, model.markedGlobal, individual)
+
+
+def encode(state: Snapshot, numberFrets: int) -> str:
+    return json.dumps({'version': sessionVersion,
+                       'numberFrets': numberFrets,
+                       'tuning': list(state.tuning),
+                       'markedGlobal': [basicNotes[note] for note in range(12) if state.markedGlobal >> note & 1],
+                       'individual': [f"{bitset:x}" for bitset in state.individual]},
+                      separators = (',', ':'))
+
+
+def decode(text: str, numberFrets: int) -> Snapshot:
+    # raises ValueError if the session does not fit an instrument with numberFrets frets
+    try:
+        document = json.loads(text)
+        if document['version'] != sessionVersion:
+            raise ValueError(f"unsupported session version {document['version']}")
+        tuning = tuple(document['tuning'])
+        markedGlobal = sum(1 << basicNotes.index(noteName) for noteName in set(document['markedGlobal']))
+        individual = tuple(int(bitset, 16) for bitset in document['individual'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"not a session: {e}")
+    if any(noteName not in basicNotes for noteName in tuning):
+        raise ValueError(f"unknown notes in the tuning {' '.join(tuning)}")
+    if len(individual) != len(tuning):
+        raise ValueError(f"marks of {len(individual)} strings for {len(tuning)} strings")
+    if any(bitset >> (numberFrets + 1) for bitset in individual):
+        raise ValueError(f"marks beyond fret {numberFrets}")
+    return Snapshot(tuning, markedGlobal, individual)
+
+
+def save(path: str, state: Snapshot, numberFrets: int):
+    # written to a temporary file first, so a failure keeps the old session
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporaryPath = tempfile.mkstemp(suffix = '.json', dir = directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(encode(state, numberFrets))
+        os.replace(temporaryPath, path)
+    except BaseException:
+        os.remove(temporaryPath)
+        raise
+
+
+def load(path: str, numberFrets: int) -> Snapshot:
+    with open(path) as f:
+        return decode(f.read(), numberFrets)
+
+
+class History():
+    # undo and redo stacks of snapshots; the oldest steps are dropped
+    def __init__(self, maxSteps: int = maxHistory):
+        self._undo: Deque[Snapshot] = deque(maxlen = maxSteps)
+        self._redo: List[Snapshot] = []
+
+    def record(self, previous: Snapshot):
+        # previous: the state before a change
+        self._undo.append(previous)
+        self._redo.clear()
+
+    def canUndo(self) -> bool:
+        return bool(self._undo)
+
+    def canRedo(self) -> bool:
+        return bool(self._redo)
+
+    def undo(self, current: Snapshot) -> Optional[Snapshot]:
+        if not self._undo:
+            return None
+        self._redo.append(current)
+        return self._undo.pop()
+
+    def redo(self, current: Snapshot) -> Optional[Snapshot]:
+        if not self._redo:
+            return None
+        self._undo.append(current)
+        return self._redo.pop()
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
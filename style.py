@@ -41,6 +41,14 @@ class FretStyle(object):
     @property
     def circleX(self): return self._circleX
 
+    def params(self) -> dict:
+        # everything the look of a diagram depends on, e.g. for cache keys
+        return {'radius': self._radius,
+                'fretMarginX': self._fretMarginX,
+                'fretMarginY': self._fretMarginY,
+                'circleStrokeColor': self.circleStrokeColor,
+                'circleFillColor': self.circleFillColor}
+
     def _calcPrivateVars(self):
         self._calcFontSize()
         self._calcFretDimensions()
@@ -0,0 +1,116 @@
+import io
+from typing import Callable, Dict, List, TextIO, Tuple
+from xml.sax.saxutils import escape
+from diagram import DiagramBackend
+
+# Diagram backend writing SVG text straight to a stream. Identical glyphs
+# (note circles, fret and string lines) are defined once in <defs> and
+# referenced with <use>, repeated styles become CSS classes. Definitions are
+# written when first needed, so several diagrams can be streamed into one
+# document (see begin and place) and share them, including whole groups
+# such as the grid of a fretboard.
+
+
+def num(value: float) -> str:
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+class SvgWriter(DiagramBackend):
+    name = 'stream'
+
+    def __init__(self, stream: TextIO = None):
+        self.stream: TextIO = stream if stream is not None else io.StringIO()
+        self._glyphs: Dict[Tuple, str] = {}
+        self._classes: Dict[Tuple, str] = {}
+        self._depth: int = 0
+        # of the enclosing diagrams, whose viewBox starts at -height
+        self._heights: List[float] = []
+        self._placement: Tuple[float, float, float] = (0, 0, 1)
+
+    def place(self, x: float, y: float, scale: float = 1):
+        # where the next nested begin puts its diagram, for callers that do
+        # not pass it themselves (e.g. Diagram.drawDiagram)
+        self._placement = (x, y, scale)
+
+    def begin(self, width: float, height: float, x: float = None, y: float = None, scale: float = None):
+        # the outermost begin starts the document, nested ones place a
+        # diagram at (x, y) of the enclosing one (measured from its top left)
+        # scaled by scale, by default as given to place;
+        # like drawSvg, y points upwards and the origin is in the lower left corner
+        if self._depth == 0:
+            viewBox = f'viewBox="0 {num(-height)} {num(width)} {num(height)}"'
+            self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                              '<svg xmlns="http://www.w3.org/2000/svg" '
+                              'xmlns:xlink="http://www.w3.org/1999/xlink" '
+                              f'width="{num(width)}" height="{num(height)}" {viewBox}>\n')
+        else:
+            placedX, placedY, placedScale = self._placement
+            x = x if x is not None else placedX
+            y = y if y is not None else placedY
+            scale = scale if scale is not None else placedScale
+            # a group rather than a nested <svg>, which not every renderer supports (e.g. QtSvg)
+            self.stream.write(f'<g transform="translate({num(x)} {num(y - self._heights[-1] + height * scale)}) '
+                              f'scale({scale:.4g})">\n')
+            self._placement = (0, 0, 1)
+        self._heights.append(height)
+        self._depth += 1
+
+    def end(self):
+        self._depth -= 1
+        self._heights.pop()
+        self.stream.write('</svg>\n' if self._depth == 0 else '</g>\n')
+
+    def _class(self, key: Tuple, css: str) -> str:
+        name = self._classes.get(key)
+        if name is None:
+            name = f"s{len(self._classes)}"
+            self._classes[key] = name
+            self.stream.write(f'<style>.{name}{{{css}}}</style>\n')
+        return name
+
+    def _glyph(self, key: Tuple, element: str) -> str:
+        glyphId = self._glyphs.get(key)
+        if glyphId is None:
+            glyphId = f"g{len(self._glyphs)}"
+            self._glyphs[key] = glyphId
+            self.stream.write(f'<defs><{element} id="{glyphId}"/></defs>\n')
+        return glyphId
+
+    def _use(self, glyphId: str, x: float, y: float):
+        self.stream.write(f'<use xlink:href="#{glyphId}" x="{num(x)}" y="{num(-y)}"/>\n')
+
+    def group(self, key: Tuple, draw: Callable[[float, float], None], x: float, y: float):
+        # drawn once at the origin into a definition, used at (x, y) from then on
+        groupId = self._glyphs.get(('group', key))
+        if groupId is None:
+            groupId = f"g{len(self._glyphs)}"
+            self._glyphs[('group', key)] = groupId
+            self.stream.write(f'<defs><g id="{groupId}">\n')
+            draw(0, 0)
+            self.stream.write('</g></defs>\n')
+        self._use(groupId, x, y)
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, strokeWidth: float, stroke: str):
+        styleClass = self._class(('line', strokeWidth, stroke),
+                                 f"stroke:{stroke};stroke-width:{num(strokeWidth)}")
+        glyphId = self._glyph(('line', x2 - x1, y2 - y1, styleClass),
+                              f'line x1="0" y1="0" x2="{num(x2 - x1)}" y2="{num(y1 - y2)}" class="{styleClass}"')
+        self._use(glyphId, x1, y1)
+
+    def circle(self, cx: float, cy: float, r: float, fill: str, strokeWidth: float, stroke: str):
+        styleClass = self._class(('circle', fill, strokeWidth, stroke),
+                                 f"fill:{fill};stroke:{stroke};stroke-width:{num(strokeWidth)}")
+        glyphId = self._glyph(('circle', r, styleClass),
+                              f'circle cx="0" cy="0" r="{num(r)}" class="{styleClass}"')
+        self._use(glyphId, cx, cy)
+
+    def text(self, text: str, fontSize: float, x: float, y: float, fill: str, anchor: str):
+        textAnchor = 'middle' if anchor == 'middle' else 'start'
+        styleClass = self._class(('text', fontSize, fill, textAnchor),
+                                 f"font-size:{num(fontSize)}px;fill:{fill};text-anchor:{textAnchor}")
+        self.stream.write(f'<text x="{num(x)}" y="{num(-y)}" class="{styleClass}">{escape(text)}</text>\n')
+
+    def encode(self, fmt: str) -> bytes:
+        if fmt != 'svg':
+            raise ValueError(f"the stream backend cannot encode {fmt}")
+        return self.stream.getvalue().encode('utf-8')
@@ -0,0 +1,118 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+
+# Opt-in tracing of the hot paths, e.g. the chain of a click from Fret over
+# the event bus to FretBoard, the repaints of the neck and the diagram rendering.
+# Events are kept in memory and saved in the trace event format of Chrome
+# (chrome://tracing, Perfetto). While disabled a traced function costs a
+# flag check; guitar.py enables tracing if GUITARNECK_TRACE names a file.
+
+_enabled: bool = False
+_events: List[dict] = []
+_lock = threading.Lock()
+_origin: float = time.perf_counter()
+_pid: int = os.getpid()
+
+
+def _now() -> float:
+    # microseconds, the unit of trace events
+    return (time.perf_counter() - _origin) * 1e6
+
+
+def _append(event: dict):
+    event['pid'] = _pid
+    event['tid'] = threading.get_ident()
+    with _lock:
+        _events.append(event)
+
+
+def enable(path: str = None):
+    # path: where the events are saved when the program exits
+    global _enabled
+    _enabled = True
+    if path is not None:
+        atexit.register(save, path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def isEnabled() -> bool:
+    return _enabled
+
+
+def clear():
+    with _lock:
+        _events.clear()
+
+
+def events() -> List[dict]:
+    with _lock:
+        return list(_events)
+
+
+def traced(function: Callable) -> Callable:
+    # records each call of function as a complete event named by its qualified name
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        start = _now()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _append({'name': name, 'ph': 'X', 'ts': start, 'dur': _now() - start})
+    return wrapper
+
+
+@contextmanager
+def span(name: str, **args):
+    if not _enabled:
+        yield
+        return
+    start = _now()
+    try:
+        yield
+    finally:
+        _append({'name': name, 'ph': 'X', 'ts': start, 'dur': _now() - start, 'args': args})
+
+
+def counter(name: str, **values):
+    # e.g. the number of cells repainted
+    if _enabled:
+        _append({'name': name, 'ph': 'C', 'ts': _now(), 'args': values})
+
+
+def complete(name: str, duration: float, end: float = None, **args) -> float:
+    # a complete event of duration microseconds measured elsewhere, e.g. in a
+    # worker process, ending at end (default now); returns its start
+    start = (_now() if end is None else end) - duration
+    if _enabled:
+        _append({'name': name, 'ph': 'X', 'ts': start, 'dur': duration, 'args': args})
+    return start
+
+
+def asyncBegin(name: str, eventId: int, **args):
+    # for work finishing elsewhere, e.g. diagrams rendered in a worker process
+    if _enabled:
+        _append({'name': name, 'ph': 'b', 'cat': 'async', 'id': eventId, 'ts': _now(), 'args': args})
+
+
+def asyncEnd(name: str, eventId: int, **args):
+    if _enabled:
+        _append({'name': name, 'ph': 'e', 'cat': 'async', 'id': eventId, 'ts': _now(), 'args': args})
+
+
+def save(path: str):
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,93 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from model import basicNotes, noteIndex
+
+# Named tunings, from the lowest to the highest string. The note layouts of
+# all presets for an instrument are computed at once (see TuningLibrary), so
+# switching between them only compares and copies arrays.
+
+# per family of instruments
+tuningPresets: Dict[str, Dict[str, List[str]]] = {
+        'guitar': {
+            'Standard': ['E', 'A', 'D', 'G', 'B', 'E'],
+            'Half Step Down': ['D#', 'G#', 'C#', 'F#', 'A#', 'D#'],
+            'Full Step Down': ['D', 'G', 'C', 'F', 'A', 'D'],
+            'Drop D': ['D', 'A', 'D', 'G', 'B', 'E'],
+            'Double Drop D': ['D', 'A', 'D', 'G', 'B', 'D'],
+            'Drop C': ['C', 'G', 'C', 'F', 'A', 'D'],
+            'DADGAD': ['D', 'A', 'D', 'G', 'A', 'D'],
+            'Open D': ['D', 'A', 'D', 'F#', 'A', 'D'],
+            'Open E': ['E', 'B', 'E', 'G#', 'B', 'E'],
+            'Open G': ['D', 'G', 'D', 'G', 'B', 'D'],
+            'Open A': ['E', 'A', 'E', 'A', 'C#', 'E'],
+            'Open C': ['C', 'G', 'C', 'G', 'C', 'E'],
+            'Major Thirds': ['E', 'G#', 'C', 'E', 'G#', 'C'],
+            'New Standard': ['C', 'G', 'D', 'A', 'E', 'G'],
+            'Baritone': ['B', 'E', 'A', 'D', 'F#', 'B'],
+            'Standard 7': ['B', 'E', 'A', 'D', 'G', 'B', 'E'],
+            'Drop A 7': ['A', 'E', 'A', 'D', 'G', 'B', 'E'],
+            'Standard 8': ['F#', 'B', 'E', 'A', 'D', 'G', 'B', 'E'],
+            'Drop E 8': ['E', 'B', 'E', 'A', 'D', 'G', 'B', 'E'],
+            'Standard 9': ['C#', 'F#', 'B', 'E', 'A', 'D', 'G', 'B', 'E'],
+        },
+        'bass': {
+            'Standard': ['E', 'A', 'D', 'G'],
+            'Drop D': ['D', 'A', 'D', 'G'],
+            'Standard 5': ['B', 'E', 'A', 'D', 'G'],
+            'Standard 6': ['B', 'E', 'A', 'D', 'G', 'C'],
+        },
+}
+
+
+def allFourths(numberStrings: int, lowest: str = 'E') -> List[str]:
+    return [basicNotes[(noteIndex(lowest) + 5 * stringIndex) % 12] for stringIndex in range(numberStrings)]
+
+
+def dropped(tuning: List[str], semitones: int = 2) -> List[str]:
+    # the lowest string tuned down
+    return [basicNotes[(noteIndex(tuning[0]) - semitones) % 12]] + list(tuning[1:])
+
+
+def presetsFor(tuning: List[str]) -> Dict[str, List[str]]:
+    # the presets with as many strings as the given (default) tuning of an
+    # instrument, of its family if it is a preset; the tuning itself comes
+    # first, all fourths and a dropped lowest string are always available
+    families = [family for family in tuningPresets.values() if tuning in family.values()]
+    presets = {name: preset for family in (families or tuningPresets.values())
+               for name, preset in family.items() if len(preset) == len(tuning)}
+    if tuning not in presets.values():
+        presets = {'Instrument': list(tuning), **presets}
+    generic = {'All Fourths': allFourths(len(tuning), tuning[0]),
+               f"Drop {dropped(tuning)[0]}": dropped(tuning)}
+    for name, preset in generic.items():
+        if preset not in presets.values():
+            presets[name] = preset
+    return presets
+
+
+class TuningLibrary():
+    def __init__(self, tuning: List[str], numberFrets: int, presets: Dict[str, List[str]] = None):
+        presets = presets if presets is not None else presetsFor(tuning)
+        self.names: List[str] = list(presets.keys())
+        self.tunings: List[List[str]] = list(presets.values())
+        # presets x strings pitch classes of the open strings and presets x
+        # strings x frets note layouts, the strings in the order of the model
+        self.baseNotes: np.ndarray = np.array([[noteIndex(noteName) for noteName in reversed(preset)]
+                                               for preset in self.tunings], dtype=np.int16)
+        self.notes: np.ndarray = (self.baseNotes[:, :, np.newaxis] + np.arange(numberFrets + 1, dtype=np.int16)) % 12
+        self.baseNotes.setflags(write = False)
+        self.notes.setflags(write = False)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def index(self, name: str) -> int:
+        return self.names.index(name)
+
+    def layout(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.baseNotes[i], self.notes[i]
+
+    def find(self, baseNotes: np.ndarray) -> Optional[int]:
+        # the preset of a tuning, None for a custom one
+        matches = np.nonzero((self.baseNotes == baseNotes).all(axis = 1))[0]
+        return int(matches[0]) if len(matches) else None
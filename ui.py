@@ -1,225 +1,290 @@
 from PyQt5 import QtCore, Qt
 from PyQt5.QtWidgets import (QWidget, QPushButton, QLabel, QComboBox, 
-    QHBoxLayout, QVBoxLayout, QGridLayout, QAction, QFrame, QLCDNumber, QSpinBox)
-from PyQt5.QtGui import QIcon, QColor 
-from typing import List, Set, Dict
-from itertools import cycle, islice, dropwhile
+    QHBoxLayout, QVBoxLayout, QGridLayout, QAction, QLCDNumber, QSpinBox, QListWidget, QCompleter, QScrollArea,
+    QShortcut, QFileDialog, QMessageBox, QCheckBox)
+from PyQt5.QtGui import QIcon, QColor, QKeySequence
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+import numpy as np
 from style import FretStyle
-import drawSvg as dsvg
-
-basicNotes: List[str] = ['A', 'A#', 'B', 'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#']
-notesCycle = cycle(basicNotes)
-standardTuning: List[str] = ['E', 'A', 'D', 'G', 'B', 'E']
-
-intervalsDict: Dict[str, int] = { '1': 0,
-                               'b2': 1,
-                               '2': 2,
-                               '#2': 3,
-                               'b3': 3,
-                               '3': 4,
-                               '4': 5,
-                               '#4': 6,
-                               'b5': 6,
-                               '5': 7,
-                               '#5': 8,
-                               '6': 9,
-                               'b7': 10,
-                               '7': 11,
-                             }
-
-scalesGlobal: Dict[str, List[str]] = {
-        'Melodic Minor': ['1', '2', 'b3', '4', '5', '6', '7'],
-        'Harmonic Minor': ['1', '2', 'b3', '4', '5', '#5', '7'],
-        'Major': ['1', '2', '3', '4', '5', '6', '7'],
-}
+from model import (FretBoardModel, Positions, concatPositions, basicNotes, noteIndex)
+from instrument import Instrument, defaultInstrument
+from tunings import TuningLibrary
+from session import History, Snapshot, snapshot
+import session
+from audio import SampleBank, Player, pitchMatrix, markedPitches, writeWav
+from pitch import analyze
+from repertoire import countRepertoire
+from scales import intervalsDict, catalog, modeNotes, parentRoot
+from diagram import Diagram, DiagramBackend, renderToFile
+from fingering import fingeringPresets, placeFingering
+from chords import (chordTypes, chordName, chordVoicings, voicingPositions, voicingConstraints,
+                    VoicingConstraints)
+from neck import NeckWidget, cellHeight, labelHeight
+from cache import defaultCacheDir
+from tracing import traced
+from events import EventBus, ChangeSet, toggled
+import tracing
+from concurrent import futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+import copy
+import multiprocessing
+import os
+import threading
+import time
+import wave
 
 melodicMinor: List[str] = ['1', '2', 'b3', '4', '5', '6', '7']
 
-buttonWidth = 45
 col0Width = 60
-
-stringColor = '#0000aa'
-stringWidth = 3
-headingFontSize = 26
-headingColor = '#000000'
+# the fitting scales listed at most, few marked notes fit a large part of the catalog
+maxFittingScales = 200
+# seconds between the repaints of a heatmap while it is computed
+heatUpdateInterval = 0.1
+# wider necks scroll
+maxNeckWidth = 1300
 
 class Scale():
     def __init__(self, notes: int):
         self.notes = []
   
 
-class FretButton(QPushButton):
-    __parentLayout = None
-    rightClicked = QtCore.pyqtSignal(bool)
-    middleClicked = QtCore.pyqtSignal(bool)
-
-    def __init__(self, QWidget):
-        super().__init__(QWidget)
-        self.individualMarked: bool = False
-
-    def mousePressEvent (self, event):
-        if event.button() == QtCore.Qt.RightButton :
-            #self.rightClicked.emit(self.toggleMarked())
-            self.rightClicked.emit(self.individualMarked)
-        elif event.button() == QtCore.Qt.MiddleButton :
-            self.middleClicked.emit(self.individualMarked)
-        else:
-            QPushButton.mousePressEvent(self, event)
+class DiagramRenderer(QtCore.QObject):
+    # renders diagrams in a worker process, so that the GUI thread neither
+    # waits for rendering/encoding nor for file I/O
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
 
-    def setIndividualMarked(self, individualMarked):
-        self.individualMarked = individualMarked
-        self.setProperty('individualMarked', individualMarked)
-        self.setStyle(self.style())
-    
-    def toggleIndividualMarked(self):
-        self.setIndividualMarked(not self.individualMarked)
-        return self.individualMarked
-    
-    def setParentLayout(self, layout):
-        self.__parentLayout = layout
+    def __init__(self, outputPath: str, cacheDir: str = None, workers: int = 1):
+        super().__init__()
+        self.outputPath: str = outputPath
+        self.cacheDir: str = cacheDir
+        self.workers: int = workers
+        self._executor: ProcessPoolExecutor = None
+        self._pending: Future = None
+        self._generation: int = 0
+        self._lock = threading.Lock()
+
+    def render(self, model: FretBoardModel, heading: str, fretStyle: FretStyle):
+        if self._executor is None:
+            # spawn, since forking a process running Qt is not safe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context = multiprocessing.get_context('spawn'))
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        # a newer request makes the pending one stale
+        if self._pending is not None:
+            self._pending.cancel()
+        directory = os.path.dirname(os.path.abspath(self.outputPath))
+        # the model is pickled later on, so the worker gets a copy of the current state
+        fmt = os.path.splitext(self.outputPath)[1].lstrip('.')
+        tracing.asyncBegin('DiagramRenderer.render', generation, heading = heading)
+        self._pending = self._executor.submit(renderToFile, copy.deepcopy(model), heading, fmt,
+                                              fretStyle, self.cacheDir, directory, tracing.isEnabled())
+        self._pending.add_done_callback(lambda future: self._done(future, generation))
+
+    def _done(self, future: Future, generation: int):
+        # called in a thread of the executor, the signals are queued to the GUI thread
+        if future.cancelled():
+            tracing.asyncEnd('DiagramRenderer.render', generation, result = 'cancelled')
+            return
+        if future.exception() is not None:
+            tracing.asyncEnd('DiagramRenderer.render', generation, result = 'failed')
+            self.failed.emit(str(future.exception()))
+            return
+        path, durations = future.result()
+        # the spans of the worker, laid out back to back before now
+        if 'DiagramBackend.encode' in durations:
+            drawn = tracing.complete('DiagramBackend.encode', durations['DiagramBackend.encode'],
+                                     generation = generation)
+            tracing.complete('Diagram.drawDiagram', durations['Diagram.drawDiagram'], drawn,
+                             generation = generation)
+        with self._lock:
+            current = generation == self._generation
+            if current:
+                os.replace(path, self.outputPath)
+        if not current:
+            tracing.asyncEnd('DiagramRenderer.render', generation, result = 'stale')
+            os.remove(path)
+            return
+        tracing.asyncEnd('DiagramRenderer.render', generation, result = 'written')
+        self.finished.emit(self.outputPath)
+
+    def wait(self):
+        # blocks until the latest render is done or cancelled
+        pending = self._pending
+        if pending is not None:
+            futures.wait([pending])
+
+    def shutdown(self, wait: bool = False):
+        # wait for a running render, e.g. before the renderer is deleted
+        if self._executor is not None:
+            self._executor.shutdown(wait = wait, cancel_futures = True)
+            self._executor = None
+
+
+class HeatmapWorker(QtCore.QObject):
+    # computes a heatmap in a thread, e.g. from a recording or a repertoire;
+    # the growing heatmap and a status text are sent to the GUI thread at
+    # most every heatUpdateInterval seconds
+    progress = QtCore.pyqtSignal(object, str)
+    finished = QtCore.pyqtSignal(object, str)
+    failed = QtCore.pyqtSignal(str)
+    # from the thread, with the generation of its job
+    _step = QtCore.pyqtSignal(int, object, str, bool)
+    _failed = QtCore.pyqtSignal(int, str)
+
+    def __init__(self):
+        super().__init__()
+        self._cancel: threading.Event = threading.Event()
+        self._generation: int = 0
+        self._step.connect(self._deliverStep)
+        self._failed.connect(self._deliverFailed)
+
+    def start(self, job: Callable[[], Iterator[Tuple[np.ndarray, str]]]):
+        # job is called in the thread and yields (heatmap, status) steps
+        self.cancel()
+        self._cancel = threading.Event()
+        threading.Thread(target = self._run, args = (job, self._cancel, self._generation), daemon = True).start()
+
+    def cancel(self):
+        # steps of the job still queued are dropped as well
+        self._cancel.set()
+        self._generation += 1
+
+    def _deliverStep(self, generation: int, heat: np.ndarray, status: str, final: bool):
+        if generation == self._generation:
+            (self.finished if final else self.progress).emit(heat, status)
+
+    def _deliverFailed(self, generation: int, message: str):
+        if generation == self._generation:
+            self.failed.emit(message)
+
+    def _run(self, job: Callable[[], Iterator[Tuple[np.ndarray, str]]], cancel: threading.Event, generation: int):
+        steps = job()
+        heat = status = None
+        try:
+            lastUpdate = time.perf_counter()
+            for heat, status in steps:
+                if cancel.is_set():
+                    return
+                if time.perf_counter() - lastUpdate >= heatUpdateInterval:
+                    lastUpdate = time.perf_counter()
+                    self._step.emit(generation, heat.copy(), f"{status}...", False)
+        except (OSError, EOFError, ValueError, wave.Error) as e:
+            self._failed.emit(generation, str(e))
+            return
+        except Exception as e:
+            # anything else would end the thread silently
+            self._failed.emit(generation, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            # e.g. stops the worker processes of a repertoire
+            steps.close()
+        if heat is not None and not cancel.is_set():
+            self._step.emit(generation, heat.copy(), status, True)
+
+
+class VoicingWorker(QtCore.QObject):
+    # enumerates the voicings of a chord in a thread, only the ones of the
+    # latest request reach the GUI thread
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    _found = QtCore.pyqtSignal(int, object)
+    _failed = QtCore.pyqtSignal(int, str)
+
+    def __init__(self):
+        super().__init__()
+        self._generation: int = 0
+        self._found.connect(self._deliver)
+        self._failed.connect(self._deliverFailed)
+
+    def start(self, model: FretBoardModel, rootNote: int, chordType: str, constraints: VoicingConstraints):
+        self._generation += 1
+        threading.Thread(target = self._run, args = (copy.deepcopy(model), rootNote, chordType, constraints,
+                                                     self._generation), daemon = True).start()
+
+    def _deliver(self, generation: int, voicings: np.ndarray):
+        if generation == self._generation:
+            self.finished.emit(voicings)
+
+    def _deliverFailed(self, generation: int, message: str):
+        if generation == self._generation:
+            self.failed.emit(message)
+
+    def _run(self, model: FretBoardModel, rootNote: int, chordType: str, constraints: VoicingConstraints,
+             generation: int):
+        try:
+            voicings = chordVoicings(model, rootNote, chordType, constraints)
+        except Exception as e:
+            # any exception would end the thread silently
+            self._failed.emit(generation, f"{type(e).__name__}: {e}")
+            return
+        self._found.emit(generation, voicings)
 
-    def getParentLayout(self):
-        return self.__parentLayout
-    
 
 class Fret():
-    def __init__(self, fretIndex: int, noteName: str):
+    # a position on the neck; the state lives in the model, the NeckWidget
+    # displays it, Fret posts the clicks on it to the event bus
+    def __init__(self, model: FretBoardModel, bus: EventBus, stringIndex: int, fretIndex: int):
 
-        self.subscribers: List[String] = []
-        self.noteName: str = noteName
+        self.bus: EventBus = bus
+        self.model: FretBoardModel = model
+        self.stringIndex: int = stringIndex
         self.fretIndex: int = fretIndex
-        #self.parentString: String = parentString
-        self.button = FretButton(self.noteName)
-        self._individualMarked: bool = self.button.individualMarked
-        self.button.setFixedWidth(buttonWidth)
-        self.button.setCheckable(True)
-        #self.button.setStyleSheet("QPushButton:checked { background-color: red;border:5px solid rgb(255, 170, 255); }")
-        self.button.setStyleSheet("QPushButton[individualMarked=true] { border: 2px solid #000000;} QPushButton:checked { background-color: #adaddf;} QPushButton { border-radius: 10px; }")
-        self.button.setFocusPolicy(QtCore.Qt.NoFocus)
-        #self.button.clicked[bool].connect(self.notifyNoteToggle)
-        #self.button.clicked[bool].connect(self.notifyNoteToggle)
-        self.button.clicked[bool].connect(self.notifyNoteToggle)
-        self.button.rightClicked[bool].connect(self.toggleIndividualMarked)
-        self.button.middleClicked[bool].connect(self.addScale)
-        self.fretStyle: FretStyle = FretStyle()
 
     @property
-    def individualMarked(self):
-        return self.button.individualMarked
+    def note(self) -> int:
+        return int(self.model.notes[self.stringIndex, self.fretIndex])
 
-    def subscribe(self, subscriber):
-        self.subscribers.append(subscriber)
+    @property
+    def noteName(self) -> str:
+        return basicNotes[self.note]
 
-    def toggleIndividualMarked(self, individualMarked: bool):
-        self.button.toggleIndividualMarked()
- 
-    def notifyNoteToggle(self, checked: bool):
-         
-        for subscriber in self.subscribers:
-            # notify String
-            subscriber.notifyNoteToggle(self.noteName, checked)
+    @property
+    def individualMarked(self) -> bool:
+        return bool(self.model.individualMarked[self.stringIndex, self.fretIndex])
 
+    @traced
+    def toggleIndividualMarked(self):
+        self.bus.post('toggleIndividual', (self.stringIndex, self.fretIndex), True, toggled)
+
+    @traced
+    def toggleNoteGlobal(self):
+        # the note is looked up when the change is applied, after the retunes
+        self.bus.post('toggleGlobal', (self.stringIndex, self.fretIndex), True, toggled)
+
+    @traced
     def addScale(self, individualMarked: bool):
-        for subscriber in self.subscribers:
-            # notify String
-            subscriber.addScale(self.fretIndex, self.noteName, individualMarked)
-
-    def drawFretNumber(self, d: dsvg.Drawing, x: float, y: float) -> float:
-        fs = self.fretStyle
-
-        textY = y - fs.fontSize / 4.0
-        d.append(dsvg.Text(str(self.fretIndex), 
-                fs.fontSize, x + fs.circleX, textY, 
-                fill = fs.circleStrokeColor, 
-                center = False, text_anchor = 'middle'))
-        return fs.fretWidth
-
-    def drawFret(self, d: dsvg.Drawing, x: float, y: float, strings: int) -> float:
-        fs = self.fretStyle
-        fretBoardHeight = (strings - 1) * fs.fretHeight
-        d.append(dsvg.Line(x, y,
-                           x, y - fretBoardHeight,
-                           stroke_width = stringWidth,
-                           stroke = stringColor))
-        return fs.fretWidth
-
-    def drawNote(self, d: dsvg.Drawing, x: float, y: float) -> float:
-        fs = self.fretStyle
-        if self.individualMarked:
-            textY = y - fs.fontSize / 4.0
-            d.append(dsvg.Circle(x + fs.circleX, y, fs.radius,
-                        fill = fs.circleFillColor, stroke_width=2, stroke = fs.circleStrokeColor))
-            
-            d.append(dsvg.Text(self.noteName, 
-                fs.fontSize, x + fs.circleX, textY, 
-                fill = fs.circleStrokeColor, 
-                center = False, text_anchor = 'middle'))
-        return fs.fretWidth
+        self.bus.post('addScale', (self.stringIndex, self.fretIndex), individualMarked)
 
 
 class String():
-    def __init__(self, index: int, noteName: str, numberFrets: int):
-       self.subscribers: FretBoard = []
+    def __init__(self, model: FretBoardModel, bus: EventBus, index: int):
+       self.bus: EventBus = bus
+       self.model: FretBoardModel = model
        self.stringIndex: int = index
-       self.noteName: str = noteName
        self.noteSelector = self.newNoteSelector()
        self.frets: List[Fret] = []
-       self.addFrets(numberFrets + 1)
-       self.numberFrets: int = numberFrets
-
-    def drawFrets(self, d: dsvg.Drawing, lowerFret: int, upperFret: int, 
-                         x: float, y: float, strings: int):
-        for fret in self.frets[lowerFret: upperFret + 1]:
-            x += fret.drawFret(d, x, y, strings)
-        x += fret.drawFret(d, x, y, strings)
-
-    def drawString(self, d: dsvg.Drawing, lowerFret: int, upperFret: int, 
-                         x: float, y: float) -> float:
-        fs = self.frets[0].fretStyle
-        fretWidth = fs.fretWidth
-        stringLength = (upperFret - lowerFret + 1) * fretWidth
-        d.append(dsvg.Line(x, y,
-                       x + stringLength, y,
-                       stroke_width = stringWidth * pow(1.1, self.stringIndex),
-                       stroke = stringColor))
-        return fs.fretHeight
-
-    def drawCurrentMarked(self, d: dsvg.Drawing, lowerFret: int, upperFret: int, 
-                                x: float, y: float) -> float: 
-        for fret in self.frets[lowerFret:upperFret+1]:
-            x += fret.drawNote(d, x, y)
-        return self.frets[0].fretStyle.fretHeight
+       self.addFrets(self.numberFrets + 1)
 
-    def findNextNote(self, fretIndex: int, noteName: str) -> Fret:
-        delta = 24
-        for currentFretIndex, currentFret in enumerate(self.frets):
-            if currentFret.noteName == noteName:
-                currentDelta = abs(currentFretIndex - fretIndex)
-                if currentDelta <= delta:
-                    delta = currentDelta
-                    fret = currentFret
-        return fret
+    @property
+    def numberFrets(self) -> int:
+        return self.model.numberFrets
 
-    def getMarkedRange(self) -> (int, int):
-        lowerFret = 24
-        upperFret = 0
-        for i, fret in enumerate(self.frets):
-            if fret.individualMarked:
-                lowerFret = min(i, lowerFret)
-                upperFret = max(i, upperFret)
-        return lowerFret, upperFret
+    @property
+    def noteName(self) -> str:
+        return basicNotes[self.model.baseNotes[self.stringIndex]]
 
-    def subscribe(self, subscriber):
-        # subscribe String
-        self.subscribers.append(subscriber)
+    def findNextNote(self, fretIndex: int, noteName: str) -> Fret:
+        nextFretIndex = self.model.nearestFrets[self.stringIndex, fretIndex, noteIndex(noteName)]
+        return self.frets[nextFretIndex] if nextFretIndex >= 0 else None
 
-    def displayString(self, hbox1: QHBoxLayout):
-        for i, fret in enumerate(self.frets):
-            hbox1.addWidget(fret.button)
-            fret.button.setParentLayout(hbox1)
-            vLine = newVLine(i)
-            hbox1.addWidget(vLine)
-            #vLine.setLayout(hbox1)
+    def getMarkedRange(self) -> (int, int):
+        marked = np.nonzero(self.model.individualMarked[self.stringIndex])[0]
+        if len(marked) == 0:
+            return self.numberFrets, 0
+        return int(marked[0]), int(marked[-1])
 
     def newNoteSelector(self):
         comboBox = QComboBox()
@@ -227,284 +292,421 @@ class String():
         index = comboBox.findText(self.noteName, QtCore.Qt.MatchFixedString)
         comboBox.setCurrentIndex(index)
         comboBox.setFixedWidth(col0Width)
+        comboBox.setFixedHeight(cellHeight)
         comboBox.currentIndexChanged.connect(self.changeBaseNoteByIndex)
         return comboBox
 
        
     def addFrets(self, numberFrets: int):
-        startNote = dropwhile(lambda x: x != self.noteName, notesCycle)
-        notesInString = islice(startNote, None, numberFrets)
-        for fretIndex, note in enumerate(notesInString):
-            fret: Fret = Fret(fretIndex, note)
-            for subscriber in self.subscribers:
-                if fret.noteName in subscriber.markedNotesGlobal:
-                    fret.button.setChecked(True)
-            fret.subscribe(self)
+        for fretIndex in range(numberFrets):
+            fret: Fret = Fret(self.model, self.bus, self.stringIndex, fretIndex)
             self.frets.append(fret)
 
     def changeBaseNote(self, noteName: str):
         index = self.noteSelector.findText(noteName, QtCore.Qt.MatchFixedString)
         self.noteSelector.setCurrentIndex(index)
 
-    def changeBaseNoteByIndex(self, i: int):
-        self.noteName = basicNotes[i]
-        self.redisplayString(self.stringIndex)
-
-    def redisplayString(self, stringIndex: int):
-        startNote = dropwhile(lambda x: x != self.noteName, notesCycle)
-        notesInString = islice(startNote, None, self.numberFrets + 1)
-        for noteName, fret in zip(notesInString, self.frets):
-            fret.button.setText(noteName)
-            fret.noteName = noteName
-            for subscriber in self.subscribers:
-                fret.button.setChecked(fret.noteName in subscriber.markedNotesGlobal)
-
-        for subscriber in self.subscribers:
-            if fret.noteName in subscriber.markedNotesGlobal:
-                fret.button.setChecked(True)
-
-    def recreateString(self, stringIndex: int):
-        layout = self.frets[0].button.getParentLayout()
-        for i in reversed(range(1, layout.count())): 
-            layout.itemAt(i).widget().setParent(None)
-        self.frets.clear()
-        self.addFrets(self.numberFrets + 1)
-        self.displayString(layout)
-
-    def notifyNoteToggle(self, noteName: str, checked: bool):
-        for subscriber in self.subscribers:
-            # notify FretBoard
-            subscriber.toggleNoteGlobal(noteName, checked)
+    def showBaseNote(self):
+        # follow a retune of the model without posting it again
+        note = int(self.model.baseNotes[self.stringIndex])
+        if self.noteSelector.currentIndex() != note:
+            self.noteSelector.blockSignals(True)
+            self.noteSelector.setCurrentIndex(note)
+            self.noteSelector.blockSignals(False)
 
-    def addScale(self, fretIndex: int, noteName: str, individualMarked: bool):
-        for subscriber in self.subscribers:
-            # notify FretBoard
-            subscriber.addScale(self.stringIndex, fretIndex, noteName, individualMarked)
+    @traced
+    def changeBaseNoteByIndex(self, i: int):
+        # the combo box indexes coincide with the pitch classes
+        self.bus.post('retune', self.stringIndex, i)
 
 
 class FretBoard():
-    def __init__(self, tuning: List[str], numberFrets: int):
-        self.tuning: List[str] = tuning
+    def __init__(self, instrument: Instrument):
+        self.instrument: Instrument = instrument
+        self.model: FretBoardModel = instrument.newModel()
         self.strings: List[String] = []
-        self.numberFrets: int = numberFrets
-        self.markedNotesGlobal: Set[str] = set()
+        self.numberFrets: int = instrument.numberFrets
         self.subscribers: List[QHBoxLayout] = []
-
-        for i, noteName in enumerate(reversed(tuning)):
-            string: String = String(i, noteName, numberFrets)
-            string.subscribe(self)
+        self.fretStyle: FretStyle = FretStyle()
+        self.renderer: DiagramRenderer = DiagramRenderer('example.png', defaultCacheDir('diagrams'))
+        self.tuningLibrary: TuningLibrary = TuningLibrary(instrument.tuning, instrument.numberFrets)
+        # the clicks and retunes of the views are applied once per event loop pass
+        self.bus: EventBus = EventBus()
+        self.bus.subscribe(self.applyChanges)
+
+        for i in range(self.model.numberStrings):
+            string: String = String(self.model, self.bus, i)
             self.strings.append(string)
 
-    def drawFretBoard(self, d: dsvg.Drawing, lowerFret:int, upperFret: int, x: float, y: float):
-        x_cur = x
-        y_cur = y
-        for string in self.strings:
-            y_cur -= string.drawString(d, lowerFret, upperFret, x_cur, y_cur)
-        self.strings[0].drawFrets(d, lowerFret, upperFret, x_cur, y, len(self.strings))
-
-    def drawCurrentMarked(self, d: dsvg.Drawing, lowerFret:int, upperFret: int, x: float, y: float) -> float:
-        y_cur = y
-        for string in self.strings:
-            x_cur = x
-            fretHeight = string.drawCurrentMarked(d, lowerFret, upperFret, x_cur, y_cur)
-            y_cur -= fretHeight
-        return len(self.strings) * fretHeight
-
-    def drawFretNumbers(self, d: dsvg.Drawing, lowerFret: int, upperFret: int, 
-                         x: float, y: float) -> float:
-        x_cur = x
-        string = self.strings[0]
-        for fret in string.frets[lowerFret: upperFret + 1]:
-            x_cur += fret.drawFretNumber(d, x_cur, y)
-        return string.frets[0].fretStyle.fretHeight
-
-    def drawHeading(self, d: dsvg.Drawing, baseNote: str, x: float, y: float) -> float :
-        scaleName = self.subscribers[0].comboBoxScales.currentText()
-        modeName = self.subscribers[0].comboBoxModes.currentText()
-        heading = f"{baseNote} {scaleName}, Mode {modeName}"
-        d.append(dsvg.Text(heading, 
-                headingFontSize, x, y, 
-                fill = headingColor, 
-                center = False, text_anchor = 'left'))
-        return headingFontSize
-
-    def drawDiagram(self, baseNote: str) -> dsvg.Drawing:
-        width = 600
-        height = 600
-        d = dsvg.Drawing(width, height, origin = (0, 0))
-          
-        x = 30
-        y = 550
-        y -= self.drawHeading(d, baseNote, x, y) + 6
-        lowerFret, upperFret = self.getMarkedRange()
-        y -= self.drawFretNumbers(d, lowerFret, upperFret, x, y)
-        self.drawFretBoard(d, lowerFret, upperFret, x, y)
-        y -= self.drawCurrentMarked(d, lowerFret, upperFret, x, y)
-        y -= self.drawFretNumbers(d, lowerFret, upperFret, x, y)
-        return d
+        # see batchUpdate
+        self._batchDepth: int = 0
+        self._batchPositions: List[Positions] = []
+        self.batchDurations: Dict[str, float] = {}
+        # the state after the last batch and the ones before, see recordState
+        self.state: Snapshot = snapshot(self.model)
+        self.history: History = History()
+        self._restoring: bool = False
+        # the notes are synthesized by the player's thread when first played
+        # and kept for the next previews; playScales plays every placed scale
+        self.audioBank: SampleBank = SampleBank()
+        self.player: Player = Player(self.audioBank)
+        self.playScales: bool = False
+        self.heatWorker: HeatmapWorker = HeatmapWorker()
+        self.heatWorker.progress.connect(lambda heat, status: self.showHeat(heat))
+        self.heatWorker.finished.connect(self.heatFinished)
+
+        self.neck: NeckWidget = NeckWidget(self.model)
+        self.neck.leftClicked.connect(self.leftClicked)
+        self.neck.rightClicked.connect(self.rightClicked)
+        self.neck.middleClicked.connect(self.middleClicked)
+
+    @property
+    def tuning(self) -> List[str]:
+        return self.model.tuning
+
+    @property
+    def markedNotesGlobal(self) -> Set[str]:
+        return {noteName for note, noteName in enumerate(basicNotes) if self.model.isMarkedGlobal(note)}
+
+    def redisplayPositions(self, positions: Positions):
+        # only the positions the model reports as changed are repainted
+        if self._batchDepth > 0:
+            self._batchPositions.append(positions)
+        else:
+            self.neck.refreshPositions(positions)
+
+    @contextmanager
+    def batchUpdate(self, name: str):
+        # collects the changes of all operations in the block and repaints
+        # them once at its end; the duration of the whole block including
+        # the repaint is kept in batchDurations[name], nested blocks join
+        # the outermost one
+        self._batchDepth += 1
+        if self._batchDepth == 1:
+            # the neck is not asked to repaint anything until the end of the
+            # block (QWidget.setUpdatesEnabled would repaint all of it instead)
+            start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._batchDepth -= 1
+            if self._batchDepth == 0:
+                positions = concatPositions(self._batchPositions)
+                self._batchPositions = []
+                self.neck.refreshPositions(positions, immediate = self.neck.isVisible())
+                self.batchDurations[name] = time.perf_counter() - start
+                self.recordState()
+
+    def recordState(self):
+        # every batch that changes the state is an undo step, except the
+        # ones restoring a state
+        if self._restoring:
+            return
+        state = snapshot(self.model, self.state)
+        if state != self.state:
+            self.history.record(self.state)
+            self.state = state
+
+    @traced
+    def leftClicked(self, stringIndex: int, fretIndex: int):
+        # a left click toggles the global mark of the note like a checkable button
+        self.strings[stringIndex].frets[fretIndex].toggleNoteGlobal()
+
+    @traced
+    def rightClicked(self, stringIndex: int, fretIndex: int):
+        self.strings[stringIndex].frets[fretIndex].toggleIndividualMarked()
+
+    @traced
+    def middleClicked(self, stringIndex: int, fretIndex: int):
+        fret = self.strings[stringIndex].frets[fretIndex]
+        fret.addScale(fret.individualMarked)
+
+    def diagramHeading(self, baseNote: str) -> str:
+        scaleName, mode = self.subscribers[0].currentScale()
+        return f"{baseNote} {scaleName}, Mode {mode + 1}"
+
+    def drawDiagram(self, baseNote: str) -> DiagramBackend:
+        return Diagram(self.model, self.fretStyle).drawDiagram(self.diagramHeading(baseNote))
 
     def subscribe(self, subscriber):
         self.subscribers.append(subscriber)
 
+    @traced
+    def applyChanges(self, changes: ChangeSet):
+        # the change set of the event bus, applied in one batch; retunes come
+        # first, so the positions of the other changes refer to the new notes
+        globalChanged = False
+        retunes = changes.get('retune', {})
+        with self.batchUpdate('applyChanges'):
+            for stringIndex, note in retunes.items():
+                fretIndexes = self.model.setBaseNote(stringIndex, note)
+                self.redisplayPositions((np.full(len(fretIndexes), stringIndex), fretIndexes))
+            for (stringIndex, fretIndex), toggle in changes.get('toggleGlobal', {}).items():
+                if toggle:
+                    note = int(self.model.notes[stringIndex, fretIndex])
+                    self.redisplayPositions(self.model.setGlobal(note, not self.model.isMarkedGlobal(note)))
+                    globalChanged = True
+            for (stringIndex, fretIndex), toggle in changes.get('toggleIndividual', {}).items():
+                if toggle:
+                    self.setIndividualMarked(stringIndex, fretIndex,
+                                             not self.model.individualMarked[stringIndex, fretIndex])
+            for (stringIndex, fretIndex), individualMarked in changes.get('addScale', {}).items():
+                self.addScale(stringIndex, fretIndex, self.model.noteName(stringIndex, fretIndex), individualMarked)
+        if globalChanged:
+            self.notifyMarkedGlobal()
+        if retunes:
+            self.notifyTuning()
+
+    @traced
     def toggleNoteGlobal(self, noteName: str, checked: bool):
-        if checked:
-            self.markedNotesGlobal.add(noteName)
-        else:
-            self.markedNotesGlobal.remove(noteName)
+        with self.batchUpdate('toggleNoteGlobal'):
+            self.redisplayPositions(self.model.setGlobal(noteIndex(noteName), checked))
+        self.notifyMarkedGlobal()
+
+    def notifyMarkedGlobal(self):
+        for subscriber in self.subscribers:
+            # notify MainWindow
+            subscriber.notifyMarkedGlobal(self.model.markedGlobal)
+
+    def notifyTuning(self):
+        preset = self.tuningLibrary.find(self.model.baseNotes)
+        for subscriber in self.subscribers:
+            # notify MainWindow
+            subscriber.notifyTuning(preset)
 
-        for string in self.strings:
-            for fret in string.frets:
-                if fret.button.text() == noteName:
-                    fret.button.setChecked(checked)  
+    @traced
+    def setIndividualMarked(self, stringIndex: int, fretIndex: int, individualMarked: bool):
+        with self.batchUpdate('setIndividualMarked'):
+            if self.model.setIndividual(stringIndex, fretIndex, individualMarked):
+                self.redisplayPositions(([stringIndex], [fretIndex]))
 
+    @traced
     def addScale(self, stringIndex: int, fretIndex: int, noteName: str, individualMarked: bool):
-
-        startNote = dropwhile(lambda x: x != noteName, notesCycle)
-        notesInString = cycle(startNote)
-
-        scaleName = self.subscribers[0].comboBoxScales.currentText()
-        # scaleIntervals has as many notes as there are in the scale
-        scaleIntervals = [intervalsDict[interval] for interval in scalesGlobal[scaleName]]
-        intervals = len(scaleIntervals)
-        # scaleIntervals_extended has one more note, i.e. the root note duplicated
-        scaleIntervals_extended = list(islice(cycle(scaleIntervals), 0, len(scaleIntervals) + 1))
-        scaleIntervals_extended[intervals] += 12
-
-        # calculate the halfstep deltas between adjacent notes
-        # this is the relative (inner) structure of the scale which can be shifted
-        # to get the individual modes
-        halfstepDeltas: List[int] = []
-        for i, interval in enumerate(scaleIntervals_extended[1:]):
-            halfstepDeltas.append(interval - scaleIntervals[i])
-
-
-        # shift the deltas to the selected mode
-        mode = self.subscribers[0].comboBoxModes.currentIndex()
-        modeDeltas = islice(cycle(halfstepDeltas), mode, mode + intervals)
-
-        # construct the notes in the mode
-        note = next(notesInString)
-        notesInMode: List = [note]
-        for delta in modeDeltas:
-            for j in range(delta):
-                note = next(notesInString)
-            notesInMode.append(note)
-
-        # now mark the mode in a three notes per string fashion
-        notesInModeCycle = cycle(notesInMode[:intervals])
-        for string in self.strings[stringIndex::-1]:
-            for i in range(3):
-                currentNoteName = next(notesInModeCycle)
-                currentFret = string.findNextNote(fretIndex, currentNoteName)
-                currentFret.button.setIndividualMarked(True)
-
-        notesInModeCycle = cycle(notesInMode[:intervals])
-        for i in range(8 - mode):
-            baseNote = next(notesInModeCycle)
-        d = self.drawDiagram(baseNote)
-        d.setPixelScale(1)
-        d.savePng('example.png')
+        scaleName, mode = self.subscribers[0].currentScale()
+        rootNote = noteIndex(noteName)
+
+        # now mark the mode in a three notes per string fashion or the chosen fingering
+        notesInMode = modeNotes(rootNote, scaleName, mode)
+        fingering = self.subscribers[0].comboBoxFingerings.currentText()
+        with self.batchUpdate('addScale'):
+            if fingering == 'nearest':
+                self.redisplayPositions(self.model.placeScale(stringIndex, fretIndex, notesInMode, 3))
+            else:
+                self.redisplayPositions(placeFingering(self.model, stringIndex, fretIndex, notesInMode,
+                                                       fingeringPresets[fingering]))
+
+        baseNote = basicNotes[parentRoot(rootNote, scaleName, mode)]
+        self.renderer.render(self.model, self.diagramHeading(baseNote), self.fretStyle)
+        if self.playScales:
+            self.playMarked()
+
+    @traced
+    def showVoicing(self, voicing: np.ndarray, heading: str):
+        # a chord voicing replaces the individual marks
+        with self.batchUpdate('showVoicing'):
+            self.redisplayPositions(self.model.clearIndividual())
+            self.redisplayPositions(self.model.setIndividualPositions(voicingPositions(voicing), True))
+        self.renderer.render(self.model, heading, self.fretStyle)
 
     def getMarkedRange(self) -> (int, int):
-        lowerFret = 24
-        upperFret = 0
-        for string in self.strings:
-            lowerFretCurrent, upperFretCurrent = string.getMarkedRange()
-            lowerFret = min(lowerFretCurrent, lowerFret)
-            upperFret = max(upperFretCurrent, upperFret)
-        return lowerFret, upperFret
-            
+        return self.model.getMarkedRange()
 
+    @traced
     def clearAllGlobal(self):
-        for string in self.strings:
-            for fret in string.frets:
-                fret.button.setChecked(False)  
-        self.markedNotesGlobal.clear()
+        with self.batchUpdate('clearAllGlobal'):
+            self.redisplayPositions(self.model.clearGlobal())
+        self.notifyMarkedGlobal()
 
+    @traced
     def clearAllIndividual(self):
-        for string in self.strings:
-            for fret in string.frets:
-                fret.button.setIndividualMarked(False)  
-        #self.markedNotesGlobal.clear()
-
-
+        with self.batchUpdate('clearAllIndividual'):
+            self.redisplayPositions(self.model.clearIndividual())
+
+    def layout(self, tuning: List[str]) -> (np.ndarray, np.ndarray):
+        # a preset's layout is precomputed, other tunings are computed here
+        if len(tuning) != self.model.numberStrings:
+            raise ValueError(f"a tuning of {len(tuning)} strings for {self.model.numberStrings} strings")
+        baseNotes = np.array([noteIndex(noteName) for noteName in reversed(tuning)], dtype=np.int16)
+        preset = self.tuningLibrary.find(baseNotes)
+        if preset is not None:
+            return self.tuningLibrary.layout(preset)
+        return baseNotes, (baseNotes[:, np.newaxis] + np.arange(self.numberFrets + 1)) % 12
+
+    @traced
     def setTuning(self, tuning: List[str]):
-        self.tuning = tuning
-        for string, noteName in zip(reversed(self.strings), self.tuning):
-            string.changeBaseNote(noteName)
+        self.applyLayout(*self.layout(tuning))
+
+    @traced
+    def setTuningPreset(self, i: int):
+        self.applyLayout(*self.tuningLibrary.layout(i))
+
+    def cycleTuningPreset(self, step: int = 1):
+        # from a custom tuning to the first preset
+        current = self.tuningLibrary.find(self.model.baseNotes)
+        self.setTuningPreset(0 if current is None else (current + step) % len(self.tuningLibrary))
+
+    def applyLayout(self, baseNotes: np.ndarray, notes: np.ndarray):
+        # only the cells whose note changes are repainted and only the
+        # selectors of retuned strings are touched; pending retunes of the
+        # selectors are applied first, so they do not undo the new tuning
+        self.bus.flush()
+        retuned = np.nonzero(baseNotes != self.model.baseNotes)[0]
+        with self.batchUpdate('setTuning'):
+            self.redisplayPositions(self.model.setLayout(baseNotes, notes))
+        for stringIndex in retuned:
+            self.strings[stringIndex].showBaseNote()
+        self.notifyTuning()
 
     def resetTuning(self):
-        self.setTuning(standardTuning)
+        self.setTuning(self.instrument.tuning)
+
+    @traced
+    def applySnapshot(self, state: Snapshot):
+        # applied to the neck as it is, only the cells that differ are repainted
+        if len(state.tuning) != self.model.numberStrings:
+            raise ValueError(f"a state of {len(state.tuning)} strings for {self.model.numberStrings} strings")
+        self.bus.flush()
+        baseNotes, notes = self.layout(list(state.tuning))
+        retuned = np.nonzero(baseNotes != self.model.baseNotes)[0]
+        self._restoring = True
+        try:
+            with self.batchUpdate('applySnapshot'):
+                self.redisplayPositions(self.model.setLayout(baseNotes, notes))
+                self.redisplayPositions(self.model.setMarkedGlobal(state.markedGlobal))
+                self.redisplayPositions(self.model.setIndividualBitsets(list(state.individual)))
+        finally:
+            self._restoring = False
+        self.state = state
+        for stringIndex in retuned:
+            self.strings[stringIndex].showBaseNote()
+        self.notifyTuning()
+        self.notifyMarkedGlobal()
+
+    def pitches(self) -> np.ndarray:
+        return pitchMatrix(self.model, self.instrument.lowestPitch)
+
+    def playMarked(self):
+        # the individual marks from the lowest string up, without waiting for the sound
+        self.bus.flush()
+        self.player.play(markedPitches(self.model, self.instrument.lowestPitch))
+
+    def saveAudio(self, path: str):
+        self.bus.flush()
+        writeWav(path, self.audioBank.render(markedPitches(self.model, self.instrument.lowestPitch)),
+                 self.audioBank.rate)
+
+    @traced
+    def showHeat(self, heat: np.ndarray):
+        # only the cells whose heat level changes are repainted
+        with self.batchUpdate('showHeat'):
+            self.redisplayPositions(self.model.setHeat(heat))
+
+    def heatFinished(self, heat: np.ndarray, status: str):
+        # the diagram shows the heatmap with the marked notes
+        self.showHeat(heat)
+        self.renderer.render(self.model, status, self.fretStyle)
+
+    def clearHeat(self):
+        self.heatWorker.cancel()
+        with self.batchUpdate('showHeat'):
+            self.redisplayPositions(self.model.clearHeat())
+
+    def analyzeRecording(self, path: str):
+        # the heatmap of the notes played in a WAV file in the current tuning
+        self.clearHeat()
+        model = copy.deepcopy(self.model)
+        lowestPitch = self.instrument.lowestPitch
+        def job():
+            for heatmap in analyze(path, model, lowestPitch):
+                yield heatmap.seconds, f"{heatmap.recorded:.0f} s of {os.path.basename(path)}"
+        self.heatWorker.start(job)
+
+    def loadRepertoire(self, paths: List[str]):
+        # the heatmap of the positions used by tabs and MusicXML files
+        self.clearHeat()
+        pitches = self.pitches()
+        def job():
+            for repertoire in countRepertoire(paths, pitches):
+                failed = f", {len(repertoire.failed)} failed" if repertoire.failed else ""
+                yield repertoire.counts, f"{repertoire.notes} notes in {repertoire.files} files{failed}"
+        self.heatWorker.start(job)
+
+    def undo(self):
+        self.bus.flush()
+        state = self.history.undo(self.state)
+        if state is not None:
+            self.applySnapshot(state)
+
+    def redo(self):
+        self.bus.flush()
+        state = self.history.redo(self.state)
+        if state is not None:
+            self.applySnapshot(state)
+
+    def saveSession(self, path: str):
+        self.bus.flush()
+        session.save(path, self.state, self.numberFrets)
+
+    def loadSession(self, path: str):
+        # raises OSError or ValueError; loading can be undone
+        state = session.load(path, self.numberFrets)
+        if len(state.tuning) != self.model.numberStrings:
+            raise ValueError(f"the session is for {len(state.tuning)} strings")
+        self.bus.flush()
+        previous = self.state
+        self.applySnapshot(state)
+        if self.state != previous:
+            self.history.record(previous)
         
 
-def newVLine(i: int):
-    frameColor = QColor("#ff00ff")
-    line = QFrame()
-    #line.setFrameStyle(QFrame.VLine | QFrame.Plain)
-    line.setFrameShape(QFrame.VLine)
-    line.setLineWidth(3)
-    line.setMidLineWidth(8)
-    if i == 0:
-       line.setMinimumSize(8,8)
-    else:
-       line.setMinimumSize(3,3)
-    line.setStyleSheet("QWidget { background-color: %s; } " % frameColor.name())
-    return line
-
-def newFretLabel(i: int):
-    number = str(i) if i > 0 else " "
-    label1 = QLabel(number)
-    label1.setFixedWidth(buttonWidth)
-    label1.setAlignment(Qt.Qt.AlignCenter)
-    label1.setStyleSheet("background-color: #ffffff;")
-    return label1 
-
 class MainWindow(QWidget):
-    
-    def __init__(self):
+    # emitted by the playback thread
+    audioFailed = QtCore.pyqtSignal(str)
+
+    def __init__(self, instrument: Instrument = None):
         super().__init__()
-        self.stringsLayout = QVBoxLayout()
+        self.instrument: Instrument = instrument if instrument is not None else defaultInstrument
         self.initUI()
 
     def createFretboard(self, vbox1):
-        numberFrets = 24
-        self.fretBoard = FretBoard(standardTuning, numberFrets)
+        self.fretBoard = FretBoard(self.instrument)
         self.fretBoard.subscribe(self)
-    
-
-        fretLabelsTop = QHBoxLayout()
-        fretLabelsBottom = QHBoxLayout()
-
-        col0Top = QLabel("")
-        col0Top.setFixedWidth(col0Width)
-        fretLabelsTop.addWidget(col0Top)
-        col0Bottom = QLabel("")
-        col0Bottom.setFixedWidth(col0Width)
-        fretLabelsBottom.addWidget(col0Bottom)
-
-        #it = fretLabelsTop.itemAt(0)
-        for i in range(numberFrets + 1):
-            fretLabelsTop.addWidget(newFretLabel(i))
-            fretLabelsTop.addWidget(newVLine(i))
 
-            fretLabelsBottom.addWidget(newFretLabel(i))
-            fretLabelsBottom.addWidget(newVLine(i))
-
-        vbox1.addLayout(fretLabelsTop)
+        # the note selectors are aligned with the rows painted by the neck widget
+        noteSelectors = QVBoxLayout()
+        noteSelectors.setSpacing(0)
+        noteSelectors.addSpacing(labelHeight)
         for string in self.fretBoard.strings:
-            hbox1 = QHBoxLayout()
-
-            hbox1.addWidget(string.noteSelector)
-            
-            string.displayString(hbox1)
-
-            self.stringsLayout.addLayout(hbox1)
-        vbox1.addLayout(self.stringsLayout)
-        vbox1.addLayout(fretLabelsBottom)
+            noteSelectors.addWidget(string.noteSelector)
+        noteSelectors.addSpacing(labelHeight)
+
+        # long necks scroll horizontally, the note selectors stay in place
+        neckArea = QScrollArea()
+        neckArea.setWidget(self.fretBoard.neck)
+        neckArea.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        neckArea.setFrameShape(QScrollArea.NoFrame)
+        neckArea.setFixedHeight(self.fretBoard.neck.height() + neckArea.horizontalScrollBar().sizeHint().height())
+        neckArea.setMinimumWidth(min(self.fretBoard.neck.width(), maxNeckWidth))
+        neckArea.setMaximumWidth(self.fretBoard.neck.width())
+        self.neckArea = neckArea
+
+        hboxNeck = QHBoxLayout()
+        hboxNeck.addLayout(noteSelectors)
+        hboxNeck.addWidget(neckArea)
+        hboxNeck.setAlignment(QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft)
+        vbox1.addLayout(hboxNeck)
 
     def changeScaleByIndex(self, i: int):
-        self.noteName = basicNotes[i]
-        self.redisplayString(self.stringIndex)
+        if i < 0:
+            return
+        mode = self.comboBoxModes.currentIndex()
+        self.comboBoxModes.clear()
+        self.comboBoxModes.addItems([str(j + 1) for j in range(catalog.numberModes(catalog.scaleNames[i]))])
+        self.comboBoxModes.setCurrentIndex(min(max(mode, 0), self.comboBoxModes.count() - 1))
+
+    def currentScale(self) -> (str, int):
+        # the edit text of the scale combo box may be an incomplete search
+        return self.comboBoxScales.itemText(self.comboBoxScales.currentIndex()), self.comboBoxModes.currentIndex()
         
     def initUI(self):
         
@@ -528,15 +730,21 @@ class MainWindow(QWidget):
         lbScales.setText("Current Scale:")
         lbScales.setAlignment(QtCore.Qt.AlignRight)
 
+        # the catalog has some thousand scales: they are shown by a model
+        # (item views only create what is visible) and found by typing
+        # any part of the name
         comboBoxScales = QComboBox()
-        comboBoxScales.addItems(scalesGlobal.keys())
-        #comboBoxScales.currentIndexChanged.connect(self.changeScaleByIndex)
+        comboBoxScales.setModel(QtCore.QStringListModel(catalog.scaleNames, comboBoxScales))
+        comboBoxScales.setEditable(True)
+        comboBoxScales.setInsertPolicy(QComboBox.NoInsert)
+        completer = QCompleter(comboBoxScales.model(), comboBoxScales)
+        completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        completer.setFilterMode(QtCore.Qt.MatchContains)
+        comboBoxScales.setCompleter(completer)
 
         lbModes = QLabel()
         lbModes.setText("Current Mode:")
         comboBoxModes = QComboBox()
-        for i, interval in enumerate(scalesGlobal[comboBoxScales.currentText()]):
-            comboBoxModes.addItem(str(i+1))
         hboxScales.addWidget(lbScales)
         hboxScales.addWidget(comboBoxScales)
         self.comboBoxScales = comboBoxScales
@@ -544,13 +752,215 @@ class MainWindow(QWidget):
         hboxScales.addWidget(comboBoxModes)
         self.comboBoxModes = comboBoxModes
 
+        lbFingerings = QLabel()
+        lbFingerings.setText("Fingering:")
+        comboBoxFingerings = QComboBox()
+        comboBoxFingerings.addItems(['nearest'] + list(fingeringPresets.keys()))
+        hboxScales.addWidget(lbFingerings)
+        hboxScales.addWidget(comboBoxFingerings)
+        self.comboBoxFingerings = comboBoxFingerings
+        self.changeScaleByIndex(comboBoxScales.currentIndex())
+        comboBoxScales.currentIndexChanged.connect(self.changeScaleByIndex)
+
         vbox1.addLayout(hboxControls)
         self.createFretboard(vbox1)
-        self.pbClearAllGlobal.clicked.connect(self.fretBoard.clearAllGlobal)
-        self.pbClearAllIndividual.clicked.connect(self.fretBoard.clearAllIndividual)
+        # traced slots get exactly their arguments, not the checked state of the button
+        self.pbClearAllGlobal.clicked.connect(lambda: self.fretBoard.clearAllGlobal())
+        self.pbClearAllIndividual.clicked.connect(lambda: self.fretBoard.clearAllIndividual())
         self.pbSetTuning.clicked.connect(self.fretBoard.resetTuning)
+
+        lbTunings = QLabel()
+        lbTunings.setText("Tuning:")
+        lbTunings.setAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        self.comboBoxTunings = QComboBox()
+        self.comboBoxTunings.addItems(self.fretBoard.tuningLibrary.names)
+        self.notifyTuning(self.fretBoard.tuningLibrary.find(self.fretBoard.model.baseNotes))
+        self.comboBoxTunings.activated.connect(self.fretBoard.setTuningPreset)
+        hboxControls.addWidget(lbTunings)
+        hboxControls.addWidget(self.comboBoxTunings)
+        # cycling through the presets
+        self.scNextTuning = QShortcut(QKeySequence("Ctrl+T"), self,
+                                      lambda: self.fretBoard.cycleTuningPreset(1))
+        self.scPreviousTuning = QShortcut(QKeySequence("Ctrl+Shift+T"), self,
+                                          lambda: self.fretBoard.cycleTuningPreset(-1))
+
+        hboxSession = QHBoxLayout()
+        self.pbUndo = QPushButton("Undo")
+        self.pbRedo = QPushButton("Redo")
+        self.pbSaveSession = QPushButton("Save session...")
+        self.pbLoadSession = QPushButton("Open session...")
+        for button in [self.pbUndo, self.pbRedo, self.pbSaveSession, self.pbLoadSession]:
+            hboxSession.addWidget(button)
+        self.pbUndo.clicked.connect(lambda: self.fretBoard.undo())
+        self.pbRedo.clicked.connect(lambda: self.fretBoard.redo())
+        self.pbSaveSession.clicked.connect(lambda: self.saveSession())
+        self.pbLoadSession.clicked.connect(lambda: self.loadSession())
+        QShortcut(QKeySequence.Undo, self, lambda: self.fretBoard.undo())
+        QShortcut(QKeySequence.Redo, self, lambda: self.fretBoard.redo())
+        QShortcut(QKeySequence.Save, self, lambda: self.saveSession())
+        QShortcut(QKeySequence.Open, self, lambda: self.loadSession())
+        vbox1.addLayout(hboxSession)
+
+        hboxAudio = QHBoxLayout()
+        self.pbPlay = QPushButton("Play marked")
+        self.pbStop = QPushButton("Stop")
+        self.pbSaveAudio = QPushButton("Save audio...")
+        self.cbPlayScales = QCheckBox("Play placed scales")
+        self.pbAnalyzeRecording = QPushButton("Analyze recording...")
+        self.pbLoadRepertoire = QPushButton("Load repertoire...")
+        self.pbClearHeat = QPushButton("Clear heatmap")
+        self.lbAudio = QLabel()
+        for widget in [self.pbPlay, self.pbStop, self.pbSaveAudio, self.cbPlayScales,
+                       self.pbAnalyzeRecording, self.pbLoadRepertoire, self.pbClearHeat, self.lbAudio]:
+            hboxAudio.addWidget(widget)
+        self.pbPlay.clicked.connect(lambda: self.fretBoard.playMarked())
+        self.pbStop.clicked.connect(lambda: self.fretBoard.player.stop())
+        self.pbSaveAudio.clicked.connect(lambda: self.saveAudio())
+        self.cbPlayScales.toggled.connect(lambda checked: setattr(self.fretBoard, 'playScales', checked))
+        self.fretBoard.player.failed = self.audioFailed.emit
+        self.audioFailed.connect(self.lbAudio.setText)
+        self.pbAnalyzeRecording.clicked.connect(lambda: self.analyzeRecording())
+        self.pbLoadRepertoire.clicked.connect(lambda: self.loadRepertoire())
+        self.pbClearHeat.clicked.connect(lambda: self.fretBoard.clearHeat())
+        heatWorker = self.fretBoard.heatWorker
+        heatWorker.progress.connect(lambda heat, status: self.lbAudio.setText(status))
+        heatWorker.finished.connect(lambda heat, status: self.lbAudio.setText(status))
+        heatWorker.failed.connect(self.lbAudio.setText)
+        QShortcut(QKeySequence("Ctrl+P"), self, lambda: self.fretBoard.playMarked())
+        vbox1.addLayout(hboxAudio)
         vbox1.addLayout(hboxScales)
 
+        hboxChords = QHBoxLayout()
+        lbChords = QLabel()
+        lbChords.setText("Chord:")
+        lbChords.setAlignment(QtCore.Qt.AlignRight)
+        self.comboBoxChordRoots = QComboBox()
+        self.comboBoxChordRoots.addItems(basicNotes)
+        self.comboBoxChordTypes = QComboBox()
+        self.comboBoxChordTypes.addItems(chordTypes.keys())
+        self.comboBoxInversions = QComboBox()
+        self.comboBoxInversions.addItems(["any inversion", "root position", "1st inversion",
+                                          "2nd inversion", "3rd inversion"])
+        lbVoicing = QLabel()
+        lbVoicing.setText("Voicing:")
+        self.sbVoicing = QSpinBox()
+        self.lbNumberVoicings = QLabel()
+        self.pbShowVoicing = QPushButton("Show chord")
+        for widget in [lbChords, self.comboBoxChordRoots, self.comboBoxChordTypes, self.comboBoxInversions,
+                       lbVoicing, self.sbVoicing, self.lbNumberVoicings, self.pbShowVoicing]:
+            hboxChords.addWidget(widget)
+        vbox1.addLayout(hboxChords)
+        self.voicings = np.empty((0, self.fretBoard.model.numberStrings), dtype=np.int16)
+        self.voicingWorker = VoicingWorker()
+        self.voicingWorker.finished.connect(self.voicingsFound)
+        self.voicingWorker.failed.connect(self.voicingsFailed)
+        self.comboBoxChordRoots.currentIndexChanged.connect(self.changeChord)
+        self.comboBoxChordTypes.currentIndexChanged.connect(self.changeChord)
+        self.comboBoxInversions.currentIndexChanged.connect(self.changeChord)
+        self.sbVoicing.valueChanged.connect(self.showVoicing)
+        self.pbShowVoicing.clicked.connect(self.changeChord)
+
+        lbFittingScales = QLabel()
+        lbFittingScales.setText("Scales containing the globally marked notes:")
+        self.listFittingScales = QListWidget()
+        self.listFittingScales.setMaximumHeight(120)
+        vbox1.addWidget(lbFittingScales)
+        vbox1.addWidget(self.listFittingScales)
+
+        self.lbDiagram = QLabel()
+        self.fretBoard.renderer.finished.connect(self.diagramFinished)
+        self.fretBoard.renderer.failed.connect(self.diagramFailed)
+        vbox1.addWidget(self.lbDiagram)
+
         self.setLayout(vbox1)    
         self.show()
 
+    def changeChord(self):
+        inversion = self.comboBoxInversions.currentIndex() - 1
+        constraints = voicingConstraints(self.fretBoard.model.numberStrings, inversion if inversion >= 0 else None)
+        self.lbNumberVoicings.setText("of ...")
+        self.voicingWorker.start(self.fretBoard.model, self.comboBoxChordRoots.currentIndex(),
+                                 self.comboBoxChordTypes.currentText(), constraints)
+
+    def voicingsFound(self, voicings: np.ndarray):
+        self.voicings = voicings
+        self.lbNumberVoicings.setText(f"of {len(self.voicings)}")
+        self.sbVoicing.blockSignals(True)
+        self.sbVoicing.setRange(min(1, len(self.voicings)), len(self.voicings))
+        self.sbVoicing.setValue(min(1, len(self.voicings)))
+        self.sbVoicing.blockSignals(False)
+        self.showVoicing(self.sbVoicing.value())
+
+    def voicingsFailed(self, message: str):
+        self.voicingsFound(np.empty((0, self.fretBoard.model.numberStrings), dtype=np.int16))
+        self.lbAudio.setText(f"Voicings failed: {message}")
+
+    def showVoicing(self, number: int):
+        if not 1 <= number <= len(self.voicings):
+            return
+        heading = (f"{chordName(self.comboBoxChordRoots.currentIndex(), self.comboBoxChordTypes.currentText())}, "
+                   f"Voicing {number}")
+        self.fretBoard.showVoicing(self.voicings[number - 1], heading)
+
+    @traced
+    def notifyMarkedGlobal(self, markedGlobal: int):
+        self.listFittingScales.clear()
+        if markedGlobal:
+            self.listFittingScales.addItems([str(match) for match in catalog.containing(markedGlobal, maxFittingScales)])
+            numberFitting = catalog.countContaining(markedGlobal)
+            if numberFitting > maxFittingScales:
+                self.listFittingScales.addItem(f"... {numberFitting - maxFittingScales} more")
+
+    def saveSession(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save session", "", "Sessions (*.json)")
+        if not path:
+            return
+        try:
+            self.fretBoard.saveSession(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Save session", f"The session could not be saved: {e}")
+
+    def loadSession(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open session", "", "Sessions (*.json)")
+        if not path:
+            return
+        try:
+            self.fretBoard.loadSession(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Open session", f"The session could not be opened: {e}")
+
+    def saveAudio(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save audio", "", "WAV (*.wav)")
+        if not path:
+            return
+        try:
+            self.fretBoard.saveAudio(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Save audio", f"The audio could not be saved: {e}")
+
+    def analyzeRecording(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Analyze recording", "", "WAV (*.wav)")
+        if path:
+            self.fretBoard.analyzeRecording(path)
+
+    def loadRepertoire(self):
+        directory = QFileDialog.getExistingDirectory(self, "Load repertoire (tabs and MusicXML files)")
+        if directory:
+            self.fretBoard.loadRepertoire([directory])
+
+    def notifyTuning(self, preset: int):
+        # no preset selected for a custom tuning
+        self.comboBoxTunings.setCurrentIndex(preset if preset is not None else -1)
+
+    def diagramFinished(self, path: str):
+        self.lbDiagram.setText(f"Diagram written to {path}")
+
+    def diagramFailed(self, message: str):
+        self.lbDiagram.setText(f"Diagram failed: {message}")
+
+    def closeEvent(self, event):
+        self.fretBoard.renderer.shutdown()
+        self.fretBoard.player.stop()
+        self.fretBoard.heatWorker.cancel()
+        super().closeEvent(event)
+